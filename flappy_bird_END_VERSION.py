@@ -12,6 +12,21 @@ import os
 import time
 import neat
 import pickle
+import heapq
+import numpy as np
+import flappy_sim
+import flappy_distributed
+import flappy_threads
+import flappy_islands
+import flappy_steady
+import flappy_cache
+import flappy_species
+import flappy_reproduction
+import flappy_stats
+import flappy_genome
+import flappy_viewer
+import flappy_dataset
+import flappy_warmstart
 pygame.font.init()  # init font
 
 WIN_WIDTH = 600
@@ -21,6 +36,95 @@ STAT_FONT = pygame.font.SysFont("comicsans", 50)
 END_FONT = pygame.font.SysFont("comicsans", 70)
 DRAW_LINES = False
 
+# draw only the DRAW_TOP_K birds closest to the middle of the next gap, the
+# rest are shown as a strip of where they are (None draws every bird)
+DRAW_TOP_K = None
+DENSITY_BIN = 8  # pixels per bar of the strip
+
+# headless training: every genome plays NUM_COURSES seeded courses in one
+# batched simulation (flappy_sim) instead of one random course on screen
+HEADLESS = False
+NUM_COURSES = 5
+COURSE_AGGREGATE = "mean"  # "mean", "min", "median" or a quantile like 0.25
+FIXED_COURSES = False  # play the same courses every generation
+
+# distributed training: serve genome batches to workers started with
+# "python flappy_distributed.py worker ADDRESS", optionally also starting
+# LOCAL_WORKERS of them on this machine. Coordinator and workers need the
+# same secret WORKER_AUTHKEY, or the FLAPPY_AUTHKEY environment variable
+# when it is None; listen on another interface than localhost only on a
+# network you trust
+WORKER_ADDRESS = None  # e.g. ("localhost", 6000) or "/tmp/flappy.sock"
+WORKER_AUTHKEY = None
+LOCAL_WORKERS = 0
+coordinator = None
+
+# parallel training on this machine with PARALLEL_WORKERS threads on a
+# free-threaded python build, else as many processes that read the genomes
+# from shared memory (flappy_shared) instead of getting them pickled
+PARALLEL_WORKERS = 0
+eval_pool = None
+
+# island model: ISLANDS populations of pop_size, each in its own process,
+# that send their MIGRANTS best genomes to the next island every
+# MIGRATION_INTERVAL generations (flappy_islands)
+ISLANDS = 0
+MIGRATION_INTERVAL = 5
+MIGRANTS = 2
+
+# steady-state evolution without a generation barrier: STEADY_STATE worker
+# processes are kept busy, every result replaces the worst genome (flappy_steady);
+# every genome plays the same NUM_COURSES courses, FIXED_COURSES or not
+STEADY_STATE = 0
+
+# watch the first 64 headless games of every generation as thumbnails in a
+# window of their own (flappy_viewer), the games do not wait for it; only
+# for games played in this process, not with ISLANDS, STEADY_STATE,
+# WORKER_ADDRESS or PARALLEL_WORKERS
+WATCH = False
+publisher = None
+
+# record every decision (the net's inputs and whether the bird jumped) and
+# how every game ended, for supervised training (flappy_dataset); like
+# WATCH only for games played in this process, and every game is played
+# again, MEMOIZE_FITNESS or not
+RECORD = None  # e.g. "dataset"
+recorder = None
+
+# seed half of the first generation with genomes fitted to a RECORD-ed
+# dataset of a champion or a human player (flappy_warmstart); not used by
+# ISLANDS and STEADY_STATE, which make their own populations
+WARM_START = None  # e.g. "dataset"
+
+# compiled networks of genomes that did not change, e.g. the elites;
+# PRUNE_NETS also drops nodes and links that never change an output
+NET_CACHE_SIZE = 1000
+PRUNE_NETS = True
+net_cache = flappy_cache.NetCache(NET_CACHE_SIZE, PRUNE_NETS)
+
+# fitness of genomes on courses they already played, pays off with
+# FIXED_COURSES where elites replay the same courses every generation
+MEMOIZE_FITNESS = True
+fitness_cache = flappy_cache.FitnessCache()
+
+# flappy_species.ArraySpeciesSet gives the same species as the default one,
+# but is much faster once pop_size goes into the thousands
+SPECIES_SET = neat.DefaultSpeciesSet
+
+# flappy_reproduction.BatchReproduction makes the children of a generation
+# in bulk, for pop_size in the tens of thousands
+REPRODUCTION = neat.DefaultReproduction
+
+# flappy_genome.CompactGenome keeps the genes in numpy arrays, a fraction of
+# the memory of neat.DefaultGenome; BatchReproduction makes its children
+# without leaving numpy. It is best with neat.DefaultSpeciesSet
+GENOME = neat.DefaultGenome
+
+# directory of a flappy_stats.StatsLog that run() writes instead of keeping
+# a neat.StatisticsReporter in memory, read it with "python flappy_stats.py"
+STATS_LOG = None  # e.g. "stats"
+stats_log = None
+
 WIN = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
 pygame.display.set_caption("Flappy Bird")
 
@@ -97,6 +201,17 @@ class Bird:
         :param win: pygame window or surface
         :return: None
         """
+        self.animate()
+
+        # tilt the bird
+        blitRotateCenter(win, self.img, (self.x, self.y), self.tilt)
+
+    def animate(self):
+        """
+        pick the image to show this frame; the collision mask depends on
+        it, so birds that are not drawn still have to be animated
+        :return: None
+        """
         self.img_count += 1
 
         # For animation of bird, loop through three images
@@ -117,10 +232,6 @@ class Bird:
             self.img = self.IMGS[1]
             self.img_count = self.ANIMATION_TIME*2
 
-
-        # tilt the bird
-        blitRotateCenter(win, self.img, (self.x, self.y), self.tilt)
-
     def get_mask(self):
         """
         gets the mask for the current image of the bird
@@ -191,19 +302,9 @@ class Pipe():
         :param bird: Bird object
         :return: Bool
         """
-        bird_mask = bird.get_mask()
-        top_mask = pygame.mask.from_surface(self.PIPE_TOP)
-        bottom_mask = pygame.mask.from_surface(self.PIPE_BOTTOM)
-        top_offset = (self.x - bird.x, self.top - round(bird.y))
-        bottom_offset = (self.x - bird.x, self.bottom - round(bird.y))
-
-        b_point = bird_mask.overlap(bottom_mask, bottom_offset)
-        t_point = bird_mask.overlap(top_mask,top_offset)
-
-        if b_point or t_point:
-            return True
-
-        return False
+        # same result as overlapping the bird and pipe masks, looked up
+        # in flappy_sim's tables of where the sprites' columns start and end
+        return bool(flappy_sim.pipe_hit(bird.IMGS.index(bird.img), self.x - bird.x, round(bird.y), self.height))
 
 class Base:
     """
@@ -260,6 +361,22 @@ def blitRotateCenter(surf, image, topleft, angle):
 
     surf.blit(rotated_image, new_rect.topleft)
 
+def draw_density(win, birds, x):
+    """
+    draw a strip of bars, one per DENSITY_BIN pixels of height, as long as
+    the share of the birds at that height
+    :param win: pygame window surface
+    :param birds: list of Bird
+    :param x: right edge of the strip
+    :return: None
+    """
+    ys = np.fromiter((bird.y for bird in birds), dtype=float, count=len(birds))
+    counts = np.bincount(np.clip(ys, 0, WIN_HEIGHT - 1).astype(int) // DENSITY_BIN,
+                         minlength=WIN_HEIGHT // DENSITY_BIN)
+    lengths = np.ceil(30 * counts / counts.max()).astype(int)
+    for i in np.flatnonzero(counts):
+        pygame.draw.rect(win, (255,0,0), (x - lengths[i], i * DENSITY_BIN, lengths[i], DENSITY_BIN - 1))
+
 def draw_window(win, birds, pipes, base, score, gen, pipe_ind):
     """
     draws the windows for the main game loop
@@ -279,7 +396,19 @@ def draw_window(win, birds, pipes, base, score, gen, pipe_ind):
         pipe.draw(win)
 
     base.draw(win)
-    for bird in birds: #18, draw functie die de vogels tekent
+    shown = birds
+    if DRAW_TOP_K is not None and len(birds) > DRAW_TOP_K:
+        # rank by distance to the middle of the gap, the others only animate;
+        # pipe_ind is from before the pipes moved, its pipe may be gone
+        pipe = pipes[min(pipe_ind, len(pipes) - 1)]
+        middle = pipe.height + Pipe.GAP / 2 - bird_images[0].get_height() / 2
+        shown = heapq.nsmallest(DRAW_TOP_K, birds, key=lambda bird: abs(bird.y - middle))
+        drawn = set(shown)
+        hidden = [bird for bird in birds if bird not in drawn]
+        for bird in hidden:
+            bird.animate()
+        draw_density(win, hidden, birds[0].x - 10)
+    for bird in shown: #18, draw functie die de vogels tekent
         if DRAW_LINES:
             try:
                 pygame.draw.line(win, (255,0,0), (bird.x+bird.img.get_width()/2, bird.y + bird.img.get_height()/2), (pipes[pipe_ind].x + pipes[pipe_ind].PIPE_TOP.get_width()/2, pipes[pipe_ind].height), 5)
@@ -321,7 +450,7 @@ def eval_genomes(genomes, config):
     ge = []
     for genome_id, genome in genomes: #10, loopt door elk genome in de huidige populatie, koppelt elk genome aan een neuraal netwerk en een Bird-object
         genome.fitness = 0  # start met een fitness score van 0
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
+        net = net_cache.create(genome, config)
         nets.append(net)
         birds.append(Bird(230,350))
         ge.append(genome)
@@ -337,6 +466,13 @@ def eval_genomes(genomes, config):
             ge = [pickle.load(f)[1]] 
         birds = [birds[0]]
 
+    # fitness is kept per bird index by the accountant and only written to
+    # the genomes at the end; index holds the accountant index of every bird still playing
+    accountant = flappy_sim.FitnessAccountant(len(birds))
+    index = list(range(len(birds)))
+    if recorder is not None:
+        episodes = recorder.new_episodes(len(birds))
+
     base = Base(FLOOR)
     pipes = [Pipe(700)]
     score = 0
@@ -359,14 +495,17 @@ def eval_genomes(genomes, config):
             if len(pipes) > 1 and birds[0].x > pipes[0].x + pipes[0].PIPE_TOP.get_width():  # check of het eerste of tweede buizenpaar op het scherm de input moet zijn voor het neurale netwerk
                 pipe_ind = 1                                                                
 
-        for x, bird in enumerate(birds):  #14, geeft de vogels een tiende fitness punt voor elk frame dat ze blijven leven
-            ge[x].fitness += 0.1
+        accountant.frame()  #14, geeft de vogels een tiende fitness punt voor elk frame dat ze blijven leven
+        for bird in birds:
             bird.move()
 
             # check op basis van de positie van de vogel, de onderste en de bovenste buis of de vogel moet springen
-            output = nets[birds.index(bird)].activate((bird.y, abs(bird.y - pipes[pipe_ind].height), abs(bird.y - pipes[pipe_ind].bottom)))
+            inputs = (bird.y, abs(bird.y - pipes[pipe_ind].height), abs(bird.y - pipes[pipe_ind].bottom))
+            output = nets[birds.index(bird)].activate(inputs)
             if output[0] > 0.5:  #15, met de tanh functie krijgen we outputs tussen de -1 en 1, als dit hoger dan 0,5 is springt de vogel
                 bird.jump() #15, laat de vogels springen
+            if recorder is not None:
+                recorder.decision(episodes[index[birds.index(bird)]], accountant.frame_count, inputs, output[0] > 0.5)
 
         base.move()
 
@@ -377,9 +516,9 @@ def eval_genomes(genomes, config):
             # controleer of de vogel de buizen raakt (collision)
             for bird in birds: #8, controleer voor elke vogel of hij in botsing komt met een buis
                 if pipe.collide(bird, win):
-                    ge[birds.index(bird)].fitness -= 1 #11, verminder de fitness van de vogel als hij tegen een buis botst om de vogel te bestraffen voor de botsing
+                    accountant.died(index[birds.index(bird)], flappy_sim.DEATH_PIPE) #11, verminder de fitness van de vogel als hij tegen een buis botst om de vogel te bestraffen voor de botsing
                     nets.pop(birds.index(bird))
-                    ge.pop(birds.index(bird))
+                    index.pop(birds.index(bird))
                     birds.pop(birds.index(bird))
 
             if pipe.x + pipe.PIPE_TOP.get_width() < 0:
@@ -391,8 +530,7 @@ def eval_genomes(genomes, config):
 
         if add_pipe:
             score += 1
-            for genome in ge:
-                genome.fitness += 5 #12, de vogels krijgen een beloning als tussen de buizen door gaan, de fitness gaat omhoog
+            accountant.passed() #12, de vogels krijgen een beloning als tussen de buizen door gaan, de fitness gaat omhoog
             pipes.append(Pipe(WIN_WIDTH))
 
         for r in rem:
@@ -400,32 +538,199 @@ def eval_genomes(genomes, config):
 
         for bird in birds: #9, controleer of de vogel de grond raakt of te hoog vliegt (buiten het scherm)
             if bird.y + bird.img.get_height() - 10 >= FLOOR or bird.y < -50: #16, zorgt dat de vogels niet boven de buizen gaan vliegen
+                accountant.died(index[birds.index(bird)], flappy_sim.DEATH_CEILING if bird.y < -50 else flappy_sim.DEATH_FLOOR)
                 nets.pop(birds.index(bird))
-                ge.pop(birds.index(bird))
+                index.pop(birds.index(bird))
                 birds.pop(birds.index(bird))
 
         draw_window(WIN, birds, pipes, base, score, gen, pipe_ind)
 
         #stopt het spel bij een score van boven de 25
         if score > 25:
-            pickle.dump(nets[0],open("best_net.pickle", "wb")) #slaat de .pickle bestanden op. Nets en genomes gescheiden
-            pickle.dump(genomes[0],open("best_genome.pickle", "wb")) 
             break
 
+    fitness = accountant.fitness()
+    for genome, f in zip(ge, fitness):
+        genome.fitness = float(f)
+    # saved after the fitness is written back, so the genome keeps its fitness
+    if score > 25:
+        pickle.dump(nets[0],open("best_net.pickle", "wb")) #slaat de .pickle bestanden op. Nets en genomes gescheiden
+        pickle.dump(genomes[0],open("best_genome.pickle", "wb")) 
+    if recorder is not None:
+        recorder.outcomes(episodes, [genome.key for genome in ge], -1, accountant.frames_alive(),
+                          accountant.scores(), accountant.death, fitness)
+    if stats_log is not None:
+        stats_log.add_alive_times(accountant.frames_alive())
+
+def course_seeds(gen):
+    """
+    seeds of the courses a generation is evaluated on
+    :param gen: current generation
+    :return: list of int
+    """
+    if FIXED_COURSES:
+        return list(range(NUM_COURSES))
+    return [gen * NUM_COURSES + i for i in range(NUM_COURSES)]
+
+def eval_genomes_courses(genomes, config):
+    """
+    headless version of eval_genomes: every genome plays NUM_COURSES
+    seeded courses, all in lockstep in one batched simulation, and gets
+    the COURSE_AGGREGATE of its fitness on those courses
+    """
+    global gen
+    gen += 1
+
+    observers = []
+    if WATCH:
+        global publisher
+        if publisher is None:
+            publisher = flappy_viewer.Publisher()
+            flappy_viewer.start_viewer(publisher.name)
+        observers.append(publisher.publish)
+    if recorder is not None:
+        observers.append(recorder.observe)
+
+    def observer(game):
+        for observe in observers:
+            observe(game)
+
+    frames = np.empty((len(course_seeds(gen)), len(genomes)), dtype=np.int64)
+    # the fitness cache skips games, a recording needs all of them
+    if MEMOIZE_FITNESS and recorder is None:
+        fitness = fitness_cache.evaluate(genomes, config, course_seeds(gen), COURSE_AGGREGATE,
+                                         create=net_cache.create, frames=frames,
+                                         observer=observer if observers else None)[0]
+    else:
+        nets = [net_cache.create(genome, config) for genome_id, genome in genomes]
+        fitness = flappy_sim.evaluate_courses(nets, course_seeds(gen), COURSE_AGGREGATE, frames=frames,
+                                              observer=observer if observers else None,
+                                              keys=[genome_id for genome_id, genome in genomes])[0]
+    if stats_log is not None:
+        stats_log.add_alive_times(frames.ravel())
+    for (genome_id, genome), f in zip(genomes, fitness):
+        genome.fitness = float(f)
+
+def eval_genomes_distributed(genomes, config):
+    """
+    eval_genomes_courses, but the batches are played by the workers
+    connected to the coordinator
+    """
+    global gen
+    gen += 1
+
+    frames = np.empty((len(course_seeds(gen)), len(genomes)), dtype=np.int64)
+    fitness = coordinator.evaluate(genomes, config, course_seeds(gen), COURSE_AGGREGATE, frames=frames)
+    if stats_log is not None:
+        stats_log.add_alive_times(frames.ravel())
+    for (genome_id, genome), f in zip(genomes, fitness):
+        genome.fitness = float(f)
+
+def eval_genomes_parallel(genomes, config):
+    """
+    eval_genomes_courses, but played by the threads or processes of eval_pool
+    """
+    global gen
+    gen += 1
+
+    frames = np.empty((len(course_seeds(gen)), len(genomes)), dtype=np.int64)
+    fitness = eval_pool.evaluate(genomes, course_seeds(gen), COURSE_AGGREGATE, frames=frames)
+    if stats_log is not None:
+        stats_log.add_alive_times(frames.ravel())
+    for (genome_id, genome), f in zip(genomes, fitness):
+        genome.fitness = float(f)
+
+class CacheReporter(neat.reporting.BaseReporter):
+    """
+    prints how much the net and fitness caches saved every generation
+    """
+
+    def post_evaluate(self, config, population, species, best_genome):
+        s = net_cache.stats()
+        total = s['generation_hits'] + s['generation_misses']
+        if total:
+            print("Net cache: {0} of {1} networks reused ({2:.1%}), {3:.1%} over the run, {4} cached".format(
+                s['generation_hits'], total, s['generation_hits'] / total, s['hit_rate'], s['cached']))
+            print("Compiled nets are {0:.1%} the size of their genomes".format(s['shrink_ratio']))
+        s = fitness_cache.stats()
+        total = s['generation_played'] + s['generation_skipped']
+        if total:
+            print("Fitness cache: {0} of {1} games skipped ({2:.1%}), {3} cached".format(
+                s['generation_skipped'], total, s['generation_skipped'] / total, s['cached']))
+
+
 def run(config_file): #1, start het NEAT algoritme waardoor een neuraal netwerk flappy bird kan spelen
-    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
-                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+    if (RECORD is not None or WATCH) and (ISLANDS or STEADY_STATE or WORKER_ADDRESS is not None or PARALLEL_WORKERS):
+        raise ValueError("RECORD and WATCH need the games played in this process, "
+                         "they do not work with ISLANDS, STEADY_STATE, WORKER_ADDRESS or PARALLEL_WORKERS")
+    config = neat.config.Config(GENOME, REPRODUCTION,
+                         SPECIES_SET, neat.DefaultStagnation,
                          config_file)
 
     #4, de populatie wordt aangemaakt
     p = neat.Population(config)
 
     p.add_reporter(neat.StdOutReporter(True))
-    stats = neat.StatisticsReporter()
-    p.add_reporter(stats) #5 Voegt een reporter toe in de terminal om de trainingsstats bij te houden 
-
-
-    winner = p.run(eval_genomes, 21) #6, de code traint nu 21 generaties
+    if STATS_LOG is not None:
+        global stats_log
+        stats_log = flappy_stats.StatsLog(STATS_LOG)
+        p.add_reporter(stats_log)
+    else:
+        stats = neat.StatisticsReporter()
+        p.add_reporter(stats) #5 Voegt een reporter toe in de terminal om de trainingsstats bij te houden 
+    p.add_reporter(net_cache)
+    if HEADLESS and MEMOIZE_FITNESS:
+        p.add_reporter(fitness_cache)
+    p.add_reporter(CacheReporter())
+    if WARM_START is not None:
+        obs, jumps, seeds = flappy_warmstart.demonstrations(WARM_START)
+        # recordings of unseeded games get calibrated on the first generation's
+        weights, bias = flappy_warmstart.fit(obs, jumps, seeds or course_seeds(1), config)
+        flappy_warmstart.seed_population(p, weights, bias)
+    if RECORD is not None:
+        global recorder
+        recorder = flappy_dataset.Recorder(RECORD)
+
+
+    if ISLANDS:
+        results = flappy_islands.evolve(config, ISLANDS, 21, MIGRATION_INTERVAL, MIGRANTS, NUM_COURSES,
+                                        COURSE_AGGREGATE, FIXED_COURSES)
+        for r in results:
+            print("Island {0}: best fitness {1:.2f} after {2} generations, {3:.1f} s".format(
+                r.island, r.best.fitness, r.generations, r.seconds))
+        winner = max(results, key=lambda r: r.best.fitness).best
+    elif STEADY_STATE:
+        steady = flappy_steady.SteadyState(config, STEADY_STATE, NUM_COURSES, COURSE_AGGREGATE,
+                                           alive_times=stats_log.add_alive_times if stats_log is not None else None)
+        for reporter in p.reporters.reporters:
+            steady.add_reporter(reporter)
+        winner = steady.run(21 * config.pop_size)
+    elif WORKER_ADDRESS is not None:
+        global coordinator
+        coordinator = flappy_distributed.Coordinator(WORKER_ADDRESS, WORKER_AUTHKEY)
+        try:
+            flappy_distributed.start_local_workers(coordinator.address, LOCAL_WORKERS, coordinator.authkey)
+            winner = p.run(eval_genomes_distributed, 21)
+        finally:
+            # the local workers exit once the coordinator is gone
+            coordinator.close()
+    elif PARALLEL_WORKERS:
+        global eval_pool
+        eval_pool = flappy_threads.make_pool(config, PARALLEL_WORKERS, net_cache)
+        try:
+            winner = p.run(eval_genomes_parallel, 21)
+        finally:
+            # stops the workers and, for a SharedPool, frees the shared memory
+            eval_pool.close()
+    else:
+        winner = p.run(eval_genomes_courses if HEADLESS else eval_genomes, 21) #6, de code traint nu 21 generaties
+
+    if stats_log is not None:
+        stats_log.close()
+    if publisher is not None:
+        publisher.close()
+    if recorder is not None:
+        recorder.close()
 
     print('\nBest genome:\n{!s}'.format(winner)) # Laat de final stats zien
 
@@ -434,5 +739,4 @@ if __name__ == '__main__': #2, filepath naar het configuratie bestand bepalen
     local_dir = os.path.dirname(__file__)
     config_path = os.path.join(local_dir, 'config-feedforward.txt')
     run(config_path)
-
-pygame.quit()
\ No newline at end of file
+    pygame.quit()
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+Caches for genomes that come back unchanged from one generation to
+the next, like the ones kept by elitism and species_elitism: their
+compiled networks and, on seeded courses, their fitness.
+"""
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import neat
+import flappy_sim
+import flappy_genome
+
+
+def genome_hash(genome):
+    """
+    hash of everything that decides how a genome plays: its node and
+    connection genes with all their attributes (weights, biases,
+    activations, enabled flags, ...). The genome key and fitness are
+    not part of it, so a copied elite hashes the same as its parent.
+    :param genome: neat genome or flappy_genome.CompactGenome
+    :return: bytes
+    """
+    if isinstance(genome, flappy_genome.CompactGenome):
+        return hashlib.blake2b(genome.node_genes.tobytes() + b"|" + genome.conn_genes.tobytes(),
+                               digest_size=16).digest()
+    genes = []
+    for group in (genome.nodes, genome.connections):
+        genes.append(tuple((key, tuple(getattr(gene, a.name) for a in gene._gene_attributes))
+                           for key, gene in sorted(group.items())))
+    return hashlib.blake2b(repr(genes).encode(), digest_size=16).digest()
+
+
+def gene_count(genome):
+    """
+    :param genome: neat genome or flappy_genome.CompactGenome
+    :return: node genes plus connection genes, disabled ones included (int)
+    """
+    if isinstance(genome, flappy_genome.CompactGenome):
+        return len(genome.node_genes) + len(genome.conn_genes)
+    return len(genome.nodes) + len(genome.connections)
+
+
+class NetCache(neat.reporting.BaseReporter):
+    """
+    Bounded LRU cache of compiled networks keyed by genome_hash. Add it
+    as a reporter to count the hits per generation, see stats().
+    """
+
+    def __init__(self, maxsize=1000, prune=False):
+        """
+        :param maxsize: most networks kept (int)
+        :param prune: also run the nets through flappy_genome.prune, which
+                      keeps the outputs exactly the same (bool)
+        :return: None
+        """
+        self.maxsize = maxsize
+        self.prune = prune
+        self.nets = OrderedDict()
+        self.genes = 0  # genes of the genomes compiled so far
+        self.kept = 0  # what is left of them in the nets, see flappy_genome.net_size
+        self.hits = 0
+        self.misses = 0
+        self.generation_hits = 0
+        self.generation_misses = 0
+
+    def create(self, genome, config):
+        """
+        drop-in for neat.nn.FeedForwardNetwork.create
+        :param genome: neat genome or flappy_genome.CompactGenome
+        :param config: neat config
+        :return: neat.nn.FeedForwardNetwork
+        """
+        key = genome_hash(genome)
+        net = self.nets.get(key)
+        if net is not None:
+            self.nets.move_to_end(key)
+            self.hits += 1
+            self.generation_hits += 1
+            return net
+
+        net = flappy_genome.create_net(genome, config)
+        if self.prune:
+            net = flappy_genome.prune(net)
+        self.genes += gene_count(genome)
+        self.kept += flappy_genome.net_size(net)
+        self.nets[key] = net
+        if len(self.nets) > self.maxsize:
+            self.nets.popitem(last=False)
+        self.misses += 1
+        self.generation_misses += 1
+        return net
+
+    def hit_rate(self):
+        """
+        share of create calls served from the cache since the start
+        :return: float
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def shrink_ratio(self):
+        """
+        size of the compiled nets against the genes of their genomes,
+        since the start
+        :return: float
+        """
+        return self.kept / self.genes if self.genes else 1.0
+
+    def stats(self):
+        """
+        :return: {'hits', 'misses': since the start, 'generation_hits',
+                 'generation_misses': this generation, when added as a
+                 reporter, 'hit_rate', 'shrink_ratio', 'cached': networks kept}
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'generation_hits': self.generation_hits,
+                'generation_misses': self.generation_misses, 'hit_rate': self.hit_rate(),
+                'shrink_ratio': self.shrink_ratio(), 'cached': len(self.nets)}
+
+    def start_generation(self, generation):
+        self.generation_hits = 0
+        self.generation_misses = 0
+
+
+class FitnessCache(neat.reporting.BaseReporter):
+    """
+    Bounded LRU cache of the fitness a genome got on a course, and the
+    frames that game lasted. A course is deterministic given its seed,
+    so a genome that comes back unchanged does not have to play it again. Entries are keyed by
+    genome_hash, course seed and flappy_sim.rules_key, so results of
+    other courses or other game and fitness rules are never reused.
+    """
+
+    def __init__(self, maxsize=100000):
+        """
+        :param maxsize: most (genome, course) results kept (int)
+        :return: None
+        """
+        self.maxsize = maxsize
+        self.scores = OrderedDict()
+        self.played = 0
+        self.skipped = 0
+        self.generation_played = 0
+        self.generation_skipped = 0
+
+    def evaluate(self, genomes, config, seeds, how="mean", max_score=flappy_sim.MAX_SCORE,
+                 create=neat.nn.FeedForwardNetwork.create, frames=None, observer=None):
+        """
+        flappy_sim.evaluate_courses for genomes, only playing the
+        (genome, course) pairs that are not cached
+        :param genomes: list of (genome_id, genome)
+        :param config: neat config
+        :param seeds: course seeds
+        :param how: how to aggregate the courses, see flappy_sim.aggregate
+        :param max_score: stop a game once its score goes over this
+        :param create: function (genome, config) -> network
+        :param frames: optional (courses, genomes) array, gets the frames every game lasted
+        :param observer: optional function (game) -> None, see flappy_sim.BatchGame.run;
+                         it only sees the games that are played, not the cached
+                         ones, and one game for genomes that hash the same
+        :return: (aggregated fitness per genome, (courses, genomes) fitness array)
+        """
+        rules = flappy_sim.rules_key(max_score)
+        fitness = np.empty((len(seeds), len(genomes)))
+        lasted = np.empty((len(seeds), len(genomes)), dtype=np.int64)
+        games = OrderedDict()  # cache key -> [(course, genome), ...] waiting for it
+        hashes = [genome_hash(genome) for genome_id, genome in genomes]
+        for c, seed in enumerate(seeds):
+            for i, h in enumerate(hashes):
+                key = (h, seed, rules)
+                if key in self.scores:
+                    self.scores.move_to_end(key)
+                    fitness[c, i], lasted[c, i] = self.scores[key]
+                else:
+                    games.setdefault(key, []).append((c, i))
+
+        if games:
+            nets, net_of = [], {}
+            net_index, course_index, keys = [], [], []
+            for key, waiting in games.items():
+                c, i = waiting[0]
+                if key[0] not in net_of:
+                    net_of[key[0]] = len(nets)
+                    nets.append(create(genomes[i][1], config))
+                net_index.append(net_of[key[0]])
+                course_index.append(c)
+                keys.append(genomes[i][0])
+            played_frames = np.empty(len(games), dtype=np.int64)
+            played = flappy_sim.play_games(nets, seeds, net_index, course_index, max_score, played_frames, observer,
+                                           keys)
+            for (key, waiting), f, n in zip(games.items(), played, played_frames):
+                for c, i in waiting:
+                    fitness[c, i] = f
+                    lasted[c, i] = n
+                self.scores[key] = (f, n)
+            while len(self.scores) > self.maxsize:
+                self.scores.popitem(last=False)
+
+        self.played += len(games)
+        self.skipped += fitness.size - len(games)
+        self.generation_played += len(games)
+        self.generation_skipped += fitness.size - len(games)
+        if frames is not None:
+            frames[...] = lasted
+        return flappy_sim.aggregate(fitness, how), fitness
+
+    def stats(self):
+        """
+        :return: {'played', 'skipped': games since the start,
+                 'generation_played', 'generation_skipped': this generation,
+                 when added as a reporter, 'cached': results kept}
+        """
+        return {'played': self.played, 'skipped': self.skipped, 'generation_played': self.generation_played,
+                'generation_skipped': self.generation_skipped, 'cached': len(self.scores)}
+
+    def start_generation(self, generation):
+        self.generation_played = 0
+        self.generation_skipped = 0
@@ -0,0 +1,224 @@
+"""
+(state, action) datasets for training controllers by supervised
+learning, e.g. from NEAT champions. A Recorder streams every decision
+a bird makes (the three inputs eval_genomes feeds the net and whether
+it jumped) and the outcome of every game into numpy record arrays on
+disk:
+
+    <path>/frames-000000.npy     FRAME_DTYPE, one record per decision
+    <path>/episodes-000000.npy   EPISODE_DTYPE, one record per finished game
+
+Each file is a chunk of chunk_size records, preallocated with
+np.lib.format.open_memmap and filled in place, so recording never grows
+a python list and memory use does not depend on the length of the run;
+the pages go to the file, not to the process. When a chunk is full the
+next one is started; close() cuts the last one down to the records it
+holds, after which every chunk is a plain .npy file.
+
+    recorder = Recorder("dataset")
+    flappy_sim.evaluate_courses(nets, seeds, observer=recorder.observe)
+    recorder.close()
+
+    frames = load("dataset")               # or chunks("dataset") one file at a time
+    x, y = frames['obs'], frames['jump']
+"""
+import os
+import glob
+import numpy as np
+
+FRAME_DTYPE = np.dtype([('episode', '<i8'), ('frame', '<i8'), ('obs', '<f8', (3,)), ('jump', '?')])
+EPISODE_DTYPE = np.dtype([('episode', '<i8'), ('genome', '<i8'), ('seed', '<i8'), ('frames', '<i8'),
+                          ('score', '<i8'), ('death', 'i1'), ('fitness', '<f8')])
+
+
+class _Chunks:
+    """
+    records appended to a numbered series of preallocated .npy files
+    """
+
+    def __init__(self, path, name, dtype, chunk_size):
+        self.pattern = os.path.join(path, name + "-{:06d}.npy")
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+        self.count = 0  # chunks started
+        self.array = None
+        self.used = 0
+
+    def _next(self):
+        self._finish()
+        self.array = np.lib.format.open_memmap(self.pattern.format(self.count), mode="w+", dtype=self.dtype,
+                                               shape=(self.chunk_size,))
+        self.count += 1
+        self.used = 0
+
+    def _finish(self):
+        # write the current chunk out and unmap it, cut down to its records
+        if self.array is None:
+            return
+        self.array.flush()
+        filename, part = self.array.filename, None
+        if self.used < self.chunk_size:
+            part = filename + ".part.npy"
+            np.save(part, self.array[:self.used])
+        self.array = None
+        if part is not None:
+            os.replace(part, filename)
+
+    def add(self, record):
+        """
+        :param record: tuple with a value per field
+        :return: None
+        """
+        if self.array is None or self.used == self.chunk_size:
+            self._next()
+        self.array[self.used] = record
+        self.used += 1
+
+    def extend(self, n, columns):
+        """
+        :param n: number of records
+        :param columns: {field: array of n values, or one value for all}
+        :return: None
+        """
+        done = 0
+        while done < n:
+            if self.array is None or self.used == self.chunk_size:
+                self._next()
+            m = min(n - done, self.chunk_size - self.used)
+            part = self.array[self.used:self.used + m]
+            for name, value in columns.items():
+                part[name] = value[done:done + m] if np.ndim(value) else value
+            self.used += m
+            done += m
+
+    def close(self):
+        self._finish()
+
+
+class Recorder:
+    """
+    streams decisions and game outcomes into chunked memory mapped files
+    """
+
+    def __init__(self, path, chunk_size=1 << 20):
+        """
+        :param path: directory for the files, made if needed; the chunks of
+                     an earlier recording in it are deleted
+        :param chunk_size: records per file (int)
+        :return: None
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ("frames", "episodes"):
+            for filename in _chunk_files(path, name):
+                os.remove(filename)
+        self.path = path
+        self.frames = _Chunks(path, "frames", FRAME_DTYPE, chunk_size)
+        self.episodes = _Chunks(path, "episodes", EPISODE_DTYPE, chunk_size)
+        self.episode_count = 0
+        self._game = None
+        self._first = 0
+        self._playing = None
+
+    def new_episodes(self, n):
+        """
+        :param n: number of games that start
+        :return: (n,) array of their episode ids
+        """
+        first = self.episode_count
+        self.episode_count += n
+        return np.arange(first, first + n)
+
+    def decision(self, episode, frame, obs, jump):
+        """
+        one decision of one bird
+        :param episode: episode id (int)
+        :param frame: frame of the game (int)
+        :param obs: the three inputs
+        :param jump: whether the bird jumped (bool)
+        :return: None
+        """
+        self.frames.add((episode, frame, tuple(obs), jump))
+
+    def decisions(self, episode, frame, obs, jump):
+        """
+        decisions of many birds
+        :param episode: (n,) episode ids
+        :param frame: (n,) frames, or one frame for all
+        :param obs: (n, 3) inputs
+        :param jump: (n,) bool
+        :return: None
+        """
+        self.frames.extend(len(episode), {'episode': episode, 'frame': frame, 'obs': obs, 'jump': jump})
+
+    def outcomes(self, episode, genome, seed, frames, score, death, fitness):
+        """
+        how finished games went, every argument is an (n,) array or one
+        value for all
+        :param episode: episode ids
+        :param genome: genome keys, -1 when not known
+        :param seed: course seeds, -1 for a course that was not seeded
+        :param frames: frames every game lasted
+        :param score: pipes passed
+        :param death: flappy_sim.DEATH_*
+        :param fitness: fitness of every game
+        :return: None
+        """
+        self.episodes.extend(len(episode), {'episode': episode, 'genome': genome, 'seed': seed, 'frames': frames,
+                                            'score': score, 'death': death, 'fitness': fitness})
+
+    def observe(self, game):
+        """
+        record a flappy_sim.BatchGame as it is played, meant as the
+        observer of BatchGame.run; game i of a batch is episode
+        first + i, with first the episode_count when the batch started,
+        and its outcome has the genome key the game was given
+        :param game: flappy_sim.BatchGame
+        :return: None
+        """
+        if game is not self._game:
+            self._game = game
+            self._first = self.new_episodes(game.n)[0] if game.n else self.episode_count
+            self._playing = np.ones(game.n, dtype=bool)
+        played = np.flatnonzero(self._playing)
+        self.decisions(self._first + played, game.frame[played], game.obs[played], game.jumped[played])
+        ended = played[~game.alive[played]]
+        if len(ended):
+            self.outcomes(self._first + ended, game.key[ended], game.courses.seeds[game.course[ended]],
+                          game.frame[ended], game.score[ended], game.death[ended], game.fitness[ended])
+            self._playing[ended] = False
+
+    def close(self):
+        """
+        write out the last chunks
+        :return: None
+        """
+        self.frames.close()
+        self.episodes.close()
+
+
+def _chunk_files(path, name):
+    return sorted(glob.glob(os.path.join(path, name + "-[0-9]*[0-9].npy")))
+
+
+def chunks(path, name="frames"):
+    """
+    the chunk files of a recording, one at a time
+    :param path: directory of the recording
+    :param name: "frames" or "episodes"
+    :return: generator of read-only memory mapped record arrays
+    """
+    for filename in _chunk_files(path, name):
+        yield np.load(filename, mmap_mode="r")
+
+
+def load(path, name="frames"):
+    """
+    a whole recording in memory
+    :param path: directory of the recording
+    :param name: "frames" or "episodes"
+    :return: FRAME_DTYPE or EPISODE_DTYPE record array
+    """
+    parts = list(chunks(path, name))
+    if not parts:
+        return np.zeros(0, dtype=FRAME_DTYPE if name == "frames" else EPISODE_DTYPE)
+    return np.concatenate(parts)
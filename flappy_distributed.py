@@ -0,0 +1,286 @@
+"""
+Coordinator/worker mode for evaluating a population on several machines.
+
+The process running run() opens a Coordinator on a TCP or UNIX socket
+address. Workers, on this machine or on others, connect to it and get
+batches of genomes plus the course seeds of the generation; they play
+the batch with flappy_sim and send back one fitness per genome.
+
+Start a worker with:
+
+    FLAPPY_AUTHKEY=<secret> python flappy_distributed.py worker HOST:PORT
+    FLAPPY_AUTHKEY=<secret> python flappy_distributed.py worker /tmp/flappy.sock
+
+Coordinator and workers prove to each other that they know the same
+secret, passed in as authkey or else taken from the FLAPPY_AUTHKEY
+environment variable; there is no default. Whoever has it can make the
+other side unpickle anything, so use a long random secret and only
+listen on addresses the workers need, not on every interface.
+
+Batches of a worker that disconnects or does not answer within
+`timeout` seconds are handed to another worker, and once all batches
+are out idle workers also pick up batches that are taking longer than
+`straggler_time`, whichever copy finishes first wins.
+"""
+import os
+import sys
+import time
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+import numpy as np
+import flappy_sim
+import flappy_cache
+
+AUTHKEY_ENV = "FLAPPY_AUTHKEY"
+
+
+def get_authkey(authkey=None):
+    """
+    the shared secret of coordinator and workers
+    :param authkey: bytes or str, None to take it from the FLAPPY_AUTHKEY
+                    environment variable
+    :return: bytes
+    """
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_ENV)
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    if not authkey:
+        raise ValueError("no authkey: pass one or set {}".format(AUTHKEY_ENV))
+    return authkey
+
+
+def parse_address(text):
+    """
+    turn "host:port" into a TCP address, anything else is a UNIX socket path
+    :param text: str
+    :return: (host, port) tuple or str
+    """
+    host, sep, port = text.rpartition(":")
+    if sep and port.isdigit():
+        return (host, int(port))
+    return text
+
+
+class _Job:
+    """
+    one generation split in batches
+    """
+
+    def __init__(self, genomes, config, seeds, how, max_score, batch_size):
+        self.config = config
+        self.seeds = list(seeds)
+        self.how = how
+        self.max_score = max_score
+        self.batches = [genomes[i:i + batch_size] for i in range(0, len(genomes), batch_size)]
+        self.fitness = [None] * len(self.batches)
+        self.frames = [None] * len(self.batches)
+        self.pending = list(range(len(self.batches)))
+        self.started = {}  # batch -> time it was last sent
+        self.tries = [0] * len(self.batches)
+        self.error = None
+
+    def finished(self):
+        return self.error is not None or all(f is not None for f in self.fitness)
+
+
+class Coordinator:
+    """
+    hands out genome batches to the connected workers
+    """
+
+    def __init__(self, address, authkey=None, batch_size=25, timeout=120.0, straggler_time=5.0, max_retries=3):
+        """
+        :param address: (host, port) or UNIX socket path to listen on
+        :param authkey: shared secret of coordinator and workers (bytes),
+                        see get_authkey
+        :param batch_size: genomes per batch (int)
+        :param timeout: drop a worker that takes longer than this on a batch (seconds)
+        :param straggler_time: send a batch to a second worker after this long (seconds)
+        :param max_retries: times a batch can be lost before evaluate gives up (int)
+        :return: None
+        """
+        self.authkey = get_authkey(authkey)
+        self.listener = Listener(address, authkey=self.authkey)
+        self.address = self.listener.address
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.straggler_time = straggler_time
+        self.max_retries = max_retries
+        self.workers = 0
+        self._job = None
+        self._closed = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        delay = 0.01
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except (EOFError, multiprocessing.AuthenticationError):
+                # a client that went away or has the wrong key
+                continue
+            except OSError:
+                if self._closed:
+                    return
+                # e.g. out of file descriptors, try again a bit later
+                time.sleep(delay)
+                delay = min(2 * delay, 1.0)
+                continue
+            delay = 0.01
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _next_batch(self):
+        # called with the lock held, waits until there is something to send
+        while not self._closed:
+            job = self._job
+            if job is not None and not job.finished():
+                if job.pending:
+                    batch = job.pending.pop(0)
+                    job.started[batch] = time.monotonic()
+                    return job, batch
+                now = time.monotonic()
+                for batch, started in job.started.items():
+                    if job.fitness[batch] is None and now - started > self.straggler_time:
+                        job.started[batch] = now
+                        return job, batch
+            self._cond.wait(0.5)
+        return None, None
+
+    def _serve(self, conn):
+        config_sent = None
+        job = batch = None
+        with self._cond:
+            self.workers += 1
+            self._cond.notify_all()
+        try:
+            while True:
+                with self._cond:
+                    job, batch = self._next_batch()
+                if job is None:
+                    return
+                if job.config is not config_sent:
+                    conn.send(("config", job.config))
+                    config_sent = job.config
+                conn.send(("eval", batch, job.batches[batch], job.seeds, job.how, job.max_score))
+                if not conn.poll(self.timeout):
+                    raise TimeoutError("worker took longer than {} s".format(self.timeout))
+                kind, result_batch, fitness, frames = conn.recv()
+                with self._cond:
+                    if job.fitness[result_batch] is None:
+                        job.fitness[result_batch] = fitness
+                        job.frames[result_batch] = frames
+                    job = batch = None
+                    self._cond.notify_all()
+        except (EOFError, OSError, TimeoutError):
+            pass
+        finally:
+            conn.close()
+            with self._cond:
+                self.workers -= 1
+                if job is not None and job.fitness[batch] is None:
+                    job.tries[batch] += 1
+                    if job.tries[batch] > self.max_retries:
+                        job.error = RuntimeError("batch {} failed on {} workers".format(batch, job.tries[batch]))
+                    elif batch not in job.pending:
+                        job.pending.insert(0, batch)
+                self._cond.notify_all()
+
+    def evaluate(self, genomes, config, seeds, how="mean", max_score=flappy_sim.MAX_SCORE, frames=None):
+        """
+        play every genome on every course on the workers
+        :param genomes: list of (genome_id, genome)
+        :param config: neat config, sent to each worker once
+        :param seeds: course seeds
+        :param how: how to aggregate the courses, see flappy_sim.aggregate
+        :param max_score: stop a game once its score goes over this
+        :param frames: optional (courses, genomes) array, gets the frames every game lasted
+        :return: (genomes,) fitness array
+        """
+        job = _Job(list(genomes), config, seeds, how, max_score, self.batch_size)
+        idle_since = time.monotonic()
+        with self._cond:
+            self._job = job
+            self._cond.notify_all()
+            while not job.finished():
+                if self.workers:
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since > self.timeout:
+                    job.error = RuntimeError("no workers connected to {!r}".format(self.address))
+                    break
+                self._cond.wait(0.5)
+            self._job = None
+        if job.error is not None:
+            raise job.error
+        if frames is not None and job.frames:
+            frames[...] = np.concatenate(job.frames, axis=1)
+        return np.concatenate(job.fitness)
+
+    def close(self):
+        """
+        stop accepting workers, connected workers exit after their batch
+        :return: None
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.listener.close()
+
+
+def evaluate_batch(genomes, config, seeds, how, max_score, net_cache):
+    """
+    what a worker does with a batch
+    :return: ((genomes,) fitness array, (courses, genomes) frames every game lasted)
+    """
+    nets = [net_cache.create(genome, config) for genome_id, genome in genomes]
+    frames = np.empty((len(seeds), len(nets)), dtype=np.int64)
+    return flappy_sim.evaluate_courses(nets, seeds, how, max_score, frames)[0], frames
+
+
+def worker(address, authkey=None):
+    """
+    connect to a coordinator and evaluate batches until it goes away
+    :param address: (host, port) or UNIX socket path
+    :param authkey: bytes, see get_authkey
+    :return: None
+    """
+    conn = Client(address, authkey=get_authkey(authkey))
+    config = None
+    net_cache = flappy_cache.NetCache()
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "config":
+                config = message[1]
+                net_cache = flappy_cache.NetCache()
+            elif message[0] == "eval":
+                kind, batch, genomes, seeds, how, max_score = message
+                conn.send(("result", batch) + evaluate_batch(genomes, config, seeds, how, max_score, net_cache))
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def start_local_workers(address, n, authkey=None):
+    """
+    start n worker processes on this machine
+    :param address: address the coordinator listens on
+    :param n: int
+    :param authkey: bytes, see get_authkey
+    :return: list of multiprocessing.Process
+    """
+    authkey = get_authkey(authkey)
+    procs = [multiprocessing.Process(target=worker, args=(address, authkey), daemon=True) for i in range(n)]
+    for p in procs:
+        p.start()
+    return procs
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != "worker":
+        print("usage: {}=<secret> python flappy_distributed.py worker HOST:PORT|SOCKET_PATH".format(AUTHKEY_ENV))
+        sys.exit(1)
+    worker(parse_address(sys.argv[2]))
@@ -0,0 +1,97 @@
+"""
+Gym style vectorized environment on top of the flappy_sim engine, so
+other controllers can be benchmarked against NEAT on the same game.
+
+    env = VecEnv(64)
+    obs = env.reset(seeds)
+    obs, rewards, dones = env.step(actions)
+
+Observations are the three inputs eval_genomes feeds the net and a
+step's reward is what that frame adds to the genome's fitness, so the
+rewards of an episode add up to the fitness eval_genomes would give.
+Finished environments are reset right away on their next course, like
+the gym VecEnvs do. All arrays are allocated once; step writes into
+them and returns them, so copy what you want to keep.
+"""
+import time
+import numpy as np
+import flappy_sim
+
+
+class VecEnv:
+    """
+    num_envs flappy bird games behind a reset/step interface
+    """
+
+    def __init__(self, num_envs, max_score=flappy_sim.MAX_SCORE):
+        """
+        :param num_envs: number of games (int)
+        :param max_score: end an episode once its score goes over this, None to never stop
+        :return: None
+        """
+        self.num_envs = num_envs
+        self.courses = flappy_sim.CourseTable(np.arange(num_envs))
+        self.game = flappy_sim.BatchGame(self.courses, np.arange(num_envs), max_score)
+        self.rewards = np.zeros(num_envs)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.deaths = np.zeros(num_envs, dtype=np.int8)  # flappy_sim.DEATH_* of the last finished episode
+        self.terminal_obs = np.zeros((num_envs, 3))  # last observation of the last finished episode
+        self._last = np.zeros(num_envs)
+
+    def reset(self, seeds):
+        """
+        start every environment on a new course
+        :param seeds: one course seed per environment
+        :return: (num_envs, 3) observations
+        """
+        seeds = list(seeds)
+        if len(seeds) != self.num_envs:
+            raise ValueError("reset needs {} seeds, got {}".format(self.num_envs, len(seeds)))
+        for row, seed in enumerate(seeds):
+            self.courses.reseed(row, seed)
+        self.game.reset()
+        self._last[:] = 0
+        return self.game.begin_frame()
+
+    def step(self, actions):
+        """
+        finish the current frame with the given jump decisions and start
+        the next one
+        :param actions: (num_envs,) array, truthy where the bird should jump
+        :return: (observations, rewards, dones)
+        """
+        game = self.game
+        game.end_frame(actions)
+        np.subtract(game.fitness, self._last, out=self.rewards)
+        np.logical_not(game.alive, out=self.dones)
+        if self.dones.any():
+            np.copyto(self.terminal_obs, game.obs, where=self.dones[:, None])
+            np.copyto(self.deaths, game.death, where=self.dones)
+            # the next course of an environment is seed + num_envs
+            for row in np.flatnonzero(self.dones):
+                self.courses.reseed(row, self.courses.seeds[row] + self.num_envs)
+            game.reset(self.dones)
+        np.copyto(self._last, game.fitness)
+        return game.begin_frame(), self.rewards, self.dones
+
+
+def benchmark(num_envs=1024, steps=2000):
+    """
+    steps per second of the environment with random actions
+    :param num_envs: int
+    :param steps: int
+    :return: float
+    """
+    env = VecEnv(num_envs)
+    rng = np.random.default_rng(0)
+    actions = rng.random((64, num_envs)) < 0.05
+    env.reset(np.arange(num_envs))
+    start = time.perf_counter()
+    for i in range(steps):
+        env.step(actions[i % 64])
+    return num_envs * steps / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    for n in (1, 64, 1024, 16384):
+        print("{:>6} envs: {:>12,.0f} steps/s".format(n, benchmark(n)))
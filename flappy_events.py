@@ -0,0 +1,429 @@
+"""
+Event driven version of a single flappy_sim game, for controllers that
+only have to act on some frames. Between two events the bird flies a
+fixed parabola and the pipes slide left by PIPE_VEL, so instead of
+stepping every frame the game jumps to the next event in closed form.
+The events are
+
+  - the controller's next jump
+  - a frame in a pipe's x range where the bird is not well inside the
+    gap, the only frames a collision is possible in
+  - passing a pipe
+  - hitting the floor or the ceiling
+
+and those frames are played exactly like BatchGame plays them. The
+bird's y after t frames since its last jump is the jump height plus a
+table lookup, its tilt and wing flap image follow from t and a counter,
+and all of them are halves or integers, so no rounding differs from the
+frame by frame game. The +0.1 per frame is added one frame at a time in
+the same order (in C, with np.add.accumulate), so the fitness comes out
+bit identical too.
+
+A controller is called with the game before the first frame and after
+every event and returns how many frames from now it wants to jump (1
+is the next frame), or None not to jump before the next event:
+
+    game = EventGame(seed, max_score=None)
+    game.run(GapController(), max_frames=10**6)
+    print(game.score, game.fitness)
+
+A neural net needs its inputs on every frame, so it can't skip any.
+This is for controllers that can say when they will act next, like the
+ones used for endurance tests of the game itself.
+"""
+import time
+import bisect
+import numpy as np
+import flappy_sim
+from flappy_sim import (BIRD_X, BIRD_Y, BIRD_WIDTH, BIRD_HEIGHT, PIPE_GAP, PIPE_VEL, PIPE_START_X,
+                        PIPE_WIDTH, PIPE_SPACING, PIPE_PERIOD, FIRST_PASS_FRAME, FLOOR,
+                        ANIMATION_TIME, JUMP_VEL, FRAME_REWARD, PIPE_REWARD,
+                        COLLIDE_PENALTY, MAX_SCORE)
+
+CEILING_Y = -50  # dead once y is under this
+FLOOR_Y = FLOOR - BIRD_HEIGHT + 10  # dead once y is this or more
+# a bird with y in pipe height + (0..SAFE_BOTTOM) is inside the gap, whatever its image
+SAFE_BOTTOM = PIPE_GAP - 1 - BIRD_HEIGHT
+
+
+class _Trajectory:
+    """
+    displacement, y and tilt of the bird t frames after a jump (or the
+    start of the game), without another jump in between
+    """
+
+    def __init__(self, vel, size=flappy_sim.PATH_FRAMES):
+        # y goes up by 16 a frame and tilt stays the same after size frames
+        y, tilt = flappy_sim.trajectory(vel, size)
+        self.y = y.tolist()  # y relative to the height it started at
+        self.tilt = tilt.tolist()
+        self.size = size
+        # y falls (goes up the screen) until apex and never falls again after it
+        self.apex = max([t for t in range(1, size + 1) if self.y[t] < self.y[t - 1]], default=0)
+        self.nose_dive = min(t for t in range(1, size + 1) if self.tilt[t] <= -80)
+
+    def at(self, t):
+        """
+        :param t: frames since the jump (int)
+        :return: y relative to the jump height (float)
+        """
+        if t <= self.size:
+            return self.y[t]
+        return self.y[self.size] + 16 * (t - self.size)
+
+    def tilt_at(self, t):
+        return self.tilt[min(t, self.size)]
+
+    def first_over(self, limit, lo, hi):
+        # first t in lo..hi where y > limit, y not falling on lo..hi
+        if hi <= self.size:
+            t = bisect.bisect_right(self.y, limit, lo, hi + 1)
+        elif self.at(self.size) > limit:
+            t = bisect.bisect_right(self.y, limit, lo, self.size + 1)
+        else:
+            t = max(self.size + int((limit - self.at(self.size)) // 16) + 1, lo)
+        return t if t <= hi else None
+
+    def first_under(self, limit, lo, hi):
+        # first t in lo..hi where y < limit, y only falling on lo..hi (hi <= apex)
+        for t in range(lo, hi + 1):
+            if self.y[t] < limit:
+                return t
+        return None
+
+    def first_outside(self, lo, hi, start, end):
+        """
+        first t in start..end where y < lo or y > hi
+        :return: int or None
+        """
+        if start > end:
+            return None
+        if start <= self.apex:
+            a, b = start, min(self.apex, end)
+            if self.y[a] > hi:
+                return a
+            if self.y[b] < lo:
+                return self.first_under(lo, a, b)
+            start = b + 1
+        if start > end:
+            return None
+        if self.at(start) < lo:
+            return start
+        return self.first_over(hi, start, end)
+
+
+TRAJECTORIES = {0.0: _Trajectory(0.0), JUMP_VEL: _Trajectory(JUMP_VEL)}
+
+IMAGE = flappy_sim.FLAP_IMAGES.tolist()
+FLAP_PERIOD = flappy_sim.FLAP_PERIOD
+
+_rewards = np.full(4097, FRAME_REWARD)
+_sums = np.empty(4097)
+
+
+def add_frame_rewards(fitness, frames):
+    """
+    fitness + FRAME_REWARD, frames times over, with the float rounding of
+    adding it one frame at a time
+    :param fitness: float
+    :param frames: int
+    :return: float
+    """
+    while frames > 0:
+        n = min(frames, len(_rewards) - 1)
+        _rewards[0] = fitness
+        np.add.accumulate(_rewards[:n + 1], out=_sums[:n + 1])
+        fitness = float(_sums[n])
+        frames -= n
+    return fitness
+
+
+def observed_pipe(frame):
+    """
+    the pipe eval_genomes feeds the net the distances to in a frame
+    :param frame: int
+    :return: pipe index on the course (int)
+    """
+    return max(-((-PIPE_VEL * frame + PIPE_VEL + PIPE_START_X + PIPE_WIDTH - BIRD_X) // PIPE_SPACING), 0)
+
+
+def pipe_window(k):
+    """
+    the frames pipe k overlaps the bird's columns in, the only frames
+    it can hit the bird
+    :param k: pipe index (int)
+    :return: (first frame, last frame)
+    """
+    left = PIPE_START_X + PIPE_SPACING * k
+    first = max(-(-(left - (BIRD_X + BIRD_WIDTH - 1)) // PIPE_VEL), 1)
+    last = -(-(left - (BIRD_X - PIPE_WIDTH)) // PIPE_VEL) - 1
+    return first, last
+
+
+def next_pass(frame):
+    """
+    :param frame: int
+    :return: the first frame from frame on that passes a pipe
+    """
+    if frame <= FIRST_PASS_FRAME:
+        return FIRST_PASS_FRAME
+    return FIRST_PASS_FRAME + -(-(frame - FIRST_PASS_FRAME) // PIPE_PERIOD) * PIPE_PERIOD
+
+
+class EventGame:
+    """
+    one game of flappy_sim, played from event to event
+    """
+
+    def __init__(self, seed, max_score=MAX_SCORE):
+        """
+        :param seed: course seed (int)
+        :param max_score: end the game once the score goes over this, None to never stop
+        :return: None
+        """
+        self.courses = flappy_sim.CourseTable([seed])
+        self.max_score = max_score
+        self.frame = 0
+        self.vel = 0.0
+        self.tick = 0
+        self.height = float(BIRD_Y)
+        self.y = float(BIRD_Y)
+        self.tilt = 0
+        self.img_count = 0
+        self.img = 0
+        self.alive = True
+        self.fitness = 0.0
+        self.score = 0
+        self.death = flappy_sim.DEATH_NONE
+        self.steps = 0  # frames played one by one, the rest were skipped
+
+    def pipe_height(self, k):
+        """
+        :param k: pipe index (int)
+        :return: height of the gap's top of pipe k (int)
+        """
+        self.courses.ensure(k)
+        return int(self.courses.heights[0, k])
+
+    def first_frame(self, lo, hi, first, last):
+        """
+        first frame in first..last where the bird, not jumping from now
+        on, is above lo or below hi after its move (y < lo or y > hi)
+        :return: frame (int) or None
+        """
+        trajectory = TRAJECTORIES[self.vel]
+        offset = self.tick - self.frame
+        t = trajectory.first_outside(lo - self.height, hi - self.height, first + offset, last + offset)
+        return None if t is None else t - offset
+
+    def advance(self, frames):
+        """
+        skip frames in which nothing but the bird's fall and the pipes'
+        slide happens
+        :param frames: int
+        :return: None
+        """
+        if frames <= 0:
+            return
+        trajectory = TRAJECTORIES[self.vel]
+        self.frame += frames
+        self.fitness = add_frame_rewards(self.fitness, frames)
+        self.tick += frames
+        self.y = self.height + trajectory.at(self.tick)
+        self.tilt = trajectory.tilt_at(self.tick)
+        if self.tick >= trajectory.nose_dive:
+            self.img_count = ANIMATION_TIME*2
+            self.img = 1
+        else:
+            self.img_count = (self.img_count + frames) % FLAP_PERIOD
+            self.img = IMAGE[self.img_count]
+
+    def step(self, jump):
+        """
+        play one frame the way BatchGame.begin_frame and end_frame do
+        :param jump: bool
+        :return: None
+        """
+        trajectory = TRAJECTORIES[self.vel]
+        self.steps += 1
+        self.frame += 1
+        self.fitness += FRAME_REWARD
+        self.tick += 1
+        self.y = self.height + trajectory.at(self.tick)
+        self.tilt = trajectory.tilt_at(self.tick)
+
+        if jump:
+            self.vel = JUMP_VEL
+            self.tick = 0
+            self.height = self.y
+
+        if self.collide():
+            self.fitness += COLLIDE_PENALTY
+            self.death = flappy_sim.DEATH_PIPE
+            self.alive = False
+
+        if self.alive and self.frame == next_pass(self.frame):
+            self.fitness += PIPE_REWARD
+            self.score += 1
+
+        if self.alive and self.y + BIRD_HEIGHT - 10 >= FLOOR:
+            self.death = flappy_sim.DEATH_FLOOR
+            self.alive = False
+        if self.alive and self.y < CEILING_Y:
+            self.death = flappy_sim.DEATH_CEILING
+            self.alive = False
+
+        if self.alive:
+            # Bird.draw
+            self.img_count += 1
+            self.img = IMAGE[self.img_count % FLAP_PERIOD]
+            if self.img_count == FLAP_PERIOD:
+                self.img_count = 0
+            if self.tilt <= -80:
+                self.img = 1
+                self.img_count = ANIMATION_TIME*2
+
+        if self.max_score is not None and self.score > self.max_score:
+            self.alive = False
+
+    def collide(self):
+        """
+        the collision test of BatchGame.collide for this frame
+        :return: bool
+        """
+        k = (PIPE_VEL * self.frame + BIRD_X + BIRD_WIDTH - 1 - PIPE_START_X) // PIPE_SPACING
+        x = flappy_sim.pipe_x(k, self.frame)
+        if k < 0 or x <= BIRD_X - PIPE_WIDTH:
+            return False
+        return bool(flappy_sim.pipe_hit(self.img, x - BIRD_X, round(self.y), self.pipe_height(k)))
+
+    def _first_close_call(self, last):
+        # first frame up to last in a pipe's window with the bird not
+        # inside the gap's safe rows
+        first = self.frame + 1
+        k = max((PIPE_VEL * first + BIRD_X + BIRD_WIDTH - 1 - PIPE_START_X) // PIPE_SPACING, 0)
+        while True:
+            start, end = pipe_window(k)
+            if start > last:
+                return None
+            start, end = max(start, first), min(end, last)
+            if start <= end:
+                height = self.pipe_height(k)
+                frame = self.first_frame(height, height + SAFE_BOTTOM, start, end)
+                if frame is not None:
+                    return frame
+            k += 1
+
+    def run(self, controller, max_frames=None):
+        """
+        play until the game ends or max_frames frames were played
+        :param controller: function (game) -> frames until its next jump or None
+        :param max_frames: int or None
+        :return: None
+        """
+        jump_at = None
+        ask = True
+        while self.alive and (max_frames is None or self.frame < max_frames):
+            if ask:
+                wait = controller(self)
+                jump_at = None if wait is None else self.frame + max(int(wait), 1)
+                ask = False
+
+            # the next frame that has to be played one by one
+            stop = next_pass(self.frame + 1)
+            if jump_at is not None:
+                stop = min(stop, jump_at)
+            death = self.first_frame(CEILING_Y, FLOOR_Y - 0.5, self.frame + 1, stop)
+            if death is not None:
+                stop = death
+            close = self._first_close_call(stop - 1)
+            if close is not None:
+                stop = close
+
+            if max_frames is not None and stop > max_frames:
+                self.advance(max_frames - self.frame)
+                break
+            self.advance(stop - self.frame - 1)
+            self.step(stop == jump_at)
+            if stop == jump_at:
+                jump_at = None
+            ask = True
+
+
+class GapController:
+    """
+    jumps whenever the bird is lower than offset pixels under the top
+    of the gap of the pipe eval_genomes would show the net
+    """
+
+    def __init__(self, offset=96):
+        """
+        :param offset: pixels (int)
+        :return: None
+        """
+        self.offset = offset
+
+    def __call__(self, game):
+        # the bird falls through any line eventually, so this ends
+        frame = game.frame + 1
+        while True:
+            k = observed_pipe(frame)
+            last = (PIPE_SPACING * k + PIPE_VEL + PIPE_START_X + PIPE_WIDTH - BIRD_X) // PIPE_VEL  # last frame k is shown
+            jump = game.first_frame(-np.inf, game.pipe_height(k) + self.offset, frame, last)
+            if jump is not None:
+                return jump - game.frame
+            frame = last + 1
+
+    def frame_policy(self, game):
+        """
+        the same controller for BatchGame, deciding frame by frame
+        :param game: flappy_sim.BatchGame
+        :return: function (obs, alive) -> bool array
+        """
+        def policy(obs, alive):
+            k = np.array([observed_pipe(int(f)) for f in game.frame])
+            game.courses.ensure(int(k.max()))
+            height = game.courses.heights[game.course, k]
+            return game.y > height + self.offset
+        return policy
+
+
+def benchmark(seeds=range(10), max_frames=20000, offset=96):
+    """
+    play GapController frame by frame with BatchGame and from event to
+    event with EventGame, check they end the same and print the times
+    :param seeds: course seeds
+    :param max_frames: stop the games after this many frames (int)
+    :param offset: see GapController
+    :return: None
+    """
+    controller = GapController(offset)
+    frame_time = event_time = 0.0
+    frames = steps = 0
+    for seed in seeds:
+        start = time.perf_counter()
+        batch = flappy_sim.BatchGame(flappy_sim.CourseTable([seed]), [0], max_score=None)
+        policy = controller.frame_policy(batch)
+        while batch.alive[0] and batch.frame[0] < max_frames:
+            obs = batch.begin_frame()
+            batch.end_frame(policy(obs, batch.alive))
+        frame_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        game = EventGame(seed, max_score=None)
+        game.run(controller, max_frames)
+        event_time += time.perf_counter() - start
+
+        event = (game.frame, game.score, game.fitness, game.death, game.y, game.img)
+        frame = (batch.frame[0], batch.score[0], batch.fitness[0], batch.death[0], batch.y[0], batch.img[0])
+        if event != frame:
+            raise RuntimeError("seed {}: event driven game ended as {}, frame by frame as {}".format(seed, event, frame))
+        frames += game.frame
+        steps += game.steps
+        print("seed {:>3}: {:>6} frames, score {:>4}, fitness {:.1f}".format(seed, game.frame, game.score, game.fitness))
+    print("frame by frame: {:.2f} s, event driven: {:.3f} s ({:.0f}x), {:.1%} of the frames played one by one".format(
+        frame_time, event_time, frame_time / event_time, steps / frames))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,521 @@
+"""
+Compact genome for big populations. neat.DefaultGenome keeps a dict of
+gene objects per genome, which costs a few hundred bytes per gene.
+CompactGenome keeps the same genes in two sorted numpy record arrays,
+one for the nodes and one for the connections, so a gene is a couple of
+dozen bytes.
+
+Connections are indexed by an innovation number that is the packed
+(input node, output node) key, so the same connection has the same
+number in every genome and every process, and crossover and distance
+line genes up with a searchsorted instead of dict lookups. Crossover,
+mutation, distance and compiling the network all work on the arrays;
+the [CompactGenome] section of the config has the same parameters and
+meaning as [DefaultGenome].
+
+It works with neat.DefaultReproduction and neat.DefaultSpeciesSet, and
+with flappy_reproduction.BatchReproduction, which reads and makes the
+gene arrays directly. The nodes and connections properties build neat
+gene dicts on demand for code that wants those, like genome printing.
+
+    python flappy_genome.py     # memory benchmark against DefaultGenome
+"""
+import random
+import tracemalloc
+import numpy as np
+import neat
+from neat.genes import DefaultNodeGene, DefaultConnectionGene
+from neat.genome import DefaultGenomeConfig
+from neat.graphs import creates_cycle, feed_forward_layers
+from neat.six_util import iteritems
+import flappy_reproduction
+
+NODE_DTYPE = np.dtype([('key', '<i4'), ('bias', '<f8'), ('response', '<f8'),
+                       ('activation', 'u1'), ('aggregation', 'u1')])
+CONN_DTYPE = np.dtype([('key', '<i8'), ('weight', '<f8'), ('enabled', '?')])
+
+# innovation number of connection (i, o): input keys are negative, so
+# they are shifted up before going in the high 32 bits
+INPUT_OFFSET = 1 << 30
+
+# activation and aggregation names are stored as codes into NAMES. The
+# built in functions come first in a fixed order, so codes mean the same
+# in every process; other names get a code the first time they are seen.
+NAMES = sorted(set(neat.activations.ActivationFunctionSet().functions) |
+               set(neat.aggregations.AggregationFunctionSet().functions))
+_codes = dict((name, code) for code, name in enumerate(NAMES))
+
+# numpy draws of the genes, reseeded from random for every new genome so
+# random.seed() makes a run reproducible, like neat's genomes
+rng = np.random.default_rng(random.getrandbits(64))
+
+
+def _reseed():
+    global rng
+    rng = np.random.default_rng(random.getrandbits(64))
+
+
+def name_code(name):
+    """
+    :param name: activation or aggregation function name
+    :return: its code in NAMES (int)
+    """
+    code = _codes.get(name)
+    if code is None:
+        code = _codes[name] = len(NAMES)
+        NAMES.append(name)
+    return code
+
+
+def name_codes(names):
+    """
+    :param names: array of activation or aggregation function names
+    :return: uint8 array of their codes in NAMES
+    """
+    codes = dict((name, name_code(name)) for name in set(names.tolist()))
+    return np.fromiter((codes[name] for name in names.tolist()), dtype=np.uint8, count=len(names))
+
+
+def conn_key(i, o):
+    """
+    innovation number of the connection from node i to node o
+    :param i: int or int array
+    :param o: int or int array
+    :return: int or int64 array
+    """
+    return ((i + INPUT_OFFSET) << 32) | o
+
+
+def conn_nodes(keys):
+    """
+    the (input node, output node) of innovation numbers
+    :param keys: int64 array
+    :return: (int64 array, int64 array)
+    """
+    return (keys >> 32) - INPUT_OFFSET, keys & 0xffffffff
+
+
+def _attribute(gene_type, name):
+    for a in gene_type._gene_attributes:
+        if a.name == name:
+            return a
+    raise KeyError(name)
+
+
+def _new_nodes(config, keys):
+    # create_node for every key
+    genes = np.zeros(len(keys), dtype=NODE_DTYPE)
+    genes['key'] = keys
+    for name in ('bias', 'response'):
+        genes[name] = flappy_reproduction.init_values(_attribute(config.node_gene_type, name), config, len(keys), rng)
+    for name in ('activation', 'aggregation'):
+        values = flappy_reproduction.init_values(_attribute(config.node_gene_type, name), config, len(keys), rng)
+        genes[name] = [name_code(v) for v in values]
+    return genes
+
+
+def _new_connections(config, keys):
+    # create_connection for every key
+    genes = np.zeros(len(keys), dtype=CONN_DTYPE)
+    genes['key'] = keys
+    for name in ('weight', 'enabled'):
+        genes[name] = flappy_reproduction.init_values(_attribute(config.connection_gene_type, name),
+                                                      config, len(keys), rng)
+    return genes
+
+
+def _merge(genes, new):
+    # add genes, keeping them sorted by key
+    genes = np.concatenate([genes, new])
+    return genes[np.argsort(genes['key'], kind='stable')]
+
+
+def _crossover(genes1, genes2, fields):
+    # the genes of the fitter parent, homologous ones take each field
+    # from either parent
+    child = genes1.copy()
+    if len(genes2) and len(child):
+        pos = np.minimum(np.searchsorted(genes2['key'], child['key']), len(genes2) - 1)
+        homologous = genes2['key'][pos] == child['key']
+        for field in fields:
+            take = homologous & (rng.random(len(child)) <= 0.5)
+            child[field][take] = genes2[field][pos[take]]
+    return child
+
+
+def _distance(genes1, genes2, numeric, categorical, config):
+    # node or connection part of DefaultGenome.distance
+    if not len(genes1) and not len(genes2):
+        return 0.0
+    d = 0.0
+    homologous = 0
+    if len(genes1) and len(genes2):
+        pos = np.minimum(np.searchsorted(genes2['key'], genes1['key']), len(genes2) - 1)
+        same = genes2['key'][pos] == genes1['key']
+        a, b = genes1[same], genes2[pos[same]]
+        homologous = len(a)
+        total = np.zeros(homologous)
+        for field in numeric:
+            total += np.abs(a[field] - b[field])
+        for field in categorical:
+            total += a[field] != b[field]
+        d = float(np.sum(total * config.compatibility_weight_coefficient))
+    disjoint = len(genes1) + len(genes2) - 2 * homologous
+    return (d + config.compatibility_disjoint_coefficient * disjoint) / max(len(genes1), len(genes2))
+
+
+class CompactGenome:
+    """
+    genome with its genes in numpy record arrays, sorted by key
+    """
+
+    __slots__ = ('key', 'fitness', 'node_genes', 'conn_genes')
+
+    def __init__(self, key):
+        """
+        :param key: genome id
+        :return: None
+        """
+        self.key = key
+        self.fitness = None
+        self.node_genes = np.zeros(0, dtype=NODE_DTYPE)
+        self.conn_genes = np.zeros(0, dtype=CONN_DTYPE)
+
+    @classmethod
+    def parse_config(cls, param_dict):
+        param_dict['node_gene_type'] = DefaultNodeGene
+        param_dict['connection_gene_type'] = DefaultConnectionGene
+        return DefaultGenomeConfig(param_dict)
+
+    @classmethod
+    def write_config(cls, f, config):
+        config.save(f)
+
+    @classmethod
+    def from_arrays(cls, key, node_genes, conn_genes):
+        """
+        a genome around gene arrays, e.g. made in bulk by
+        flappy_reproduction; they are used as they are, not copied
+        :param key: genome id
+        :param node_genes: NODE_DTYPE array sorted by key
+        :param conn_genes: CONN_DTYPE array sorted by key
+        :return: CompactGenome
+        """
+        genome = cls.__new__(cls)
+        genome.key = key
+        genome.fitness = None
+        genome.node_genes = node_genes
+        genome.conn_genes = conn_genes
+        return genome
+
+    @classmethod
+    def from_genome(cls, genome):
+        """
+        :param genome: neat.DefaultGenome
+        :return: CompactGenome with the same genes
+        """
+        compact = cls(genome.key)
+        compact.fitness = genome.fitness
+        nodes = sorted(genome.nodes.values(), key=lambda n: n.key)
+        compact.node_genes = np.array([(n.key, n.bias, n.response, name_code(n.activation), name_code(n.aggregation))
+                                       for n in nodes], dtype=NODE_DTYPE)
+        conns = sorted((conn_key(*c.key), c.weight, c.enabled) for c in genome.connections.values())
+        compact.conn_genes = np.array(conns, dtype=CONN_DTYPE)
+        return compact
+
+    def to_genome(self):
+        """
+        :return: neat.DefaultGenome with the same genes
+        """
+        genome = neat.DefaultGenome(self.key)
+        genome.fitness = self.fitness
+        genome.nodes = self.nodes
+        genome.connections = self.connections
+        return genome
+
+    @property
+    def nodes(self):
+        """
+        node key -> DefaultNodeGene, built on every access, so changing
+        it does not change the genome
+        """
+        nodes = {}
+        for key, bias, response, activation, aggregation in self.node_genes.tolist():
+            gene = DefaultNodeGene(key)
+            gene.bias, gene.response = bias, response
+            gene.activation, gene.aggregation = NAMES[activation], NAMES[aggregation]
+            nodes[key] = gene
+        return nodes
+
+    @property
+    def connections(self):
+        """
+        connection key -> DefaultConnectionGene, built on every access,
+        so changing it does not change the genome
+        """
+        connections = {}
+        ins, outs = conn_nodes(self.conn_genes['key'])
+        for i, o, weight, enabled in zip(ins.tolist(), outs.tolist(), self.conn_genes['weight'].tolist(),
+                                         self.conn_genes['enabled'].tolist()):
+            gene = DefaultConnectionGene((i, o))
+            gene.weight, gene.enabled = weight, enabled
+            connections[(i, o)] = gene
+        return connections
+
+    def configure_new(self, config):
+        """Configure a new genome based on the given configuration."""
+        _reseed()
+        # DefaultGenome knows every initial_connection type, copy what it makes
+        genome = neat.DefaultGenome(self.key)
+        genome.configure_new(config)
+        compact = CompactGenome.from_genome(genome)
+        self.node_genes, self.conn_genes = compact.node_genes, compact.conn_genes
+
+    def configure_crossover(self, genome1, genome2, config):
+        """ Configure a new genome by crossover from two parent genomes. """
+        _reseed()
+        assert isinstance(genome1.fitness, (int, float))
+        assert isinstance(genome2.fitness, (int, float))
+        if genome1.fitness > genome2.fitness:
+            parent1, parent2 = genome1, genome2
+        else:
+            parent1, parent2 = genome2, genome1
+        self.node_genes = _crossover(parent1.node_genes, parent2.node_genes,
+                                     ('bias', 'response', 'activation', 'aggregation'))
+        self.conn_genes = _crossover(parent1.conn_genes, parent2.conn_genes, ('weight', 'enabled'))
+
+    def mutate(self, config):
+        """ Mutates this genome. """
+        if config.single_structural_mutation:
+            div = max(1, (config.node_add_prob + config.node_delete_prob +
+                          config.conn_add_prob + config.conn_delete_prob))
+            r = random.random()
+            if r < (config.node_add_prob / div):
+                self.mutate_add_node(config)
+            elif r < ((config.node_add_prob + config.node_delete_prob) / div):
+                self.mutate_delete_node(config)
+            elif r < ((config.node_add_prob + config.node_delete_prob +
+                       config.conn_add_prob) / div):
+                self.mutate_add_connection(config)
+            elif r < ((config.node_add_prob + config.node_delete_prob +
+                       config.conn_add_prob + config.conn_delete_prob) / div):
+                self.mutate_delete_connection()
+        else:
+            if random.random() < config.node_add_prob:
+                self.mutate_add_node(config)
+            if random.random() < config.node_delete_prob:
+                self.mutate_delete_node(config)
+            if random.random() < config.conn_add_prob:
+                self.mutate_add_connection(config)
+            if random.random() < config.conn_delete_prob:
+                self.mutate_delete_connection()
+
+        # Mutate connection genes, then node genes.
+        for name in ('weight', 'enabled'):
+            flappy_reproduction.mutate_values(_attribute(config.connection_gene_type, name), config,
+                                              self.conn_genes[name], rng)
+        for name in ('bias', 'response'):
+            flappy_reproduction.mutate_values(_attribute(config.node_gene_type, name), config,
+                                              self.node_genes[name], rng)
+        for name in ('activation', 'aggregation'):
+            attr = _attribute(config.node_gene_type, name)
+            mutate_rate = getattr(config, attr.mutate_rate_name)
+            if mutate_rate > 0:
+                change = rng.random(len(self.node_genes)) < mutate_rate
+                options = getattr(config, attr.options_name)
+                self.node_genes[name][change] = [name_code(options[i])
+                                                 for i in rng.integers(0, len(options), int(change.sum()))]
+
+    def mutate_add_node(self, config):
+        if not len(self.conn_genes):
+            if config.check_structural_mutation_surer():
+                self.mutate_add_connection(config)
+            return
+
+        # Choose a random connection to split
+        split = random.randrange(len(self.conn_genes))
+        new_node_id = config.get_new_node_key(dict.fromkeys(self.node_genes['key'].tolist()))
+        self.node_genes = _merge(self.node_genes, _new_nodes(config, [new_node_id]))
+
+        # Disable this connection and go through the new node with a
+        # connection of weight 1 and one with the old weight.
+        self.conn_genes['enabled'][split] = False
+        i, o = conn_nodes(self.conn_genes['key'][split])
+        new = np.zeros(2, dtype=CONN_DTYPE)
+        new['key'] = [conn_key(int(i), new_node_id), conn_key(new_node_id, int(o))]
+        new['weight'] = [1.0, self.conn_genes['weight'][split]]
+        new['enabled'] = True
+        self.conn_genes = _merge(self.conn_genes, new)
+
+    def mutate_add_connection(self, config):
+        """
+        Attempt to add a new connection, the only restriction being that the output
+        node cannot be one of the network input pins.
+        """
+        possible_outputs = self.node_genes['key'].tolist()
+        out_node = random.choice(possible_outputs)
+        in_node = random.choice(possible_outputs + config.input_keys)
+
+        # Don't duplicate connections.
+        key = conn_key(in_node, out_node)
+        pos = int(np.searchsorted(self.conn_genes['key'], key))
+        if pos < len(self.conn_genes) and self.conn_genes['key'][pos] == key:
+            if config.check_structural_mutation_surer():
+                self.conn_genes['enabled'][pos] = True
+            return
+
+        # Don't allow connections between two output nodes
+        if in_node in config.output_keys and out_node in config.output_keys:
+            return
+
+        # For feed-forward networks, avoid creating cycles.
+        if config.feed_forward:
+            ins, outs = conn_nodes(self.conn_genes['key'])
+            if creates_cycle(list(zip(ins.tolist(), outs.tolist())), (in_node, out_node)):
+                return
+
+        self.conn_genes = _merge(self.conn_genes, _new_connections(config, [key]))
+
+    def mutate_delete_node(self, config):
+        # Do nothing if there are no non-output nodes.
+        available_nodes = [k for k in self.node_genes['key'].tolist() if k not in config.output_keys]
+        if not available_nodes:
+            return -1
+
+        del_key = random.choice(available_nodes)
+        ins, outs = conn_nodes(self.conn_genes['key'])
+        self.conn_genes = self.conn_genes[(ins != del_key) & (outs != del_key)]
+        self.node_genes = self.node_genes[self.node_genes['key'] != del_key]
+        return del_key
+
+    def mutate_delete_connection(self):
+        if len(self.conn_genes):
+            self.conn_genes = np.delete(self.conn_genes, random.randrange(len(self.conn_genes)))
+
+    def distance(self, other, config):
+        """
+        Returns the genetic distance between this genome and the other. This distance value
+        is used to compute genome compatibility for speciation.
+        """
+        return (_distance(self.node_genes, other.node_genes, ('bias', 'response'),
+                          ('activation', 'aggregation'), config) +
+                _distance(self.conn_genes, other.conn_genes, ('weight',), ('enabled',), config))
+
+    def size(self):
+        """
+        Returns genome 'complexity', taken to be
+        (number of nodes, number of enabled connections)
+        """
+        return len(self.node_genes), int(np.count_nonzero(self.conn_genes['enabled']))
+
+    def compile(self, config):
+        """
+        the network of this genome, like neat.nn.FeedForwardNetwork.create
+        :param config: neat config
+        :return: neat.nn.FeedForwardNetwork
+        """
+        gc = config.genome_config
+        enabled = self.conn_genes[self.conn_genes['enabled']]
+        ins, outs = conn_nodes(enabled['key'])
+        connections = list(zip(ins.tolist(), outs.tolist()))
+        inputs = {}
+        for (i, o), weight in zip(connections, enabled['weight'].tolist()):
+            inputs.setdefault(o, []).append((i, weight))
+
+        keys = self.node_genes['key']
+        node_evals = []
+        for layer in feed_forward_layers(gc.input_keys, gc.output_keys, connections):
+            for node in layer:
+                key, bias, response, activation, aggregation = self.node_genes[np.searchsorted(keys, node)].tolist()
+                node_evals.append((node, gc.activation_defs.get(NAMES[activation]),
+                                   gc.aggregation_function_defs.get(NAMES[aggregation]), bias, response,
+                                   inputs.get(node, [])))
+        return neat.nn.FeedForwardNetwork(gc.input_keys, gc.output_keys, node_evals)
+
+    def __str__(self):
+        s = "Key: {0}\nFitness: {1}\nNodes:".format(self.key, self.fitness)
+        for k, ng in iteritems(self.nodes):
+            s += "\n\t{0} {1!s}".format(k, ng)
+        s += "\nConnections:"
+        for c in self.connections.values():
+            s += "\n\t" + str(c)
+        return s
+
+
+def create_net(genome, config):
+    """
+    neat.nn.FeedForwardNetwork.create that compiles a CompactGenome from
+    its arrays
+    :param genome: neat.DefaultGenome or CompactGenome
+    :param config: neat config
+    :return: neat.nn.FeedForwardNetwork
+    """
+    if isinstance(genome, CompactGenome):
+        return genome.compile(config)
+    return neat.nn.FeedForwardNetwork.create(genome, config)
+
+
+def prune(net):
+    """
+    the part of a compiled network its outputs depend on. Disabled genes
+    and nodes with no path to an output are already left out by
+    compiling, but a node that only feeds nodes that are never evaluated
+    (because one of their inputs never is) is still evaluated, as are
+    links with weight 0. Those go, and then the nodes that only fed
+    them. Dropping a 0 term from a sum changes no bit of it, so the
+    pruned net gives exactly the same outputs.
+    :param net: neat.nn.FeedForwardNetwork
+    :return: neat.nn.FeedForwardNetwork
+    """
+    used = set(net.output_nodes)
+    node_evals = []
+    for node, activation, aggregation, bias, response, links in reversed(net.node_evals):
+        if node not in used:
+            continue
+        if aggregation is neat.aggregations.sum_aggregation:
+            links = [(i, w) for i, w in links if w != 0.0]
+        used.update(i for i, w in links)
+        node_evals.append((node, activation, aggregation, bias, response, links))
+    node_evals.reverse()
+    return neat.nn.FeedForwardNetwork(net.input_nodes, net.output_nodes, node_evals)
+
+
+def net_size(net):
+    """
+    :param net: neat.nn.FeedForwardNetwork
+    :return: nodes evaluated plus links followed per activation (int)
+    """
+    return sum(1 + len(links) for node, activation, aggregation, bias, response, links in net.node_evals)
+
+
+def memory_benchmark(sizes=(1000, 10000, 100000), config_file="config-feedforward.txt", mutations=5):
+    """
+    bytes a population takes as DefaultGenome and as CompactGenome
+    :param sizes: population sizes
+    :param config_file: neat config file
+    :param mutations: times every genome is mutated after configure_new, to grow it a bit
+    :return: {(genome class name, size): bytes}
+    """
+    out = {}
+    for genome_type in (neat.DefaultGenome, CompactGenome):
+        config = neat.config.Config(genome_type, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                                    neat.DefaultStagnation, config_file)
+        for n in sizes:
+            tracemalloc.start()
+            population = []
+            for key in range(n):
+                genome = genome_type(key)
+                genome.configure_new(config.genome_config)
+                for i in range(mutations):
+                    genome.mutate(config.genome_config)
+                population.append(genome)
+            out[(genome_type.__name__, n)] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del population
+    return out
+
+
+if __name__ == '__main__':
+    results = memory_benchmark()
+    for (name, n), size in sorted(results.items(), key=lambda item: (item[0][1], item[0][0])):
+        print("{:>14} {:>7}: {:>8.1f} MB, {:>5.0f} bytes per genome".format(name, n, size / 1e6, size / n))
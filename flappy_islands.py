@@ -0,0 +1,202 @@
+"""
+Island model training. A single small population converges early and
+then stalls; evolve() instead runs several independent neat populations,
+each in its own process, on seeded headless courses. Every `interval`
+generations an island sends copies of its best genomes to the next
+island in a ring, over a multiprocessing queue, and takes in whatever
+migrants are waiting for it in place of some of its new children. No
+island ever waits for another. The first island whose best genome
+reaches the target stops them all.
+
+    results = evolve(config, islands=4)
+    winner = max(results, key=lambda r: r.best.fitness).best
+
+    python flappy_islands.py    # islands against one big population
+"""
+import time
+import random
+import itertools
+import traceback
+import collections
+import multiprocessing
+import queue
+import numpy as np
+import neat
+import flappy_sim
+import flappy_cache
+import flappy_genome
+
+Result = collections.namedtuple("Result", "island best generations seconds solved")
+
+
+def _relabel(genome, keys):
+    # rename nodes, keys maps old node key -> new one
+    if isinstance(genome, flappy_genome.CompactGenome):
+        nodes = genome.node_genes
+        nodes['key'] = [keys.get(k, k) for k in nodes['key'].tolist()]
+        genome.node_genes = nodes[np.argsort(nodes['key'], kind='stable')]
+        ins, outs = flappy_genome.conn_nodes(genome.conn_genes['key'])
+        conns = genome.conn_genes
+        conns['key'] = flappy_genome.conn_key(np.array([keys.get(k, k) for k in ins.tolist()], dtype=np.int64),
+                                              np.array([keys.get(k, k) for k in outs.tolist()], dtype=np.int64))
+        genome.conn_genes = conns[np.argsort(conns['key'], kind='stable')]
+    else:
+        nodes, connections = {}, {}
+        for gene in genome.nodes.values():
+            gene.key = keys.get(gene.key, gene.key)
+            nodes[gene.key] = gene
+        for gene in genome.connections.values():
+            gene.key = (keys.get(gene.key[0], gene.key[0]), keys.get(gene.key[1], gene.key[1]))
+            connections[gene.key] = gene
+        genome.nodes, genome.connections = nodes, connections
+
+
+def _immigrate(population, migrants, parents):
+    # put copies of the migrants in place of new children, the elites that
+    # came over from the last generation (their keys are in parents) stay.
+    # Hidden node keys come from the node_indexer of the island a migrant
+    # was born on, so here they would collide with nodes of this island:
+    # they get new keys from this island's indexer, the same new key for
+    # the same old key so migrants from one island still line up
+    gc = population.config.genome_config
+    if gc.node_indexer is None:
+        # nothing here has added a node yet, every node is an output
+        gc.node_indexer = itertools.count(max(gc.output_keys) + 1)
+    keys = collections.defaultdict(lambda: next(gc.node_indexer))
+    children = [key for key in population.population if key not in parents]
+    for key, genome in zip(random.sample(children, min(len(children), len(migrants))), migrants):
+        hidden = [k for k in (genome.node_genes['key'].tolist() if isinstance(genome, flappy_genome.CompactGenome)
+                              else genome.nodes) if k not in gc.output_keys]
+        _relabel(genome, dict((k, keys[k]) for k in hidden))
+        del population.population[key]
+        genome.key = next(population.reproduction.genome_indexer)
+        genome.fitness = None
+        population.population[genome.key] = genome
+        population.reproduction.ancestors[genome.key] = tuple()
+    population.species.speciate(population.config, population.population, population.generation)
+
+
+def island(index, config, inbox, outbox, results, solved, generations, interval, migrants, courses, how,
+           fixed, target, seed):
+    """
+    one island, run in its own process by evolve()
+    :return: None, puts a Result or an ("error", index, traceback) on results
+    """
+    try:
+        random.seed(seed)
+        start = time.perf_counter()
+        population = neat.Population(config)
+        net_cache = flappy_cache.NetCache()
+        top = []
+        parents = set()
+
+        def eval_genomes(genomes, config):
+            gen = 0 if fixed else population.generation
+            seeds = [gen * courses + i for i in range(courses)]
+            nets = [net_cache.create(genome, config) for genome_id, genome in genomes]
+            fitness = flappy_sim.evaluate_courses(nets, seeds, how)[0]
+            for (genome_id, genome), f in zip(genomes, fitness):
+                genome.fitness = float(f)
+            top[:] = sorted((genome for genome_id, genome in genomes), key=lambda g: g.fitness)[-migrants:]
+            parents.clear()
+            parents.update(genome_id for genome_id, genome in genomes)
+
+        done = 0
+        while done < generations and not solved.is_set():
+            population.run(eval_genomes, 1)
+            done += 1
+            if population.best_genome.fitness >= target:
+                solved.set()
+                break
+            if migrants and done % interval == 0:
+                outbox.put(list(top))
+                arrived = []
+                try:
+                    while True:
+                        arrived.extend(inbox.get_nowait())
+                except queue.Empty:
+                    pass
+                if arrived:
+                    _immigrate(population, arrived, parents)
+        results.put(Result(index, population.best_genome, done, time.perf_counter() - start,
+                           population.best_genome.fitness >= target))
+    except Exception:
+        solved.set()
+        results.put(("error", index, traceback.format_exc()))
+    finally:
+        # migrants nobody picks up any more must not keep the process alive
+        outbox.cancel_join_thread()
+
+
+def evolve(config, islands=4, generations=100, interval=5, migrants=2, courses=5, how="mean", fixed=False,
+           target=None, seed=None):
+    """
+    run an island model, one process per island
+    :param config: neat config, every island has config.pop_size genomes
+    :param islands: number of populations (int)
+    :param generations: most generations per island (int)
+    :param interval: generations between migrations (int)
+    :param migrants: best genomes an island sends every migration (int)
+    :param courses: courses every genome plays per generation (int)
+    :param how: how to aggregate the courses, see flappy_sim.aggregate
+    :param fixed: play the same courses every generation (bool)
+    :param target: stop all islands once one has a genome this fit,
+                   config.fitness_threshold when None
+    :param seed: random seed, island i uses seed + i; a random one when None
+    :return: list of Result, one per island
+    """
+    target = config.fitness_threshold if target is None else target
+    seed = random.randrange(2 ** 31) if seed is None else seed
+    inboxes = [multiprocessing.Queue() for i in range(islands)]
+    results = multiprocessing.Queue()
+    solved = multiprocessing.Event()
+    procs = [multiprocessing.Process(target=island, daemon=True, args=(
+                 i, config, inboxes[i], inboxes[(i + 1) % islands], results, solved, generations, interval,
+                 migrants, courses, how, fixed, target, seed + i))
+             for i in range(islands)]
+    for p in procs:
+        p.start()
+    out = [results.get() for p in procs]
+    for p in procs:
+        p.join()
+    errors = [r for r in out if not isinstance(r, Result)]
+    if errors:
+        raise RuntimeError("island {} failed:\n{}".format(errors[0][1], errors[0][2]))
+    return sorted(out)
+
+
+def benchmark(islands=4, trials=3, generations=60, target=300.0, config_file="config-feedforward.txt"):
+    """
+    generations and seconds until a genome reaches the target, for islands
+    of config pop_size against one population as big as all of them
+    :param islands: int
+    :param trials: runs of each (int)
+    :param generations: give up after this many generations (int)
+    :param target: fitness to reach; a bird that reaches MAX_SCORE on
+                   every course gets about 327
+    :param config_file: neat config
+    :return: {mode: list of (generations, seconds, solved)}
+    """
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                         neat.DefaultStagnation, config_file)
+    pop_size = config.pop_size
+    out = {"islands": [], "one population": []}
+    for trial in range(trials):
+        for mode in out:
+            config.pop_size = pop_size if mode == "islands" else pop_size * islands
+            start = time.perf_counter()
+            results = evolve(config, islands if mode == "islands" else 1, generations, target=target, seed=trial)
+            seconds = time.perf_counter() - start
+            solved = [r for r in results if r.solved]
+            out[mode].append((min(r.generations for r in solved) if solved else generations, seconds, bool(solved)))
+            print("trial {} {:>14}: {:3} generations, {:6.1f} s, {}".format(
+                trial, mode, out[mode][-1][0], seconds, "solved" if solved else "not solved"))
+    config.pop_size = pop_size
+    for mode, runs in out.items():
+        print("{:>14}: mean {:.1f} generations, {:.1f} s, {} of {} solved".format(
+            mode, np.mean([r[0] for r in runs]), np.mean([r[1] for r in runs]), sum(r[2] for r in runs), trials))
+    return out
+
+
+if __name__ == '__main__':
+    benchmark()
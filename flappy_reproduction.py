@@ -0,0 +1,630 @@
+"""
+Reproduction for big populations. It picks the same elites, parents and
+spawn amounts as neat.DefaultReproduction, but the children are not made
+one genome and one gene at a time: the genes of all children are
+crossed over and mutated as arrays, with the random numbers of a
+generation drawn in bulk by numpy.
+
+Every rate of the [DefaultGenome] section is used with the meaning
+neat gives it: the four structural probabilities (or
+single_structural_mutation), structural_mutation_surer, and per
+attribute the mutate, replace, init and min/max settings. Structural
+mutations are applied to a child's gene rows, only for the children
+that drew one, before the attribute mutations like in
+DefaultGenome.mutate.
+
+Use it by passing BatchReproduction to neat.config.Config; it reads
+elitism, survival_threshold and min_species_size from its own
+[BatchReproduction] section. With flappy_genome.CompactGenome as the
+genome type the genes never leave numpy: they are read from the
+parents' arrays and the children get arrays, no gene objects are made.
+"""
+import gc as garbage
+import math
+import random
+import time
+import itertools
+import numpy as np
+import neat
+from neat.attributes import FloatAttribute, BoolAttribute
+from neat.math_util import mean
+from neat.six_util import iteritems, itervalues
+
+
+def _column(attr, values):
+    if isinstance(attr, FloatAttribute):
+        return np.array(values, dtype=float)
+    if isinstance(attr, BoolAttribute):
+        return np.array(values, dtype=bool)
+    return np.array(values, dtype=object)
+
+
+def init_values(attr, config, n, rng):
+    """
+    n new values of an attribute, like attr.init_value
+    :param attr: neat.attributes.FloatAttribute, BoolAttribute or StringAttribute
+    :param config: genome config
+    :param n: int
+    :param rng: numpy Generator
+    :return: array
+    """
+    if isinstance(attr, FloatAttribute):
+        mean_value = getattr(config, attr.init_mean_name)
+        stdev = getattr(config, attr.init_stdev_name)
+        min_value = getattr(config, attr.min_value_name)
+        max_value = getattr(config, attr.max_value_name)
+        init_type = getattr(config, attr.init_type_name).lower()
+        if 'gauss' in init_type or 'normal' in init_type:
+            return np.clip(rng.normal(mean_value, stdev, n), min_value, max_value)
+        if 'uniform' in init_type:
+            return rng.uniform(max(min_value, mean_value - 2 * stdev), min(max_value, mean_value + 2 * stdev), n)
+        raise RuntimeError("Unknown init_type {!r} for {!s}".format(init_type, attr.init_type_name))
+
+    if isinstance(attr, BoolAttribute):
+        default = str(getattr(config, attr.default_name)).lower()
+        if default in ('1', 'on', 'yes', 'true'):
+            return np.ones(n, dtype=bool)
+        if default in ('0', 'off', 'no', 'false'):
+            return np.zeros(n, dtype=bool)
+        if default in ('random', 'none'):
+            return rng.random(n) < 0.5
+        raise RuntimeError("Unknown default value {!r} for {!s}".format(default, attr.name))
+
+    default = getattr(config, attr.default_name)
+    out = np.empty(n, dtype=object)
+    if default.lower() in ('none', 'random'):
+        options = getattr(config, attr.options_name)
+        out[:] = [options[i] for i in rng.integers(0, len(options), n)]
+    else:
+        out[:] = default
+    return out
+
+
+def mutate_values(attr, config, values, rng):
+    """
+    attr.mutate_value on every element of values, in place
+    :param attr: neat.attributes.FloatAttribute, BoolAttribute or StringAttribute
+    :param config: genome config
+    :param values: array made by init_values or _column
+    :param rng: numpy Generator
+    :return: None
+    """
+    n = len(values)
+    if isinstance(attr, FloatAttribute):
+        mutate_rate = getattr(config, attr.mutate_rate_name)
+        replace_rate = getattr(config, attr.replace_rate_name)
+        r = rng.random(n)
+        perturb = r < mutate_rate
+        if perturb.any():
+            values[perturb] = np.clip(values[perturb] + rng.normal(0.0, getattr(config, attr.mutate_power_name),
+                                                                  int(perturb.sum())),
+                                      getattr(config, attr.min_value_name), getattr(config, attr.max_value_name))
+        replace = ~perturb & (r < replace_rate + mutate_rate)
+        if replace.any():
+            values[replace] = init_values(attr, config, int(replace.sum()), rng)
+
+    elif isinstance(attr, BoolAttribute):
+        mutate_rate = getattr(config, attr.mutate_rate_name)
+        rate = np.where(values, mutate_rate + getattr(config, attr.rate_to_false_add_name),
+                        mutate_rate + getattr(config, attr.rate_to_true_add_name))
+        flip = rng.random(n) < rate
+        if flip.any():
+            values[flip] = rng.random(int(flip.sum())) < 0.5
+
+    else:
+        mutate_rate = getattr(config, attr.mutate_rate_name)
+        if mutate_rate > 0:
+            change = rng.random(n) < mutate_rate
+            if change.any():
+                options = getattr(config, attr.options_name)
+                values[change] = [options[i] for i in rng.integers(0, len(options), int(change.sum()))]
+
+
+def _gene_id(ids, keys, key):
+    i = ids.get(key)
+    if i is None:
+        i = ids[key] = len(keys)
+        keys.append(key)
+    return i
+
+
+class _Parents:
+    """
+    one kind of gene (nodes or connections) of the parent genomes: an id
+    per gene key, the key columns and a column per attribute, the genes
+    of parent i in rows start[i]:start[i + 1] in the order of its gene dict
+    """
+
+    def __init__(self, genomes, kind, gene_type, ids, keys):
+        """
+        :param genomes: list of genomes
+        :param kind: "nodes" or "connections"
+        :param gene_type: gene class
+        :param ids: gene key -> id dict, shared by all generations
+        :param keys: id -> gene key list, shared by all generations
+        :return: None
+        """
+        import flappy_genome
+        self.attributes = gene_type._gene_attributes
+        if genomes and isinstance(genomes[0], flappy_genome.CompactGenome):
+            self._from_arrays(genomes, kind)
+            return
+        dicts = [getattr(g, kind) for g in genomes]
+        genes = [gene for d in dicts for gene in itervalues(d)]
+        self.count = np.array([len(d) for d in dicts], dtype=np.int64)
+        self.start = np.cumsum(self.count) - self.count
+        self.ids = np.fromiter((_gene_id(ids, keys, gene.key) for gene in genes), dtype=np.int64, count=len(genes))
+        if kind == "nodes":
+            self.keys = [np.fromiter((gene.key for gene in genes), dtype=np.int64, count=len(genes))]
+        else:
+            self.keys = [np.fromiter((gene.key[0] for gene in genes), dtype=np.int64, count=len(genes)),
+                         np.fromiter((gene.key[1] for gene in genes), dtype=np.int64, count=len(genes))]
+        self.values = [_column(a, [getattr(gene, a.name) for gene in genes]) for a in self.attributes]
+
+    def _from_arrays(self, genomes, kind):
+        # the same columns from the gene arrays of CompactGenomes
+        import flappy_genome
+        arrays = [g.node_genes if kind == "nodes" else g.conn_genes for g in genomes]
+        # np.concatenate checks the fields of every one of the small arrays
+        genes = np.frombuffer(b"".join([a.tobytes() for a in arrays]), dtype=arrays[0].dtype)
+        self.count = np.array([len(a) for a in arrays], dtype=np.int64)
+        self.start = np.cumsum(self.count) - self.count
+        # the same key is the same id within a generation, which is all crossover needs
+        self.ids = np.unique(genes['key'], return_inverse=True)[1].reshape(-1).astype(np.int64)
+        if kind == "nodes":
+            self.keys = [genes['key'].astype(np.int64)]
+        else:
+            self.keys = list(flappy_genome.conn_nodes(genes['key']))
+        names = np.array(flappy_genome.NAMES, dtype=object)
+        self.values = [genes[a.name] if isinstance(a, (FloatAttribute, BoolAttribute)) else names[genes[a.name]]
+                       for a in self.attributes]
+
+    def crossover(self, parent1, parent2, rng):
+        """
+        the genes of the children of (parent1, parent2) like
+        DefaultGenome.configure_crossover, parent1 being the fitter one
+        :param parent1: parent index per child
+        :param parent2: parent index per child
+        :param rng: numpy Generator
+        :return: _Rows
+        """
+        count = self.count[parent1]
+        total = int(count.sum())
+        rows = np.repeat(self.start[parent1] - (np.cumsum(count) - count), count) + np.arange(total)
+        ids = self.ids[rows]
+
+        # the row of the same gene in parent2, if it has one
+        width = int(self.ids.max()) + 1 if len(self.ids) else 1
+        owner = np.repeat(np.arange(len(self.count)), self.count)
+        order = np.argsort(owner * width + self.ids, kind='stable')
+        table = (owner * width + self.ids)[order]
+        wanted = np.repeat(parent2, count) * width + ids
+        pos = np.minimum(np.searchsorted(table, wanted), max(len(table) - 1, 0))
+        homologous = (table[pos] == wanted) if len(table) else np.zeros(total, dtype=bool)
+        rows2 = order[pos]
+
+        values = []
+        for column in self.values:
+            v = column[rows]
+            # a homologous gene takes each attribute from either parent
+            take = homologous & (rng.random(total) <= 0.5)
+            v[take] = column[rows2[take]]
+            values.append(v)
+        child = np.repeat(np.arange(len(parent1)), count)
+        return _Rows(self.attributes, child, [k[rows] for k in self.keys], values, len(parent1))
+
+
+class _Rows:
+    """
+    one kind of gene of a batch of children: a row per gene with the
+    child it belongs to, its key columns, its attribute columns and
+    whether it is still there. Genes added by structural mutations are
+    appended, so the rows of a child stay in the order of its gene dict.
+    """
+
+    def __init__(self, attributes, child, keys, values, n_children):
+        self.attributes = attributes
+        self.child = child
+        self.keys = keys  # [node key] or [input key, output key]
+        self.values = values
+        self.alive = np.ones(len(child), dtype=bool)
+        self.n_children = n_children
+
+    def column(self, name):
+        return self.values[[a.name for a in self.attributes].index(name)]
+
+    def grouped(self, mask=None):
+        """
+        the rows that are alive (and in mask) grouped by child
+        :return: (rows, start of each child in rows, count per child)
+        """
+        rows = np.flatnonzero(self.alive if mask is None else self.alive & mask)
+        rows = rows[np.argsort(self.child[rows], kind='stable')]
+        count = np.bincount(self.child[rows], minlength=self.n_children)
+        return rows, np.cumsum(count) - count, count
+
+    def pick(self, children, u, mask=None):
+        """
+        a random alive row (and in mask) of each child, like
+        random.choice, -1 for children that have none
+        :param children: child indexes
+        :param u: a uniform draw per child
+        :return: row per child
+        """
+        rows, start, count = self.grouped(mask)
+        k = count[children]
+        out = np.full(len(children), -1, dtype=np.int64)
+        has = k > 0
+        out[has] = rows[start[children[has]] + (u[has] * k[has]).astype(np.int64)]
+        return out
+
+    def append(self, child, keys, preset, config, rng):
+        """
+        add genes with new attribute values like create_node and
+        create_connection, except for the attributes in preset
+        :param child: child index per new gene
+        :param keys: key columns of the new genes
+        :param preset: {attribute name: values}
+        :return: None
+        """
+        self.child = np.concatenate([self.child, child])
+        self.keys = [np.concatenate([a, b]) for a, b in zip(self.keys, keys)]
+        self.values = [np.concatenate([v, preset[a.name] if a.name in preset else init_values(a, config, len(child), rng)])
+                       for a, v in zip(self.attributes, self.values)]
+        self.alive = np.concatenate([self.alive, np.ones(len(child), dtype=bool)])
+
+
+def _creates_cycle(conns, children, in_node, out_node):
+    """
+    neat.graphs.creates_cycle for one new connection per child, against
+    the connections of that child
+    :return: bool array
+    """
+    m = len(children)
+    slot = np.full(conns.n_children, -1, dtype=np.int64)
+    slot[children] = np.arange(m)
+    edges = conns.alive & (slot[conns.child] >= 0)
+    s = slot[conns.child[edges]]
+    a, b = conns.keys[0][edges], conns.keys[1][edges]
+
+    # (child, node) pairs as one int, grow the set of nodes reachable
+    # from out_node until it stops changing
+    names = np.unique(np.concatenate([a, b, in_node, out_node]))
+    width = len(names)
+    edge_from = s * width + np.searchsorted(names, a)
+    edge_to = s * width + np.searchsorted(names, b)
+    visited = np.unique(np.arange(m) * width + np.searchsorted(names, out_node))
+    while True:
+        new = edge_to[np.isin(edge_from, visited) & ~np.isin(edge_to, visited)]
+        if not len(new):
+            break
+        visited = np.union1d(visited, new)
+    return (in_node == out_node) | np.isin(np.arange(m) * width + np.searchsorted(names, in_node), visited)
+
+
+def _make_genes(gene_type, keys, attributes, values):
+    names = ('key',) + tuple(a.name for a in attributes)
+    genes = []
+    for row in zip(keys, *[v.tolist() for v in values]):
+        gene = gene_type.__new__(gene_type)
+        gene.__dict__.update(zip(names, row))
+        genes.append(gene)
+    return genes
+
+
+class BatchReproduction(neat.DefaultReproduction):
+    """
+    neat.DefaultReproduction with the children made in bulk
+    """
+
+    def __init__(self, config, reporters, stagnation):
+        super().__init__(config, reporters, stagnation)
+        self.node_ids, self.node_keys = {}, []
+        self.conn_ids, self.conn_keys = {}, []
+
+    def reproduce(self, config, species, pop_size, generation):
+        """
+        Handles creation of genomes, either from scratch or by sexual or
+        asexual reproduction from parents, like
+        neat.DefaultReproduction.reproduce.
+        """
+        # Filter out stagnated species, collect the set of non-stagnated
+        # species members, and compute their average adjusted fitness.
+        all_fitnesses = []
+        remaining_species = []
+        for stag_sid, stag_s, stagnant in self.stagnation.update(species, generation):
+            if stagnant:
+                self.reporters.species_stagnant(stag_sid, stag_s)
+            else:
+                all_fitnesses.extend(m.fitness for m in itervalues(stag_s.members))
+                remaining_species.append(stag_s)
+
+        # No species left.
+        if not remaining_species:
+            species.species = {}
+            return {}
+
+        min_fitness = min(all_fitnesses)
+        max_fitness = max(all_fitnesses)
+        fitness_range = max(1.0, max_fitness - min_fitness)
+        for afs in remaining_species:
+            msf = mean([m.fitness for m in itervalues(afs.members)])
+            afs.adjusted_fitness = (msf - min_fitness) / fitness_range
+
+        adjusted_fitnesses = [s.adjusted_fitness for s in remaining_species]
+        avg_adjusted_fitness = mean(adjusted_fitnesses)
+        self.reporters.info("Average adjusted fitness: {:.3f}".format(avg_adjusted_fitness))
+
+        # Compute the number of new members for each species in the new generation.
+        previous_sizes = [len(s.members) for s in remaining_species]
+        min_species_size = max(self.reproduction_config.min_species_size, self.reproduction_config.elitism)
+        spawn_amounts = self.compute_spawn(adjusted_fitnesses, previous_sizes, pop_size, min_species_size)
+
+        rng = np.random.default_rng(random.getrandbits(64))
+        new_population = {}
+        species.species = {}
+        parents = []  # every genome that is a parent of some child
+        parent_index = {}  # genome key -> index in parents
+        pairs = []  # (parent index, parent index) per child
+        for spawn, s in zip(spawn_amounts, remaining_species):
+            # If elitism is enabled, each species always at least gets to retain its elites.
+            spawn = max(spawn, self.reproduction_config.elitism)
+            assert spawn > 0
+
+            old_members = list(iteritems(s.members))
+            s.members = {}
+            species.species[s.key] = s
+
+            # Sort members in order of descending fitness.
+            old_members.sort(reverse=True, key=lambda x: x[1].fitness)
+
+            # Transfer elites to new generation.
+            if self.reproduction_config.elitism > 0:
+                for i, m in old_members[:self.reproduction_config.elitism]:
+                    new_population[i] = m
+                    spawn -= 1
+
+            if spawn <= 0:
+                continue
+
+            # Only use the survival threshold fraction to use as parents for the next generation.
+            repro_cutoff = int(math.ceil(self.reproduction_config.survival_threshold * len(old_members)))
+            repro_cutoff = max(repro_cutoff, 2)
+            old_members = old_members[:repro_cutoff]
+
+            local = []
+            for gid, g in old_members:
+                if gid not in parent_index:
+                    parent_index[gid] = len(parents)
+                    parents.append(g)
+                local.append(parent_index[gid])
+            pairs.append(np.array(local)[rng.integers(0, len(local), (spawn, 2))])
+
+        if pairs:
+            pairs = np.concatenate(pairs)
+            new_population.update(self.make_children(config, parents, pairs[:, 0], pairs[:, 1], rng))
+
+        return new_population
+
+    def make_children(self, config, parents, first, second, rng):
+        """
+        cross over and mutate one child per (first, second) parent pair
+        :param config: neat config
+        :param parents: list of genomes
+        :param first: parent index per child
+        :param second: parent index per child
+        :param rng: numpy Generator
+        :return: list of (genome_id, genome)
+        """
+        gc = config.genome_config
+        fitness = np.array([p.fitness for p in parents], dtype=float)
+        swap = ~(fitness[first] > fitness[second])
+        parent1 = np.where(swap, second, first)
+        parent2 = np.where(swap, first, second)
+
+        nodes = _Parents(parents, "nodes", gc.node_gene_type, self.node_ids, self.node_keys)
+        nodes = nodes.crossover(parent1, parent2, rng)
+        conns = _Parents(parents, "connections", gc.connection_gene_type, self.conn_ids, self.conn_keys)
+        conns = conns.crossover(parent1, parent2, rng)
+        self._mutate_structure(gc, nodes, conns, rng)
+
+        # mutate the attributes of the genes the children end up with
+        node_rows, node_start, node_count = nodes.grouped()
+        conn_rows, conn_start, conn_count = conns.grouped()
+        node_values = [v[node_rows] for v in nodes.values]
+        conn_values = [v[conn_rows] for v in conns.values]
+        for attr, values in zip(nodes.attributes, node_values):
+            mutate_values(attr, gc, values, rng)
+        for attr, values in zip(conns.attributes, conn_values):
+            mutate_values(attr, gc, values, rng)
+
+        # the cyclic garbage collector would run over and over while
+        # hundreds of thousands of genes are made, none of them garbage
+        gc_enabled = garbage.isenabled()
+        garbage.disable()
+        try:
+            import flappy_genome
+            if issubclass(config.genome_type, flappy_genome.CompactGenome):
+                children = self._compact_children(config, nodes, conns, node_rows, conn_rows,
+                                                  node_values, conn_values)
+            else:
+                node_keys = nodes.keys[0][node_rows].tolist()
+                conn_keys = list(zip(conns.keys[0][conn_rows].tolist(), conns.keys[1][conn_rows].tolist()))
+                node_genes = _make_genes(gc.node_gene_type, node_keys, nodes.attributes, node_values)
+                conn_genes = _make_genes(gc.connection_gene_type, conn_keys, conns.attributes, conn_values)
+                node_end = (node_start + node_count).tolist()
+                conn_end = (conn_start + conn_count).tolist()
+                children = []
+                for c, a, b, d, e in zip(range(len(parent1)), node_start.tolist(), node_end,
+                                         conn_start.tolist(), conn_end):
+                    gid = next(self.genome_indexer)
+                    child = config.genome_type(gid)
+                    child.nodes = dict(zip(node_keys[a:b], node_genes[a:b]))
+                    child.connections = dict(zip(conn_keys[d:e], conn_genes[d:e]))
+                    children.append((gid, child))
+            for (gid, child), i, j in zip(children, first.tolist(), second.tolist()):
+                self.ancestors[gid] = (parents[i].key, parents[j].key)
+        finally:
+            if gc_enabled:
+                garbage.enable()
+        return children
+
+    def _compact_children(self, config, nodes, conns, node_rows, conn_rows, node_values, conn_values):
+        # CompactGenomes around the gene rows, each with its genes sorted by key
+        import flappy_genome
+        n = nodes.n_children
+        node_genes = np.empty(len(node_rows), dtype=flappy_genome.NODE_DTYPE)
+        node_genes['key'] = nodes.keys[0][node_rows]
+        for attr, values in zip(nodes.attributes, node_values):
+            numeric = isinstance(attr, (FloatAttribute, BoolAttribute))
+            node_genes[attr.name] = values if numeric else flappy_genome.name_codes(values)
+        conn_genes = np.empty(len(conn_rows), dtype=flappy_genome.CONN_DTYPE)
+        conn_genes['key'] = flappy_genome.conn_key(conns.keys[0][conn_rows], conns.keys[1][conn_rows])
+        for attr, values in zip(conns.attributes, conn_values):
+            conn_genes[attr.name] = values
+        node_child, conn_child = nodes.child[node_rows], conns.child[conn_rows]
+        node_genes = node_genes[np.lexsort((node_genes['key'], node_child))]
+        conn_genes = conn_genes[np.lexsort((conn_genes['key'], conn_child))]
+        node_end = np.cumsum(np.bincount(node_child, minlength=n)).tolist()
+        conn_end = np.cumsum(np.bincount(conn_child, minlength=n)).tolist()
+        children = []
+        a = d = 0
+        for b, e in zip(node_end, conn_end):
+            gid = next(self.genome_indexer)
+            # copies, so a child does not keep the genes of its whole generation alive
+            children.append((gid, config.genome_type.from_arrays(gid, node_genes[a:b].copy(), conn_genes[d:e].copy())))
+            a, d = b, e
+        return children
+
+    def _mutate_structure(self, gc, nodes, conns, rng):
+        # the structural half of DefaultGenome.mutate for all children:
+        # each mutation is done at once for every child that drew it, in
+        # the order DefaultGenome.mutate does them
+        n = nodes.n_children
+        u = rng.random((n, 11))  # 4 decisions, then the choices they need
+        probs = [gc.node_add_prob, gc.node_delete_prob, gc.conn_add_prob, gc.conn_delete_prob]
+        if gc.single_structural_mutation:
+            div = max(1, sum(probs))
+            which = np.searchsorted(np.cumsum(probs) / div, u[:, 0], side='right')
+            does = [which == i for i in range(4)]
+        else:
+            does = [u[:, i] < probs[i] for i in range(4)]
+        surer = gc.check_structural_mutation_surer()
+
+        children = np.flatnonzero(does[0])
+        if len(children):
+            self._add_node(gc, nodes, conns, children, u[children], surer, rng)
+        children = np.flatnonzero(does[1])
+        if len(children):
+            victim = nodes.pick(children, u[children, 5], ~np.isin(nodes.keys[0], gc.output_keys))
+            children, victim = children[victim >= 0], victim[victim >= 0]
+            nodes.alive[victim] = False
+            deleted = np.full(n, np.iinfo(np.int64).min)
+            deleted[children] = nodes.keys[0][victim]
+            deleted = deleted[conns.child]
+            conns.alive &= (conns.keys[0] != deleted) & (conns.keys[1] != deleted)
+        children = np.flatnonzero(does[2])
+        if len(children):
+            self._add_connection(gc, nodes, conns, children, u[children, 6], u[children, 7], surer, rng)
+        children = np.flatnonzero(does[3])
+        if len(children):
+            victim = conns.pick(children, u[children, 8])
+            conns.alive[victim[victim >= 0]] = False
+
+    def _add_node(self, gc, nodes, conns, children, u, surer, rng):
+        # DefaultGenome.mutate_add_node
+        split = conns.pick(children, u[:, 4])
+        lonely = split < 0
+        if surer and lonely.any():
+            self._add_connection(gc, nodes, conns, children[lonely], u[lonely, 9], u[lonely, 10], surer, rng)
+        children, split = children[~lonely], split[~lonely]
+        if not len(children):
+            return
+
+        if gc.node_indexer is None:
+            gc.node_indexer = itertools.count(int(nodes.keys[0].max()) + 1)
+        new = np.fromiter((next(gc.node_indexer) for c in children), dtype=np.int64, count=len(children))
+        nodes.append(children, [new], {}, gc, rng)
+
+        # disable the split connection, and go through the new node with
+        # a connection of weight 1 and one with the old weight
+        conns.column('enabled')[split] = False
+        i, o = conns.keys[0][split], conns.keys[1][split]
+        weight = np.stack([np.ones(len(children)), conns.column('weight')[split]], axis=1).ravel()
+        conns.append(np.repeat(children, 2),
+                     [np.stack([i, new], axis=1).ravel(), np.stack([new, o], axis=1).ravel()],
+                     {'weight': weight, 'enabled': np.ones(2 * len(children), dtype=bool)}, gc, rng)
+
+    def _add_connection(self, gc, nodes, conns, children, u1, u2, surer, rng):
+        # DefaultGenome.mutate_add_connection
+        rows, start, count = nodes.grouped()
+        k = count[children]
+        first = start[children]
+        out_node = nodes.keys[0][rows[first + (u1 * k).astype(np.int64)]]
+        inputs = np.array(gc.input_keys, dtype=np.int64)
+        j = (u2 * (k + len(inputs))).astype(np.int64)
+        in_node = np.where(j < k, nodes.keys[0][rows[first + np.minimum(j, k - 1)]],
+                           inputs[np.clip(j - k, 0, len(inputs) - 1)])
+
+        # Don't duplicate connections.
+        slot = np.full(conns.n_children, -1, dtype=np.int64)
+        slot[children] = np.arange(len(children))
+        s = slot[conns.child]
+        candidate = conns.alive & (s >= 0)
+        same = np.zeros(len(s), dtype=bool)
+        same[candidate] = ((conns.keys[0][candidate] == in_node[s[candidate]]) &
+                           (conns.keys[1][candidate] == out_node[s[candidate]]))
+        if surer:
+            conns.column('enabled')[same] = True
+        add = np.ones(len(children), dtype=bool)
+        add[s[same]] = False
+
+        # Don't allow connections between two output nodes
+        add &= ~(np.isin(in_node, gc.output_keys) & np.isin(out_node, gc.output_keys))
+
+        # For feed-forward networks, avoid creating cycles.
+        if gc.feed_forward and add.any():
+            add[add] = ~_creates_cycle(conns, children[add], in_node[add], out_node[add])
+        conns.append(children[add], [in_node[add], out_node[add]], {}, gc, rng)
+
+
+def benchmark(pop_size=50000, config_file="config-feedforward.txt"):
+    """
+    seconds one reproduce call takes, for BatchReproduction with
+    flappy_genome.CompactGenome and with neat.DefaultGenome, and for
+    neat.DefaultReproduction, on the same species
+    :param pop_size: int
+    :param config_file: neat config file
+    :return: {"reproduction class name/genome class name": seconds}
+    """
+    import copy
+    import flappy_genome
+    import flappy_species
+    config = neat.config.Config(neat.DefaultGenome, BatchReproduction, flappy_species.ArraySpeciesSet,
+                                neat.DefaultStagnation, config_file)
+    config.pop_size = pop_size
+    population = neat.Population(config)
+    for g in itervalues(population.population):
+        g.fitness = random.random()
+
+    times = {}
+    for reproduction_type, genome_type in ((BatchReproduction, flappy_genome.CompactGenome),
+                                           (BatchReproduction, neat.DefaultGenome),
+                                           (neat.DefaultReproduction, neat.DefaultGenome)):
+        species = copy.deepcopy(population.species)
+        if genome_type is flappy_genome.CompactGenome:
+            for s in itervalues(species.species):
+                s.members = dict((key, genome_type.from_genome(g)) for key, g in iteritems(s.members))
+        config.genome_type = genome_type
+        reproduction = reproduction_type(getattr(config, "reproduction_config"), population.reporters,
+                                         neat.DefaultStagnation(config.stagnation_config, population.reporters))
+        reproduction.genome_indexer = copy.copy(population.reproduction.genome_indexer)
+        start = time.perf_counter()
+        reproduction.reproduce(config, species, pop_size, 1)
+        times[reproduction_type.__name__ + "/" + genome_type.__name__] = time.perf_counter() - start
+    return times
+
+
+if __name__ == '__main__':
+    for name, seconds in benchmark().items():
+        print("{:>36}: {:.3f} s".format(name, seconds))
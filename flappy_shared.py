@@ -0,0 +1,279 @@
+"""
+Multiprocess evaluation on one machine without pickling the population.
+
+SharedPool writes the genes of a generation as flat record arrays into
+multiprocessing.shared_memory blocks, next to the pipe heights of the
+courses and the fitness and frame result arrays. Its worker processes
+attach to the blocks once, compile the nets of their chunk of genomes
+straight from the arrays, play them with flappy_sim and write fitness
+and alive frames back in place. All that goes over the pipes every
+generation is a small ("eval", lo, hi, ...) tuple per chunk and a
+("done", lo, hi) back; the block names are only sent again when a
+block has to grow.
+
+    pool = SharedPool(config, workers=8)
+    fitness = pool.evaluate(genomes, seeds)
+    pool.close()
+
+Genes use the flappy_genome record layout. A CompactGenome is copied
+as it is; a neat.DefaultGenome keeps its connections in dict order, so
+the worker compiles the same network neat.nn.FeedForwardNetwork.create
+would and fitness is identical to flappy_sim.evaluate_courses.
+"""
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import wait
+import numpy as np
+import flappy_sim
+import flappy_cache
+import flappy_genome
+
+INDEX_DTYPE = np.dtype([('nodes', '<i8'), ('conns', '<i8')])  # end of a genome's genes
+BLOCKS = (("index", INDEX_DTYPE), ("nodes", flappy_genome.NODE_DTYPE), ("conns", flappy_genome.CONN_DTYPE),
+          ("heights", np.int64), ("fitness", np.float64), ("frames", np.int64))
+MIN_BLOCK_SIZE = 1 << 16  # bytes
+
+
+def encode(genome):
+    """
+    the genes of a genome as flappy_genome record arrays
+    :param genome: neat.DefaultGenome or flappy_genome.CompactGenome
+    :return: (node genes sorted by key, connection genes in the genome's order)
+    """
+    if isinstance(genome, flappy_genome.CompactGenome):
+        return genome.node_genes, genome.conn_genes
+    code = flappy_genome.name_code
+    nodes = np.array(sorted((n.key, n.bias, n.response, code(n.activation), code(n.aggregation))
+                            for n in genome.nodes.values()), dtype=flappy_genome.NODE_DTYPE)
+    conns = np.array([(flappy_genome.conn_key(*c.key), c.weight, c.enabled) for c in genome.connections.values()],
+                     dtype=flappy_genome.CONN_DTYPE)
+    return nodes, conns
+
+
+class _Block:
+    """
+    array in a shared memory block, replaced by a bigger block when it
+    runs out of room
+    """
+
+    def __init__(self, dtype):
+        self.dtype = np.dtype(dtype)
+        self.shm = None
+
+    def ensure(self, size):
+        """
+        :param size: number of items the block has to hold
+        :return: True when the block was replaced, so its name changed
+        """
+        nbytes = size * self.dtype.itemsize
+        if self.shm is not None and self.shm.size >= nbytes:
+            return False
+        nbytes = max(nbytes, 2 * self.shm.size if self.shm is not None else MIN_BLOCK_SIZE)
+        self.close()
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        return True
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def _array(buf, dtype, shape):
+    # a view of a block, it has to be gone before the block is closed
+    return np.ndarray(shape, dtype=dtype, buffer=buf)
+
+
+class SharedPool:
+    """
+    worker processes that play the genomes they find in shared memory
+    """
+
+    def __init__(self, config, workers=multiprocessing.cpu_count(), chunks_per_worker=4):
+        """
+        :param config: neat config, given to each worker once when it starts
+        :param workers: number of processes (int)
+        :param chunks_per_worker: a generation is split in this many
+                                  chunks per worker, so a worker that
+                                  draws long games does not hold up the rest
+        :return: None
+        """
+        self.chunks_per_worker = chunks_per_worker
+        self.blocks = dict((name, _Block(dtype)) for name, dtype in BLOCKS)
+        self.conns = []
+        self.procs = []
+        # forked workers have to share the resource tracker that frees the
+        # blocks, or each starts its own and frees them when it exits
+        resource_tracker.ensure_running()
+        for i in range(workers):
+            conn, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=worker, args=(child, config), daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(conn)
+            self.procs.append(proc)
+        self._names_sent = 0
+        self._seeds = None
+        self._pipes = 0
+
+    def _send_all(self, message):
+        for conn in self.conns:
+            conn.send(message)
+
+    def _write(self, genomes, seeds):
+        # fill the input blocks, tell the workers about replaced ones
+        genes = [encode(genome) for genome in genomes]
+        index = np.zeros(len(genes), dtype=INDEX_DTYPE)
+        index['nodes'] = np.cumsum([len(nodes) for nodes, conns in genes])
+        index['conns'] = np.cumsum([len(conns) for nodes, conns in genes])
+        seeds = [int(seed) for seed in seeds]
+
+        replaced = [self.blocks["index"].ensure(len(index)),
+                    self.blocks["nodes"].ensure(int(index['nodes'][-1]) if len(index) else 0),
+                    self.blocks["conns"].ensure(int(index['conns'][-1]) if len(index) else 0),
+                    self.blocks["fitness"].ensure(len(genomes)),
+                    self.blocks["frames"].ensure(len(seeds) * len(genomes))]
+        if seeds != self._seeds:
+            courses = flappy_sim.CourseTable(seeds)
+            replaced.append(self.blocks["heights"].ensure(courses.heights.size))
+            _array(self.blocks["heights"].shm.buf, np.int64, courses.heights.shape)[...] = courses.heights
+            self._seeds, self._pipes = seeds, courses.heights.shape[1]
+        if any(replaced):
+            self._send_all(("attach", dict((name, block.shm.name) for name, block in self.blocks.items())))
+        if len(flappy_genome.NAMES) != self._names_sent:
+            self._send_all(("names", list(flappy_genome.NAMES)))
+            self._names_sent = len(flappy_genome.NAMES)
+
+        for name, key in (("nodes", 0), ("conns", 1)):
+            parts = [g[key] for g in genes]
+            if parts:
+                data = np.concatenate(parts)
+                _array(self.blocks[name].shm.buf, data.dtype, len(data))[...] = data
+        _array(self.blocks["index"].shm.buf, INDEX_DTYPE, len(index))[...] = index
+
+    def evaluate(self, genomes, seeds, how="mean", max_score=flappy_sim.MAX_SCORE, frames=None):
+        """
+        play every genome on every course on the workers
+        :param genomes: list of (genome_id, genome)
+        :param seeds: course seeds
+        :param how: how to aggregate the courses, see flappy_sim.aggregate
+        :param max_score: stop a game once its score goes over this
+        :param frames: optional (courses, genomes) array, gets the frames every game lasted
+        :return: (genomes,) fitness array
+        """
+        genomes = [genome for genome_id, genome in genomes]
+        n = len(genomes)
+        self._write(genomes, seeds)
+
+        size = max(1, -(-n // (len(self.conns) * self.chunks_per_worker)))
+        chunks = [(lo, min(lo + size, n)) for lo in range(0, n, size)]
+        chunks.reverse()
+        busy = []
+        for conn in self.conns:
+            if chunks:
+                conn.send(("eval",) + chunks.pop() + (n, self._seeds, self._pipes, how, max_score))
+                busy.append(conn)
+        while busy:
+            for conn in wait(busy):
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    message = ("error", "a worker process died")
+                if message[0] == "error":
+                    self.close()
+                    raise RuntimeError("shared pool worker failed:\n" + message[1])
+                if chunks:
+                    conn.send(("eval",) + chunks.pop() + (n, self._seeds, self._pipes, how, max_score))
+                else:
+                    busy.remove(conn)
+
+        fitness = _array(self.blocks["fitness"].shm.buf, np.float64, n).copy()
+        if frames is not None:
+            frames[...] = _array(self.blocks["frames"].shm.buf, np.int64, (len(self._seeds), n))
+        return fitness
+
+    def close(self):
+        """
+        stop the workers and free the shared memory
+        :return: None
+        """
+        # a worker forked after another holds a copy of its pipe, so closing
+        # the pipes alone does not end them
+        for conn in self.conns:
+            try:
+                conn.send(("stop",))
+            except OSError:
+                pass
+            conn.close()
+        for proc in self.procs:
+            proc.join(5)
+            if proc.is_alive():
+                proc.terminate()
+        self.conns = []
+        self.procs = []
+        for block in self.blocks.values():
+            block.close()
+
+
+def evaluate_chunk(blocks, lo, hi, n, seeds, pipes, how, max_score, config, net_cache):
+    """
+    what a worker does with genomes lo:hi of a generation of n
+    :return: None, fitness and frames are written to the result blocks
+    """
+    index = _array(blocks["index"], INDEX_DTYPE, n)
+    nodes = _array(blocks["nodes"], flappy_genome.NODE_DTYPE, int(index['nodes'][-1]))
+    conns = _array(blocks["conns"], flappy_genome.CONN_DTYPE, int(index['conns'][-1]))
+    nets = []
+    for i in range(lo, hi):
+        genome = flappy_genome.CompactGenome(i)
+        genome.node_genes = nodes[index['nodes'][i - 1] if i else 0:index['nodes'][i]]
+        genome.conn_genes = conns[index['conns'][i - 1] if i else 0:index['conns'][i]]
+        nets.append(net_cache.create(genome, config))
+
+    courses = flappy_sim.CourseTable.from_heights(seeds, _array(blocks["heights"], np.int64, (len(seeds), pipes)))
+    frames = np.empty((len(seeds), len(nets)), dtype=np.int64)
+    fitness = flappy_sim.evaluate_courses(nets, courses, how, max_score, frames)[0]
+    _array(blocks["fitness"], np.float64, n)[lo:hi] = fitness
+    _array(blocks["frames"], np.int64, (len(seeds), n))[:, lo:hi] = frames
+
+
+def worker(conn, config):
+    """
+    attach to the blocks and evaluate chunks until the pool stops it or
+    closes the pipe
+    :param conn: multiprocessing connection to the pool
+    :param config: neat config
+    :return: None
+    """
+    shms = {}
+    net_cache = flappy_cache.NetCache()
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            elif message[0] == "attach":
+                for name, shm_name in message[1].items():
+                    if name not in shms or shms[name].name != shm_name:
+                        if name in shms:
+                            shms[name].close()
+                        shms[name] = shared_memory.SharedMemory(name=shm_name)
+            elif message[0] == "names":
+                flappy_genome.NAMES[:] = message[1]
+            elif message[0] == "eval":
+                kind, lo, hi, n, seeds, pipes, how, max_score = message
+                try:
+                    evaluate_chunk(dict((name, shm.buf) for name, shm in shms.items()),
+                                   lo, hi, n, seeds, pipes, how, max_score, config, net_cache)
+                except Exception:
+                    conn.send(("error", traceback.format_exc()))
+                else:
+                    conn.send(("done", lo, hi))
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+        for shm in shms.values():
+            shm.close()
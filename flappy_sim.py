@@ -0,0 +1,815 @@
+"""
+Headless, batched version of the flappy bird game that eval_genomes
+plays. Every game holds exactly one bird and all games are stepped in
+lockstep on numpy arrays, so a whole population can be scored on
+several seeded courses in one pass.
+
+The rules (physics, pipe spawning, collision, fitness shaping) are the
+ones from flappy_bird_END_VERSION.py, frame for frame.
+"""
+import os
+import random
+import numpy as np
+import pygame
+
+FLOOR = 730
+WIN_WIDTH = 600
+BIRD_X = 230
+BIRD_Y = 350
+PIPE_GAP = 160
+PIPE_VEL = 5
+PIPE_START_X = 700  # x of the first pipe
+PIPE_SPAWN_X = WIN_WIDTH  # new pipes are added at the right edge
+PIPE_MIN_HEIGHT = 50
+PIPE_MAX_HEIGHT = 450
+MAX_SCORE = 25  # eval_genomes stops once the score goes over 25
+
+# Bird class constants
+MAX_ROTATION = 25
+ROT_VEL = 20
+ANIMATION_TIME = 5
+JUMP_VEL = -10.5
+
+# fitness shaping of eval_genomes
+FRAME_REWARD = 0.1
+PIPE_REWARD = 5
+COLLIDE_PENALTY = -1
+
+# why a game ended
+DEATH_NONE = 0  # still alive, or survived until MAX_SCORE
+DEATH_PIPE = 1
+DEATH_FLOOR = 2
+DEATH_CEILING = 3
+
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imgs")
+
+# the masks only need the alpha channel, so no display is needed here
+pipe_img = pygame.transform.scale2x(pygame.image.load(os.path.join(IMG_DIR, "pipe.png")))
+bird_images = [pygame.transform.scale2x(pygame.image.load(os.path.join(IMG_DIR, "bird" + str(x) + ".png"))) for x in range(1,4)]
+
+PIPE_WIDTH = pipe_img.get_width()
+PIPE_LENGTH = pipe_img.get_height()
+BIRD_WIDTH = bird_images[0].get_width()
+BIRD_HEIGHT = bird_images[0].get_height()
+
+PIPE_TOP_MASK = pygame.mask.from_surface(pygame.transform.flip(pipe_img, False, True))
+PIPE_BOTTOM_MASK = pygame.mask.from_surface(pipe_img)
+BIRD_MASKS = [pygame.mask.from_surface(img) for img in bird_images]
+
+# pipe x - bird x at which their masks share columns
+DX_MIN = -(PIPE_WIDTH - 1)
+DX_MAX = BIRD_WIDTH - 1
+
+
+def _extents(mask):
+    # first and last set row of every column of a mask
+    rows = pygame.surfarray.array_red(mask.to_surface()) > 0  # (width, height)
+    first = rows.argmax(axis=1)
+    last = rows.shape[1] - 1 - rows[:, ::-1].argmax(axis=1)
+    # every column of the game's sprites is one run of set pixels
+    assert rows.any(axis=1).all() and (rows.sum(axis=1) == last - first + 1).all()
+    return first, last
+
+
+def _hit_table(pipe_mask):
+    # for every bird image and every pipe x - bird x, the range of pipe
+    # mask top - bird y at which the masks overlap: a column's bird and
+    # pipe runs overlap over a range of offsets, and the ranges of all
+    # shared columns make one range
+    pipe_first, pipe_last = _extents(pipe_mask)
+    lo = np.ones((len(BIRD_MASKS), DX_MAX - DX_MIN + 1), dtype=np.int64)
+    hi = np.zeros_like(lo)
+    for i, bird_mask in enumerate(BIRD_MASKS):
+        bird_first, bird_last = _extents(bird_mask)
+        for dx in range(DX_MIN, DX_MAX + 1):
+            columns = np.arange(max(dx, 0), min(BIRD_WIDTH, dx + PIPE_WIDTH))
+            a = bird_first[columns] - pipe_last[columns - dx]
+            b = bird_last[columns] - pipe_first[columns - dx]
+            order = np.argsort(a)
+            assert (a[order][1:] <= np.maximum.accumulate(b[order])[:-1] + 1).all()
+            lo[i, dx - DX_MIN] = a.min()
+            hi[i, dx - DX_MIN] = b.max()
+    return lo, hi
+
+
+# hit ranges of pipe height - bird y for the top pipe and of pipe
+# bottom - bird y for the bottom pipe, see pipe_hit
+TOP_LO, TOP_HI = (t + PIPE_LENGTH for t in _hit_table(PIPE_TOP_MASK))
+BOTTOM_LO, BOTTOM_HI = _hit_table(PIPE_BOTTOM_MASK)
+
+
+def trajectory(vel, frames):
+    """
+    where Bird.move takes the bird in the frames after it jumps (or
+    after the start, with vel 0) when it doesn't jump again
+    :param vel: JUMP_VEL or 0
+    :param frames: int
+    :return: (y relative to where it started, tilt) arrays for 0..frames frames
+    """
+    y = np.zeros(frames + 1)
+    tilt = np.zeros(frames + 1, dtype=np.int64)
+    for t in range(1, frames + 1):
+        d = vel * t + (t * t) * (0.5*(3))
+        d = min(d, 16)
+        if d < 0:
+            d -= 2
+        y[t] = y[t - 1] + d
+        if d < 0 or y[t] < 50:
+            tilt[t] = MAX_ROTATION
+        else:
+            tilt[t] = tilt[t - 1] - ROT_VEL if tilt[t - 1] > -90 else tilt[t - 1]
+    return y, tilt
+
+
+# After PATH_FRAMES frames without a jump the bird falls 16 px a frame
+# and its tilt doesn't change anymore, so every y and tilt of a bird is
+# its height at the last jump plus a lookup in these, see path().
+# Rows are for vel 0 (no jump yet) and JUMP_VEL, all values are halves.
+PATH_FRAMES = 64
+PATH_Y, PATH_TILT = (np.array(rows) for rows in zip(trajectory(0.0, PATH_FRAMES), trajectory(JUMP_VEL, PATH_FRAMES)))
+assert (np.diff(PATH_Y[:, -2:]) == 16).all() and (PATH_TILT[:, -1] <= -90).all()
+
+# wing flap image for every Bird.img_count after Bird.draw
+FLAP_IMAGES = np.array([0] + [0] * ANIMATION_TIME + [1] * ANIMATION_TIME + [2] * ANIMATION_TIME + [1] * ANIMATION_TIME)
+FLAP_PERIOD = len(FLAP_IMAGES)
+
+
+def path(jumped, tick):
+    """
+    :param jumped: 1 where the bird jumped since the start, 0 where not (int or array)
+    :param tick: frames since the jump or the start (int or array)
+    :return: (y relative to the height of the jump, tilt)
+    """
+    t = np.minimum(tick, PATH_FRAMES)
+    return PATH_Y[jumped, t] + 16 * (tick - t), PATH_TILT[jumped, t]
+
+
+# A pipe is passed on the first frame its x is left of the bird, and the
+# next pipe is spawned at PIPE_SPAWN_X on that same frame. That fixes the
+# distance between pipes, so pipe k sits at PIPE_START_X + k*PIPE_SPACING
+# - PIPE_VEL*frame for every course; only the heights differ.
+FIRST_PASS_FRAME = (PIPE_START_X - BIRD_X) // PIPE_VEL + 1
+PIPE_SPACING = PIPE_SPAWN_X - (PIPE_START_X - PIPE_VEL * FIRST_PASS_FRAME)
+PIPE_PERIOD = PIPE_SPACING // PIPE_VEL  # frames between two passed pipes
+
+
+def pipe_x(k, frame):
+    """
+    x position of pipe k after the pipes moved in the given frame
+    :param k: pipe index on the course (int or array)
+    :param frame: frame number, the first frame is 1 (int or array)
+    :return: int or array
+    """
+    return PIPE_START_X + PIPE_SPACING * k - PIPE_VEL * frame
+
+
+def pipe_hit(img, dx, y, height):
+    """
+    the mask overlap test of Pipe.collide, from tables: whether the
+    bird hits the pipe only depends on which image it shows, the pipe x
+    - bird x and how far the bird is from the top and bottom of the gap
+    :param img: index of the bird's image in bird_images (int or array)
+    :param dx: pipe x - bird x (int or array)
+    :param y: round(bird y) (int or array)
+    :param height: pipe height, the top of its gap (int or array)
+    :return: bool or bool array
+    """
+    column = np.clip(dx - DX_MIN, 0, DX_MAX - DX_MIN)
+    top = height - y
+    bottom = top + PIPE_GAP
+    return ((((top >= TOP_LO[img, column]) & (top <= TOP_HI[img, column])) |
+             ((bottom >= BOTTOM_LO[img, column]) & (bottom <= BOTTOM_HI[img, column]))) &
+            (dx >= DX_MIN) & (dx <= DX_MAX))
+
+
+def score_at(frame):
+    """
+    number of pipes passed at the end of the given frame
+    :param frame: int or array
+    :return: int or array
+    """
+    return np.maximum((np.asarray(frame) - FIRST_PASS_FRAME) // PIPE_PERIOD + 1, 0)
+
+
+class CourseTable:
+    """
+    Pipe heights of a set of seeded courses. A course draws its heights
+    like Pipe.set_height does, one randrange per pipe, from its own
+    random.Random(seed). Rows are redrawn from the seed when the table
+    has to grow, so a course is fully described by its seed.
+    """
+
+    def __init__(self, seeds, size=32):
+        """
+        :param seeds: one int seed per course
+        :param size: number of pipes to draw up front (int)
+        :return: None
+        """
+        self.seeds = np.array(seeds, dtype=np.int64)
+        self.heights = np.empty((len(self.seeds), size), dtype=np.int64)
+        for row in range(len(self.seeds)):
+            self._draw(row)
+
+    @classmethod
+    def from_heights(cls, seeds, heights):
+        """
+        a table around heights that were drawn from the seeds before, e.g.
+        by another process; they are used as they are, not copied
+        :param seeds: one int seed per course
+        :param heights: (courses, pipes) int64 array
+        :return: CourseTable
+        """
+        table = cls.__new__(cls)
+        table.seeds = np.array(seeds, dtype=np.int64)
+        table.heights = heights
+        return table
+
+    def _draw(self, row):
+        rng = random.Random(int(self.seeds[row]))
+        for k in range(self.heights.shape[1]):
+            self.heights[row, k] = rng.randrange(PIPE_MIN_HEIGHT, PIPE_MAX_HEIGHT)
+
+    def reseed(self, row, seed):
+        """
+        replace the course in a row with a new seed
+        :param row: int
+        :param seed: int
+        :return: None
+        """
+        self.seeds[row] = seed
+        self._draw(row)
+
+    def rows(self, seeds):
+        """
+        a row holding each seed, rows are added at the end for seeds that
+        are not in the table yet; rows that are there are never changed
+        :param seeds: int array of seeds
+        :return: int64 array, a row per seed
+        """
+        seeds = np.asarray(seeds, dtype=np.int64)
+        new = np.setdiff1d(seeds, self.seeds)
+        if len(new):
+            first = len(self.seeds)
+            self.seeds = np.concatenate([self.seeds, new])
+            self.heights = np.concatenate([self.heights, np.empty((len(new), self.heights.shape[1]), dtype=np.int64)])
+            for row in range(first, len(self.seeds)):
+                self._draw(row)
+        # the first row of every seed
+        order = np.argsort(self.seeds, kind='stable')
+        return order[np.searchsorted(self.seeds[order], seeds)]
+
+    def ensure(self, k):
+        """
+        make sure pipe index k is in the table for every course
+        :param k: int
+        :return: None
+        """
+        size = self.heights.shape[1]
+        if k < size:
+            return
+        while size <= k:
+            size *= 2
+        self.heights = np.empty((len(self.seeds), size), dtype=np.int64)
+        for row in range(len(self.seeds)):
+            self._draw(row)
+
+
+# the whole state of one game as a fixed size record, see BatchGame.snapshot.
+# The course is its seed: pipe k is the k-th draw of random.Random(seed),
+# so (seed, frame) is where the game is on its course.
+STATE_DTYPE = np.dtype([('seed', '<i8'), ('course', '<i8'), ('frame', '<i8'), ('y', '<f8'), ('vel', '<f8'),
+                        ('tick', '<i8'), ('height', '<f8'), ('tilt', '<i8'), ('img_count', '<i8'), ('img', '<i8'),
+                        ('alive', '?'), ('jumped', '?'), ('fitness', '<f8'), ('score', '<i8'), ('death', 'i1'),
+                        ('obs', '<f8', (3,))])
+STATE_FIELDS = STATE_DTYPE.names[1:]  # BatchGame attributes, the seed comes from the course table
+
+
+class BatchGame:
+    """
+    n single-bird games stepped in lockstep. A frame is split in two so a
+    controller can act in between, exactly where eval_genomes calls
+    net.activate:
+
+        obs = game.begin_frame()   # +0.1 fitness, bird.move(), inputs
+        game.end_frame(jump)       # jump, pipes, collisions, score, floor
+
+    Dead games are left untouched until they are reset.
+    """
+
+    def __init__(self, courses, course_index, max_score=MAX_SCORE, keys=None):
+        """
+        :param courses: CourseTable
+        :param course_index: course row for every game (sequence of int)
+        :param max_score: end games once the score goes over this, None to never stop
+        :param keys: genome key of every game, for recordings; a label of
+                     the game slot, not part of its state. -1 when not known
+        :return: None
+        """
+        self.courses = courses
+        self.course = np.array(course_index, dtype=np.int64)
+        self.max_score = max_score
+        n = self.n = len(self.course)
+        self.key = np.full(n, -1, dtype=np.int64) if keys is None else np.array(keys, dtype=np.int64)
+
+        self.frame = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n)
+        self.vel = np.zeros(n)
+        self.tick = np.zeros(n, dtype=np.int64)
+        self.height = np.zeros(n)
+        self.tilt = np.zeros(n, dtype=np.int64)
+        self.img_count = np.zeros(n, dtype=np.int64)
+        self.img = np.zeros(n, dtype=np.int64)  # index into bird_images
+        self.alive = np.zeros(n, dtype=bool)
+        self.jumped = np.zeros(n, dtype=bool)  # jump decisions of the last end_frame
+        self.fitness = np.zeros(n)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.death = np.zeros(n, dtype=np.int8)
+        self.obs = np.zeros((n, 3))
+
+        # scratch buffers, so stepping does not allocate
+        self._f = np.zeros(n)
+        self._f2 = np.zeros(n)
+        self._i = np.zeros(n, dtype=np.int64)
+        self._i2 = np.zeros(n, dtype=np.int64)
+        self._i3 = np.zeros(n, dtype=np.int64)
+        self._b = np.zeros(n, dtype=bool)
+        self._b2 = np.zeros(n, dtype=bool)
+        self._hit = np.zeros(n, dtype=bool)
+
+        self.reset()
+
+    def reset(self, index=None):
+        """
+        put games back at the start of their course
+        :param index: games to reset, all of them when None
+        :return: None
+        """
+        if index is None:
+            index = slice(None)
+        self.frame[index] = 0
+        self.y[index] = BIRD_Y
+        self.vel[index] = 0
+        self.tick[index] = 0
+        self.height[index] = BIRD_Y
+        self.tilt[index] = 0
+        self.img_count[index] = 0
+        self.img[index] = 0
+        self.alive[index] = True
+        self.jumped[index] = False
+        self.fitness[index] = 0
+        self.score[index] = 0
+        self.death[index] = DEATH_NONE
+
+    def snapshot(self, index=None, out=None):
+        """
+        copy the state of games, e.g. to fork them for a look-ahead or to
+        rewind them later with restore()
+        :param index: games to copy (int array or slice), all when None
+        :param out: optional STATE_DTYPE array of the right length to
+                    copy into, so nothing is allocated
+        :return: STATE_DTYPE array, one record per game
+        """
+        if index is None:
+            index = slice(None)
+        if out is None:
+            out = np.empty(len(self.course[index]), dtype=STATE_DTYPE)
+        for name in STATE_FIELDS:
+            out[name] = getattr(self, name)[index]
+        out['seed'] = self.courses.seeds[out['course']]
+        return out
+
+    def restore(self, state, index=None):
+        """
+        put games back in a state from snapshot(), of these or any other
+        games. A game goes on the course row of its record when that row
+        holds its seed, else on a row of the table that does, which is
+        added when there is none; rows other games play are never changed
+        :param state: STATE_DTYPE array
+        :param index: games to overwrite (int array or slice), all when None
+        :return: None
+        """
+        if index is None:
+            index = slice(None)
+        rows = state['course'].copy()
+        same = rows < len(self.courses.seeds)
+        same[same] = self.courses.seeds[rows[same]] == state['seed'][same]
+        if not same.all():
+            rows[~same] = self.courses.rows(state['seed'][~same])
+        for name in STATE_FIELDS:
+            getattr(self, name)[index] = state[name]
+        self.course[index] = rows
+
+    def begin_frame(self):
+        """
+        start a frame for every alive game: reward it for surviving, move
+        the bird and compute the three inputs eval_genomes feeds the net
+        :return: (n, 3) array of (bird.y, distance to top pipe, distance to bottom pipe)
+        """
+        alive, d, f, up, b = self.alive, self._f, self._f2, self._b, self._b2
+        np.add(self.frame, 1, out=self.frame, where=alive)
+        np.add(self.fitness, FRAME_REWARD, out=self.fitness, where=alive)
+
+        # Bird.move
+        np.add(self.tick, 1, out=self.tick, where=alive)
+        np.multiply(self.vel, self.tick, out=d)
+        np.multiply(self.tick, self.tick, out=f)
+        np.multiply(f, 0.5*(3), out=f)
+        np.add(d, f, out=d)  # displacement
+        np.minimum(d, 16, out=d)  # terminal velocity
+        np.less(d, 0, out=up)
+        np.subtract(d, 2, out=d, where=up)
+        np.add(self.y, d, out=self.y, where=alive)
+
+        np.add(self.height, 50, out=f)
+        np.less(self.y, f, out=b)
+        np.logical_or(up, b, out=up)  # tilt up
+        np.logical_and(up, alive, out=b)
+        np.copyto(self.tilt, MAX_ROTATION, where=b)
+        np.logical_not(up, out=up)  # tilt down
+        np.logical_and(up, alive, out=up)
+        np.greater(self.tilt, -90, out=b)
+        np.logical_and(up, b, out=up)
+        np.subtract(self.tilt, ROT_VEL, out=self.tilt, where=up)
+
+        self._observe()
+        return self.obs
+
+    def _observe(self):
+        # eval_genomes looks at pipes[1] once the bird is past pipes[0],
+        # which makes the observed pipe the first one whose right edge was
+        # not left of the bird before this frame's move
+        k, i, h, obs = self._i, self._i2, self._f, self.obs
+        np.multiply(self.frame, -PIPE_VEL, out=k)
+        np.add(k, PIPE_VEL + PIPE_START_X + PIPE_WIDTH - BIRD_X, out=k)
+        np.floor_divide(k, PIPE_SPACING, out=k)
+        np.negative(k, out=k)  # ceil of the negated division
+        np.maximum(k, 0, out=k)
+        self.courses.ensure(int(k.max()))
+        np.multiply(self.course, self.courses.heights.shape[1], out=i)
+        np.add(i, k, out=i)
+        np.take(self.courses.heights, i, out=k)
+
+        np.copyto(obs[:, 0], self.y)
+        np.subtract(self.y, k, out=h)
+        np.abs(h, out=obs[:, 1])
+        np.subtract(h, PIPE_GAP, out=h)
+        np.abs(h, out=obs[:, 2])
+
+    def end_frame(self, jump):
+        """
+        finish the frame: apply the jump decisions, check the pipes, hand
+        out the pipe bonus, check floor and ceiling and animate the birds
+        :param jump: bool array, True where the bird should jump
+        :return: None
+        """
+        alive, b, f = self.alive, self._b, self._f
+        jumped = self.jumped
+        np.logical_and(alive, jump, out=jumped)  # Bird.jump
+        np.copyto(self.vel, JUMP_VEL, where=jumped)
+        np.copyto(self.tick, 0, where=jumped)
+        np.copyto(self.height, self.y, where=jumped)
+
+        hit = self.collide()
+        np.add(self.fitness, COLLIDE_PENALTY, out=self.fitness, where=hit)
+        np.copyto(self.death, DEATH_PIPE, where=hit)
+        np.copyto(alive, False, where=hit)
+
+        # every course passes a pipe on the same frames
+        self._passing(b)
+        np.logical_and(b, alive, out=b)
+        np.add(self.fitness, PIPE_REWARD, out=self.fitness, where=b)
+        np.add(self.score, 1, out=self.score, where=b)
+
+        np.add(self.y, BIRD_HEIGHT - 10, out=f)
+        np.greater_equal(f, FLOOR, out=b)
+        np.logical_and(b, alive, out=b)
+        np.copyto(self.death, DEATH_FLOOR, where=b)
+        np.copyto(alive, False, where=b)
+        np.less(self.y, -50, out=b)
+        np.logical_and(b, alive, out=b)
+        np.copyto(self.death, DEATH_CEILING, where=b)
+        np.copyto(alive, False, where=b)
+
+        self._animate()
+
+        if self.max_score is not None:
+            np.greater(self.score, self.max_score, out=b)
+            np.copyto(alive, False, where=b)
+
+    def _passing(self, out):
+        k, b = self._i, self._b2
+        np.subtract(self.frame, FIRST_PASS_FRAME, out=k)
+        np.greater_equal(k, 0, out=out)
+        np.remainder(k, PIPE_PERIOD, out=k)
+        np.equal(k, 0, out=b)
+        np.logical_and(out, b, out=out)
+
+    def collide(self):
+        """
+        pixel perfect pipe collision for every alive game, the same test
+        as Pipe.collide
+        :return: bool array of games whose bird hits a pipe this frame
+        """
+        hit, near, b, k, x = self._hit, self._b, self._b2, self._i, self._i2
+        hit[:] = False
+        # only one pipe can overlap the bird at a time: the right-most one
+        # that is not past the bird's right edge
+        np.multiply(self.frame, PIPE_VEL, out=k)
+        np.add(k, BIRD_X + BIRD_WIDTH - 1 - PIPE_START_X, out=k)
+        np.floor_divide(k, PIPE_SPACING, out=k)
+        np.multiply(self.frame, -PIPE_VEL, out=x)
+        np.add(x, PIPE_START_X, out=x)
+        np.multiply(k, PIPE_SPACING, out=self._i3)
+        np.add(x, self._i3, out=x)  # pipe_x(k, frame)
+        np.greater_equal(k, 0, out=near)
+        np.logical_and(near, self.alive, out=near)
+        np.greater(x, BIRD_X - PIPE_WIDTH, out=b)
+        np.logical_and(near, b, out=near)
+        if not near.any():
+            return hit
+        g = np.flatnonzero(near)
+        heights = self.courses.heights[self.course[g], k[g]]
+        hit[g] = pipe_hit(self.img[g], x[g] - BIRD_X, np.round(self.y[g]).astype(np.int64), heights)
+        return hit
+
+    def _animate(self):
+        # Bird.draw picks the image that the next collision test uses
+        alive, ic, b, b2 = self.alive, self.img_count, self._b, self._b2
+        np.add(ic, 1, out=ic, where=alive)
+        for lo, hi, img in ((1, ANIMATION_TIME, 0), (ANIMATION_TIME + 1, ANIMATION_TIME*2, 1),
+                            (ANIMATION_TIME*2 + 1, ANIMATION_TIME*3, 2), (ANIMATION_TIME*3 + 1, ANIMATION_TIME*4, 1),
+                            (ANIMATION_TIME*4 + 1, ANIMATION_TIME*4 + 1, 0)):
+            np.greater_equal(ic, lo, out=b)
+            np.less_equal(ic, hi, out=b2)
+            np.logical_and(b, b2, out=b)
+            np.logical_and(b, alive, out=b)
+            np.copyto(self.img, img, where=b)
+        np.equal(ic, ANIMATION_TIME*4 + 1, out=b)
+        np.logical_and(b, alive, out=b)
+        np.copyto(ic, 0, where=b)
+
+        # so when bird is nose diving it isn't flapping
+        np.less_equal(self.tilt, -80, out=b)
+        np.logical_and(b, alive, out=b)
+        np.copyto(self.img, 1, where=b)
+        np.copyto(ic, ANIMATION_TIME*2, where=b)
+
+    def skip(self, frames):
+        """
+        play the next frames of every alive game in one go, with no bird
+        jumping. Where the birds are in each of those frames follows from
+        the frames since their last jump, so the pipe, floor and ceiling
+        tests of all the frames are done at once on (games, frames)
+        arrays. Every skipped frame gets the tests end_frame would give
+        it, so no bird slips through a pipe lip between two tests and
+        games end on the same frame as when stepped frame by frame.
+        :param frames: int
+        :return: None
+        """
+        g = np.flatnonzero(self.alive)
+        if frames <= 0 or not len(g):
+            return
+        n = len(g)
+        j = np.arange(1, frames + 1)
+        frame = self.frame[g, None] + j
+        jumped = (self.vel[g, None] != 0).astype(np.int64)
+        y, tilt = path(jumped, self.tick[g, None] + j)
+        y += self.height[g, None]
+
+        # the image every frame's collision test sees is the one the frame
+        # before picked; a nose dive lasts until the next jump
+        nose_dive = tilt <= -80
+        img_count = np.where(nose_dive, ANIMATION_TIME*2, (self.img_count[g, None] + j) % FLAP_PERIOD)
+        img = np.where(nose_dive, 1, FLAP_IMAGES[img_count])
+        seen = np.concatenate([self.img[g, None], img[:, :-1]], axis=1)
+
+        k = (frame * PIPE_VEL + BIRD_X + BIRD_WIDTH - 1 - PIPE_START_X) // PIPE_SPACING
+        x = pipe_x(k, frame)
+        near = (k >= 0) & (x > BIRD_X - PIPE_WIDTH)
+        k = np.maximum(k, 0)
+        self.courses.ensure(int(k.max()))
+        heights = self.courses.heights[self.course[g, None], k]
+        hit = near & pipe_hit(seen, x - BIRD_X, np.round(y).astype(np.int64), heights)
+
+        passed = (frame >= FIRST_PASS_FRAME) & ((frame - FIRST_PASS_FRAME) % PIPE_PERIOD == 0) & ~hit
+        score = self.score[g, None] + np.cumsum(passed, axis=1)
+        floor = ~hit & (y + BIRD_HEIGHT - 10 >= FLOOR)
+        ceiling = ~hit & ~floor & (y < -50)
+        dead = hit | floor | ceiling
+        end = dead if self.max_score is None else dead | (score > self.max_score)
+        last = np.where(end.any(axis=1), end.argmax(axis=1), frames - 1)  # index of the last frame played
+        rows = np.arange(n)
+
+        # the same float additions in the same order as frame by frame
+        fitness = self.fitness[g]
+        for i in range(frames):
+            playing = last >= i
+            np.add(fitness, FRAME_REWARD, out=fitness, where=playing)
+            np.add(fitness, COLLIDE_PENALTY, out=fitness, where=playing & hit[:, i])
+            np.add(fitness, PIPE_REWARD, out=fitness, where=playing & passed[:, i])
+        self.fitness[g] = fitness
+
+        self.frame[g] = frame[rows, last]
+        self.tick[g] += last + 1
+        self.y[g] = y[rows, last]
+        self.tilt[g] = tilt[rows, last]
+        self.score[g] = score[rows, last]
+        died = dead[rows, last]
+        self.death[g] = np.select([hit[rows, last], floor[rows, last], ceiling[rows, last]],
+                                  [DEATH_PIPE, DEATH_FLOOR, DEATH_CEILING], DEATH_NONE)
+        self.alive[g] = ~end[rows, last]
+        # a bird that died didn't get to Bird.draw in its last frame
+        shown = np.where(died, last - 1, last)
+        self.img_count[g] = np.where(shown >= 0, img_count[rows, shown], self.img_count[g])
+        self.img[g] = np.where(shown >= 0, img[rows, shown], self.img[g])
+
+    def run(self, policy, every=1, observer=None):
+        """
+        play every game until it ends
+        :param policy: function (obs, alive) -> bool array of jumps
+        :param every: ask the policy every this many frames, the frames
+                      in between are played with skip()
+        :param observer: optional function (game) -> None, called after every
+                         policy step, e.g. flappy_viewer.Publisher.publish
+        :return: None
+        """
+        while self.alive.any():
+            obs = self.begin_frame()
+            self.end_frame(policy(obs, self.alive))
+            self.skip(every - 1)
+            if observer is not None:
+                observer(self)
+
+
+class FitnessAccountant:
+    """
+    Fitness bookkeeping for the on screen eval_genomes loop, without
+    touching genomes every frame. Every bird that is alive gets the same
+    rewards at the same time, so they all follow one fitness timeline and
+    a bird's fitness is where it left the timeline, less the collision
+    penalty when a pipe killed it. The loop only calls frame(), passed()
+    and died(); fitness() then adds the timeline up with np.add.accumulate
+    in the order eval_genomes added to genome.fitness, so the numbers are
+    the same to the last bit.
+    """
+
+    def __init__(self, n):
+        """
+        :param n: number of birds (int)
+        :return: None
+        """
+        self.frame_count = 0
+        self.passes = []  # frames a pipe was passed in
+        self.frames = np.zeros(n, dtype=np.int64)  # frame a bird died in
+        self.death = np.zeros(n, dtype=np.int8)  # DEATH_*
+        self.alive = np.ones(n, dtype=bool)
+
+    def frame(self):
+        """
+        a new frame starts, every bird alive gets FRAME_REWARD
+        :return: None
+        """
+        self.frame_count += 1
+
+    def passed(self):
+        """
+        a pipe was passed this frame, every bird alive gets PIPE_REWARD
+        :return: None
+        """
+        self.passes.append(self.frame_count)
+
+    def died(self, bird, cause):
+        """
+        a bird died this frame, after its FRAME_REWARD and, unless a pipe
+        killed it, after the PIPE_REWARD of a pipe passed this frame
+        :param bird: index of the bird (int)
+        :param cause: DEATH_PIPE, DEATH_FLOOR or DEATH_CEILING
+        :return: None
+        """
+        self.frames[bird] = self.frame_count
+        self.death[bird] = cause
+        self.alive[bird] = False
+
+    def frames_alive(self):
+        """
+        :return: (n,) array, frames every bird played so far
+        """
+        return np.where(self.alive, self.frame_count, self.frames)
+
+    def scores(self):
+        """
+        :return: (n,) array, pipes every bird passed; a pipe passed in the
+                 frame a pipe killed the bird does not count
+        """
+        passes = np.array(self.passes, dtype=np.int64)
+        frames = self.frames_alive()
+        return np.where(self.death == DEATH_PIPE, np.searchsorted(passes, frames, side="left"),
+                        np.searchsorted(passes, frames, side="right"))
+
+    def fitness(self):
+        """
+        :return: (n,) fitness array
+        """
+        passes = np.array(self.passes, dtype=np.int64)
+        rewards = np.full(self.frame_count + len(passes), float(FRAME_REWARD))
+        rewards[passes + np.arange(len(passes))] = PIPE_REWARD
+        timeline = np.concatenate([[0.0], np.add.accumulate(rewards)])
+
+        frames = self.frames_alive()
+        before = np.searchsorted(passes, frames, side="left")  # passes before a bird's last frame
+        after = np.searchsorted(passes, frames, side="right")  # including its last frame
+        return np.where(self.death == DEATH_PIPE, timeline[frames + before] + COLLIDE_PENALTY,
+                        timeline[frames + after])
+
+
+def rules_key(max_score=MAX_SCORE):
+    """
+    everything besides the course seed and the controller that decides
+    the fitness of a game, to tell results of different rules apart
+    :param max_score: see BatchGame
+    :return: tuple
+    """
+    return (FLOOR, BIRD_X, BIRD_Y, PIPE_GAP, PIPE_VEL, PIPE_START_X, PIPE_SPAWN_X, PIPE_MIN_HEIGHT,
+            PIPE_MAX_HEIGHT, MAX_ROTATION, ROT_VEL, ANIMATION_TIME, JUMP_VEL, FRAME_REWARD, PIPE_REWARD,
+            COLLIDE_PENALTY, max_score)
+
+
+def net_policy(nets, net_index=None):
+    """
+    controller that asks net net_index[i] for game i, the way eval_genomes
+    does: jump when the output is over 0.5
+    :param nets: list of neat.nn.FeedForwardNetwork
+    :param net_index: net of every game, game i uses net i % len(nets) when None
+    :return: function (obs, alive) -> bool array
+    """
+    def policy(obs, alive):
+        jump = np.zeros(len(obs), dtype=bool)
+        for g in np.flatnonzero(alive):
+            net = nets[g % len(nets)] if net_index is None else nets[net_index[g]]
+            output = net.activate(obs[g])
+            jump[g] = output[0] > 0.5
+        return jump
+    return policy
+
+
+def aggregate(fitness, how="mean"):
+    """
+    combine the fitness a genome got on every course into one number
+    :param fitness: (courses, genomes) array
+    :param how: "mean", "min", "median" or a quantile between 0 and 1 (float)
+    :return: (genomes,) array
+    """
+    if how == "mean":
+        return fitness.mean(axis=0)
+    if how == "min":
+        return fitness.min(axis=0)
+    if how == "median":
+        return np.median(fitness, axis=0)
+    if isinstance(how, (int, float)) and 0 <= how <= 1:
+        return np.quantile(fitness, how, axis=0)
+    raise ValueError("unknown fitness aggregate: {!r}".format(how))
+
+
+def evaluate_courses(nets, seeds, how="mean", max_score=MAX_SCORE, frames=None, observer=None, keys=None):
+    """
+    play every net on every course in one batched simulation
+    :param nets: list of networks with an activate method
+    :param seeds: one seed per course, or a CourseTable of the courses
+    :param how: how to aggregate the courses, see aggregate()
+    :param max_score: stop a game once its score goes over this
+    :param frames: optional (courses, nets) array, gets the frames every game lasted
+    :param observer: optional function (game) -> None, see BatchGame.run
+    :param keys: optional genome key of every net, see BatchGame
+    :return: (aggregated fitness per net, (courses, nets) fitness array)
+    """
+    courses = seeds if isinstance(seeds, CourseTable) else CourseTable(seeds)
+    count = len(courses.seeds)
+    played = None if frames is None else np.empty(count * len(nets), dtype=np.int64)
+    fitness = play_games(nets, courses, np.tile(np.arange(len(nets)), count),
+                         np.repeat(np.arange(count), len(nets)), max_score, played, observer,
+                         None if keys is None else np.tile(keys, count))
+    fitness = fitness.reshape(count, len(nets))
+    if frames is not None:
+        frames[...] = played.reshape(count, len(nets))
+    return aggregate(fitness, how), fitness
+
+
+def play_games(nets, seeds, net_index, course_index, max_score=MAX_SCORE, frames=None, observer=None, keys=None):
+    """
+    play any set of (net, course) pairs in one batched simulation
+    :param nets: list of networks with an activate method
+    :param seeds: course seeds, or a CourseTable of the courses
+    :param net_index: net of every game (sequence of int)
+    :param course_index: index into seeds of every game (sequence of int)
+    :param max_score: stop a game once its score goes over this
+    :param frames: optional array, gets the frames every game lasted
+    :param observer: optional function (game) -> None, see BatchGame.run
+    :param keys: optional genome key of every game, see BatchGame
+    :return: fitness of every game
+    """
+    courses = seeds if isinstance(seeds, CourseTable) else CourseTable(seeds)
+    game = BatchGame(courses, course_index, max_score, keys)
+    game.run(net_policy(nets, np.asarray(net_index)), observer=observer)
+    if frames is not None:
+        frames[...] = game.frame
+    return game.fitness
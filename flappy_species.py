@@ -0,0 +1,260 @@
+"""
+Species set for big populations. It places genomes in exactly the same
+species as neat.DefaultSpeciesSet, but the genome distances are not
+computed pair by pair in python: the genes of the population are laid
+out as aligned arrays (one column per node or connection key) and the
+distances from a representative to every genome are computed in one go.
+Distances of genomes that did not change, like the elites, are kept
+from one generation to the next.
+
+Use it by passing ArraySpeciesSet to neat.config.Config; it reads the
+same compatibility_threshold from its own [ArraySpeciesSet] section.
+"""
+import numpy as np
+import neat
+from neat.six_util import iteritems, iterkeys
+
+
+class GeneEncoder:
+    """
+    turns genomes into arrays of gene ids and attributes, remembering
+    the arrays of genomes it has seen before
+    """
+
+    def __init__(self):
+        self.node_ids = {}  # node key -> id
+        self.conn_ids = {}  # connection key -> id
+        self.names = {}  # activation / aggregation name -> code
+        self.genomes = {}  # genome key -> (genome, genes)
+
+    @staticmethod
+    def _id(table, key):
+        i = table.get(key)
+        if i is None:
+            i = table[key] = len(table)
+        return i
+
+    def encode(self, genome):
+        """
+        :param genome: neat.DefaultGenome
+        :return: (node ids, [bias, response], [activation, aggregation],
+                  connection ids, [weight], [enabled]), each in the order of
+                  the genome's gene dicts
+        """
+        known = self.genomes.get(genome.key)
+        if known is not None and known[0] is genome:
+            return known[1]
+
+        nodes = list(genome.nodes.values())
+        conns = list(genome.connections.values())
+        genes = (np.array([self._id(self.node_ids, n.key) for n in nodes], dtype=np.int64),
+                 [np.array([n.bias for n in nodes], dtype=float), np.array([n.response for n in nodes], dtype=float)],
+                 [np.array([self._id(self.names, n.activation) for n in nodes], dtype=np.int64),
+                  np.array([self._id(self.names, n.aggregation) for n in nodes], dtype=np.int64)],
+                 np.array([self._id(self.conn_ids, c.key) for c in conns], dtype=np.int64),
+                 [np.array([c.weight for c in conns], dtype=float)],
+                 [np.array([c.enabled for c in conns], dtype=np.int64)])
+        self.genomes[genome.key] = (genome, genes)
+        return genes
+
+    def forget(self, keep):
+        """
+        drop the arrays of genomes that are not in keep
+        :param keep: set of genome keys
+        :return: None
+        """
+        for key in [k for k in self.genomes if k not in keep]:
+            del self.genomes[key]
+
+
+class _GeneTable:
+    """
+    one kind of gene (nodes or connections) of a whole population: a
+    column per gene id, a row per genome
+    """
+
+    def __init__(self, ids, numeric, categorical):
+        counts = np.array([len(i) for i in ids], dtype=np.int64)
+        all_ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+        self.columns, col = np.unique(all_ids, return_inverse=True)
+        rows = np.repeat(np.arange(len(ids)), counts)
+        shape = (len(ids), len(self.columns))
+        self.count = counts
+        self.present = np.zeros(shape, dtype=bool)
+        self.present[rows, col] = True
+        self.numeric = []
+        for n in range(len(numeric[0]) if numeric else 0):
+            values = np.zeros(shape)
+            values[rows, col] = np.concatenate([v[n] for v in numeric])
+            self.numeric.append(values)
+        self.categorical = []
+        for n in range(len(categorical[0]) if categorical else 0):
+            values = np.full(shape, -1, dtype=np.int64)
+            values[rows, col] = np.concatenate([v[n] for v in categorical])
+            self.categorical.append(values)
+
+    def distance(self, ids, numeric, categorical, rows, disjoint_coefficient, weight_coefficient):
+        """
+        the node or connection half of DefaultGenome.distance, from one
+        genome (self in distance) to the genomes in rows, summed in the
+        same order so the floats come out the same
+        """
+        if len(self.columns) and len(ids):
+            pos = np.minimum(np.searchsorted(self.columns, ids), len(self.columns) - 1)
+            cols = np.ix_(rows, pos)
+            present = self.present[cols] & (self.columns[pos] == ids)
+            d = np.abs(self.numeric[0][cols] - numeric[0])
+            for values, own in zip(self.numeric[1:], numeric[1:]):
+                d += np.abs(values[cols] - own)
+            for values, own in zip(self.categorical, categorical):
+                d += (values[cols] != own)
+            d *= weight_coefficient
+            d[~present] = 0.0
+            total = np.cumsum(d, axis=1)[:, -1]
+        else:
+            present = np.zeros((len(rows), len(ids)), dtype=bool)
+            total = np.zeros(len(rows))
+
+        other = self.count[rows]
+        disjoint = len(ids) + other - 2 * present.sum(axis=1)
+        most = np.maximum(len(ids), other)
+        out = np.zeros(len(rows))
+        np.divide(total + disjoint_coefficient * disjoint, most, out=out, where=most > 0)
+        return out
+
+
+class ArraySpeciesSet(neat.DefaultSpeciesSet):
+    """
+    neat.DefaultSpeciesSet with array based genome distances
+    """
+
+    def __init__(self, config, reporters):
+        super().__init__(config, reporters)
+        self.encoder = GeneEncoder()
+        self.distance_cache = {}  # representative key -> (sorted genome keys, distances)
+        self.hits = 0
+        self.misses = 0
+
+    def _directional(self, rep, keys, nodes, conns, genome_config):
+        # rep.distance(g) for every genome of the population, taking
+        # the genomes seen with this representative before from the cache
+        cached_keys, cached = self.distance_cache.get(rep.key, (np.zeros(0, dtype=np.int64), np.zeros(0)))
+        pos = np.minimum(np.searchsorted(cached_keys, keys), max(len(cached_keys) - 1, 0))
+        known = (cached_keys[pos] == keys) if len(cached_keys) else np.zeros(len(keys), dtype=bool)
+        out = np.empty(len(keys))
+        out[known] = cached[pos[known]]
+        rows = np.flatnonzero(~known)
+        if len(rows):
+            node_ids, node_num, node_cat, conn_ids, conn_num, conn_cat = self.encoder.encode(rep)
+            dc = genome_config.compatibility_disjoint_coefficient
+            wc = genome_config.compatibility_weight_coefficient
+            out[rows] = (nodes.distance(node_ids, node_num, node_cat, rows, dc, wc) +
+                         conns.distance(conn_ids, conn_num, conn_cat, rows, dc, wc))
+        self.hits += int(known.sum())
+        self.misses += len(rows)
+        order = np.argsort(keys)
+        self.distance_cache[rep.key] = (keys[order], out[order])
+        return out
+
+    def speciate(self, config, population, generation):
+        """
+        Place genomes into species by genetic similarity, the same way as
+        neat.DefaultSpeciesSet.speciate.
+        """
+        assert isinstance(population, dict)
+
+        compatibility_threshold = self.species_set_config.compatibility_threshold
+        genome_config = config.genome_config
+
+        keys = np.fromiter(iterkeys(population), dtype=np.int64, count=len(population))
+        index = dict((gid, i) for i, gid in enumerate(keys.tolist()))
+        genes = [self.encoder.encode(g) for g in population.values()]
+        nodes = _GeneTable([g[0] for g in genes], [g[1] for g in genes], [g[2] for g in genes])
+        conns = _GeneTable([g[3] for g in genes], [g[4] for g in genes], [g[5] for g in genes])
+
+        # DefaultSpeciesSet asks its distance cache for (representative,
+        # genome) and the cache answers a pair it saw the other way around
+        # with that first value. Only representatives that are also in the
+        # population can be asked both ways, so those are tracked.
+        asked = {}  # representative key in population -> bool array of genomes it was compared to
+        columns = {}  # representative key in population -> its directional distances
+
+        def distances(rep, rows):
+            d = self._directional(rep, keys, nodes, conns, genome_config)
+            if rep.key in index:
+                rep_index = index[rep.key]
+                for q, q_asked in iteritems(asked):
+                    if q != rep.key and q_asked[rep_index]:
+                        d[index[q]] = columns[q][rep_index]
+                if rep.key not in asked:
+                    asked[rep.key] = np.zeros(len(keys), dtype=bool)
+                    columns[rep.key] = d.copy()
+                asked[rep.key][rows] = True
+            return d
+
+        # Find the best representatives for each existing species.
+        unspeciated = set(iterkeys(population))
+        new_representatives = {}
+        new_members = {}
+        seen = []
+        for sid, s in iteritems(self.species):
+            candidates = list(unspeciated)
+            rows = np.array([index[gid] for gid in candidates], dtype=np.int64)
+            d = distances(s.representative, rows)[rows]
+            seen.append(d)
+
+            # The new representative is the genome closest to the current representative.
+            new_rid = candidates[int(np.argmin(d))]
+            new_representatives[sid] = new_rid
+            new_members[sid] = [new_rid]
+            unspeciated.remove(new_rid)
+
+        # Partition population into species based on genetic similarity.
+        sids = list(new_representatives)
+        matrix = np.empty((len(keys), max(len(sids), 4)))
+        for j, sid in enumerate(sids):
+            matrix[:, j] = distances(population[new_representatives[sid]], np.arange(len(keys)))
+        while unspeciated:
+            gid = unspeciated.pop()
+            row = matrix[index[gid], :len(sids)]
+            seen.append(row.copy())
+
+            # Find the species with the most similar representative.
+            close = row < compatibility_threshold
+            if close.any():
+                sid = sids[int(np.argmin(np.where(close, row, np.inf)))]
+                new_members[sid].append(gid)
+            else:
+                # No species is similar enough, create a new species, using
+                # this genome as its representative.
+                sid = next(self.indexer)
+                new_representatives[sid] = gid
+                new_members[sid] = [gid]
+                if len(sids) == matrix.shape[1]:
+                    matrix = np.concatenate([matrix, np.empty_like(matrix)], axis=1)
+                matrix[:, len(sids)] = distances(population[gid], np.arange(len(keys)))
+                sids.append(sid)
+
+        # Update species collection based on new speciation.
+        self.genome_to_species = {}
+        for sid, rid in iteritems(new_representatives):
+            s = self.species.get(sid)
+            if s is None:
+                s = neat.species.Species(sid, generation)
+                self.species[sid] = s
+
+            members = new_members[sid]
+            for gid in members:
+                self.genome_to_species[gid] = sid
+
+            member_dict = dict((gid, population[gid]) for gid in members)
+            s.update(population[rid], member_dict)
+
+        rep_keys = set(new_representatives.values())
+        for key in [k for k in self.distance_cache if k not in rep_keys]:
+            del self.distance_cache[key]
+        self.encoder.forget(set(index) | rep_keys)
+
+        seen = np.concatenate(seen) if seen else np.zeros(1)
+        self.reporters.info(
+            'Mean genetic distance {0:.3f}, standard deviation {1:.3f}'.format(seen.mean(), seen.std()))
@@ -0,0 +1,237 @@
+"""
+Streaming statistics for long runs. neat.StatisticsReporter keeps a deep
+copy of the best genome and the fitness of every species for every
+generation in memory. StatsLog instead appends one row of aggregates
+per generation to a columnar log on disk and only holds the current
+generation, so its memory stays the same however long the run.
+
+A log is a directory with a meta.json that describes the columns and
+one raw little endian file per column, holding one fixed size record
+per generation. Rows are only ever appended, so a run can be read while
+it is still going, from python:
+
+    reader = LogReader("stats")
+    table = reader.read(["generation", "fitness_quantiles"])
+    for row in reader.follow():
+        print(row["generation"], row["best_fitness"])
+
+or from the command line:
+
+    python flappy_stats.py stats [--follow]
+"""
+import os
+import sys
+import json
+import time
+import numpy as np
+import neat
+
+META = "meta.json"
+QUANTILES = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+ALIVE_EDGES = (0, 25, 50, 100, 200, 400, 800, 1600, 3200)  # frames
+MAX_SPECIES = 16
+
+
+def _columns(quantiles, alive_edges, max_species):
+    # (name, dtype, shape) of every column of a log
+    return [("generation", "<i8", ()),
+            ("time", "<f8", ()),  # unix time the generation was evaluated
+            ("eval_seconds", "<f8", ()),
+            ("reproduce_seconds", "<f8", ()),  # making this generation's population, NaN for the first
+            ("population", "<i8", ()),
+            ("species", "<i8", ()),
+            ("fitness_mean", "<f8", ()),
+            ("fitness_std", "<f8", ()),
+            ("fitness_quantiles", "<f8", (len(quantiles),)),
+            ("best_key", "<i8", ()),
+            ("best_fitness", "<f8", ()),
+            ("best_nodes", "<i8", ()),
+            ("best_connections", "<i8", ()),  # enabled ones
+            ("species_sizes", "<i8", (max_species,)),  # largest first, 0 padded
+            ("alive_frames", "<i8", (len(alive_edges),))]  # histogram over alive_edges, last bin open
+
+
+class StatsLog(neat.reporting.BaseReporter):
+    """
+    reporter that writes a row of generation aggregates to a columnar log
+    """
+
+    def __init__(self, path, quantiles=QUANTILES, alive_edges=ALIVE_EDGES, max_species=MAX_SPECIES):
+        """
+        :param path: directory of the log, created if needed; an existing
+                     log with the same columns is appended to
+        :param quantiles: fitness quantiles to keep (floats between 0 and 1)
+        :param alive_edges: left edges of the alive time histogram bins (frames)
+        :param max_species: sizes of this many of the largest species are kept
+        :return: None
+        """
+        self.path = path
+        self.meta = {"version": 1, "quantiles": list(quantiles), "alive_edges": list(alive_edges),
+                     "max_species": max_species,
+                     "columns": [[name, dtype, list(shape)]
+                                 for name, dtype, shape in _columns(quantiles, alive_edges, max_species)]}
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                if json.load(f) != self.meta:
+                    raise ValueError("{} holds a log with other columns".format(path))
+            rows = LogReader(path).rows()
+        else:
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(self.meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+            rows = 0
+
+        self.edges = np.array(alive_edges)
+        self.files = []
+        for name, dtype, shape in self.meta["columns"]:
+            f = open(os.path.join(path, name + ".bin"), "ab")
+            # drop what a crash left of an unfinished row
+            f.truncate(rows * np.dtype(dtype).itemsize * int(np.prod(shape)))
+            self.files.append((f, dtype, shape))
+
+        self.alive = np.zeros(len(self.edges), dtype=np.int64)
+        self.generation = None
+        self.started = None
+        self.evaluated = None
+
+    def add_alive_times(self, frames):
+        """
+        count how many frames birds of this generation stayed alive
+        :param frames: int or sequence of int
+        :return: None
+        """
+        frames = np.atleast_1d(frames)
+        bins = np.searchsorted(self.edges, frames, side="right") - 1
+        self.alive += np.bincount(np.maximum(bins, 0), minlength=len(self.edges))
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.started = time.perf_counter()
+        self.alive[:] = 0
+
+    def post_evaluate(self, config, population, species, best_genome):
+        now = time.perf_counter()
+        fitness = np.array([g.fitness for g in population.values() if g.fitness is not None], dtype=float)
+        if not len(fitness):
+            fitness = np.full(1, np.nan)
+        sizes = sorted((len(s.members) for s in species.species.values()), reverse=True)
+        species_sizes = np.zeros(self.meta["max_species"], dtype=np.int64)
+        species_sizes[:min(len(sizes), len(species_sizes))] = sizes[:len(species_sizes)]
+        nodes, connections = best_genome.size()
+
+        row = [self.generation, time.time(), now - self.started,
+               self.started - self.evaluated if self.evaluated is not None else np.nan,
+               len(population), len(species.species), fitness.mean(), fitness.std(),
+               np.quantile(fitness, self.meta["quantiles"]), best_genome.key, best_genome.fitness,
+               nodes, connections, species_sizes, self.alive]
+        for (f, dtype, shape), value in zip(self.files, row):
+            f.write(np.asarray(value, dtype=dtype).tobytes())
+            f.flush()
+        self.evaluated = now
+
+    def close(self):
+        """
+        close the column files
+        :return: None
+        """
+        for f, dtype, shape in self.files:
+            f.close()
+
+
+class LogReader:
+    """
+    reads a log written by StatsLog, also while it is being written
+    """
+
+    def __init__(self, path):
+        """
+        :param path: directory of the log
+        :return: None
+        """
+        self.path = path
+        with open(os.path.join(path, META)) as f:
+            self.meta = json.load(f)
+        self.columns = [name for name, dtype, shape in self.meta["columns"]]
+        self._types = dict((name, (np.dtype(dtype), tuple(shape))) for name, dtype, shape in self.meta["columns"])
+
+    def _path(self, name):
+        return os.path.join(self.path, name + ".bin")
+
+    def rows(self):
+        """
+        number of complete rows, the columns of a row being written can
+        be a record ahead of each other
+        :return: int
+        """
+        counts = []
+        for name in self.columns:
+            dtype, shape = self._types[name]
+            size = os.path.getsize(self._path(name)) if os.path.exists(self._path(name)) else 0
+            counts.append(size // (dtype.itemsize * int(np.prod(shape))))
+        return min(counts)
+
+    def read(self, columns=None, start=0, stop=None):
+        """
+        rows start:stop of some columns
+        :param columns: column names, all of them when None
+        :param start: first row (int)
+        :param stop: row after the last one, the last complete row when None
+        :return: {column name: array with a leading row axis}
+        """
+        rows = self.rows()
+        stop = rows if stop is None else min(stop, rows)
+        start = min(start, stop)
+        out = {}
+        for name in self.columns if columns is None else columns:
+            dtype, shape = self._types[name]
+            record = int(np.prod(shape))
+            with open(self._path(name), "rb") as f:
+                f.seek(start * record * dtype.itemsize)
+                data = np.fromfile(f, dtype=dtype, count=(stop - start) * record)
+            out[name] = data.reshape((stop - start,) + shape)
+        return out
+
+    def follow(self, start=0, poll=1.0, timeout=None):
+        """
+        yield rows as dicts as they are written
+        :param start: first row (int)
+        :param poll: seconds between looks for new rows
+        :param timeout: stop after this many seconds without a new row, None to never stop
+        :return: generator of {column name: value}
+        """
+        last = time.monotonic()
+        while True:
+            table = self.read(start=start)
+            n = len(table[self.columns[0]])
+            for i in range(n):
+                yield dict((name, values[i]) for name, values in table.items())
+            start += n
+            if n:
+                last = time.monotonic()
+            elif timeout is not None and time.monotonic() - last > timeout:
+                return
+            else:
+                time.sleep(poll)
+
+
+def _print_row(row, quantiles):
+    median = row["fitness_quantiles"][quantiles.index(0.5)] if 0.5 in quantiles else row["fitness_mean"]
+    print("{:>5} {:>10.2f} {:>10.2f} {:>10.2f} {:>8} {:>9.2f}".format(
+        row["generation"], row["best_fitness"], median, row["fitness_mean"], row["species"], row["eval_seconds"]))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3 and sys.argv[2] != "--follow"):
+        print("usage: python flappy_stats.py LOG_DIRECTORY [--follow]")
+        sys.exit(1)
+    reader = LogReader(sys.argv[1])
+    print("{:>5} {:>10} {:>10} {:>10} {:>8} {:>9}".format("gen", "best", "median", "mean", "species", "eval s"))
+    if len(sys.argv) == 3:
+        for row in reader.follow():
+            _print_row(row, reader.meta["quantiles"])
+    else:
+        table = reader.read()
+        for i in range(len(table["generation"])):
+            _print_row(dict((name, values[i]) for name, values in table.items()), reader.meta["quantiles"])
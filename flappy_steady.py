@@ -0,0 +1,219 @@
+"""
+Steady-state evolution without a generation barrier. With
+neat.Population.run every generation waits for its longest game, so one
+strong genome keeps all but one core idle. SteadyState keeps a pool of
+worker processes busy all the time instead: every finished evaluation
+goes into the population in place of its worst genome, and straight
+away a new child of two tournament winners from the same species is
+sent out to keep every worker fed.
+
+Every genome plays the same courses: a new genome is compared with
+genomes that were evaluated long before, which is only fair on the same
+courses. The worst genome is found with a heap keyed on fitness, so an
+insert costs log(pop_size), not a scan of the population.
+
+Every pop_size evaluations count as a generation for the reporters:
+the population is speciated and the usual reporters (StdOutReporter,
+flappy_stats.StatsLog, ...) get start/post_evaluate/end_generation,
+followed by a line with the evaluations per second and how busy the
+workers were.
+
+    steady = SteadyState(config, workers=8)
+    steady.add_reporter(neat.StdOutReporter(True))
+    winner = steady.run(evaluations=20000)
+"""
+import time
+import heapq
+import random
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import neat
+import flappy_sim
+import flappy_cache
+
+_config = None
+_net_cache = None
+
+
+def _init_worker(config):
+    global _config, _net_cache
+    _config = config
+    _net_cache = flappy_cache.NetCache()
+
+
+def evaluate_genome(genome, seeds, how, max_score):
+    """
+    what a worker does with one genome
+    :return: (fitness, frames every course lasted, seconds it took)
+    """
+    start = time.perf_counter()
+    frames = np.empty((len(seeds), 1), dtype=np.int64)
+    fitness = flappy_sim.evaluate_courses([_net_cache.create(genome, _config)], seeds, how, max_score, frames)[0]
+    return float(fitness[0]), frames[:, 0], time.perf_counter() - start
+
+
+class SteadyState:
+    """
+    asynchronous steady-state NEAT on a process pool
+    """
+
+    def __init__(self, config, workers=multiprocessing.cpu_count(), courses=5, how="mean",
+                 max_score=flappy_sim.MAX_SCORE, tournament=3, queued=2, alive_times=None):
+        """
+        :param config: neat config, pop_size is the size of the population
+        :param workers: number of processes (int)
+        :param courses: courses every genome plays, the same ones for all (int)
+        :param how: how to aggregate the courses, see flappy_sim.aggregate
+        :param max_score: stop a game once its score goes over this
+        :param tournament: genomes that compete to become a parent (int)
+        :param queued: genomes in flight per worker, so a worker never waits for the next one (int)
+        :param alive_times: optional function that gets the frames every game of a genome lasted
+        :return: None
+        """
+        self.config = config
+        self.workers = workers
+        self.courses = courses
+        self.how = how
+        self.max_score = max_score
+        self.tournament = tournament
+        self.queued = queued
+        self.alive_times = alive_times
+        self.reporters = neat.reporting.ReporterSet()
+        self.species = config.species_set_type(config.species_set_config, self.reporters)
+        self.genome_indexer = itertools.count(1)
+        self.population = {}  # key -> evaluated genome
+        self._worst = []  # heap of (fitness, key) of the population
+        self._keys = []  # keys of the population, to draw tournaments from
+        self._slots = {}  # key -> its index in _keys
+        self._members = {}  # species id -> member keys when it was speciated
+        self.generation = 0
+        self.best_genome = None
+        if config.fitness_criterion == 'max':
+            self.fitness_criterion = max
+        elif config.fitness_criterion == 'min':
+            self.fitness_criterion = min
+        elif config.fitness_criterion == 'mean':
+            self.fitness_criterion = neat.math_util.mean
+        elif not config.no_fitness_termination:
+            raise RuntimeError("Unexpected fitness_criterion: {0!r}".format(config.fitness_criterion))
+
+    def add_reporter(self, reporter):
+        self.reporters.add(reporter)
+
+    def remove_reporter(self, reporter):
+        self.reporters.remove(reporter)
+
+    def _seeds(self):
+        return list(range(self.courses))
+
+    def _select(self, keys):
+        # tournament among keys, those no longer in the population left out
+        genomes = [self.population[key] for key in random.sample(keys, min(self.tournament, len(keys)))
+                   if key in self.population]
+        return max(genomes, key=lambda g: g.fitness) if genomes else None
+
+    def _child(self):
+        # crossover of a tournament winner and a mate from its species, mutated
+        parent1 = self._select(self._keys)
+        parent2 = self._select(self._members.get(self.species.genome_to_species.get(parent1.key), self._keys))
+        if parent2 is None:
+            parent2 = parent1
+        child = self.config.genome_type(next(self.genome_indexer))
+        child.configure_crossover(parent1, parent2, self.config.genome_config)
+        child.mutate(self.config.genome_config)
+        return child
+
+    def _insert(self, genome):
+        # the new genome goes in, the worst one (maybe the new one) goes out
+        self.population[genome.key] = genome
+        heapq.heappush(self._worst, (genome.fitness, genome.key))
+        self._slots[genome.key] = len(self._keys)
+        self._keys.append(genome.key)
+        if self.best_genome is None or genome.fitness > self.best_genome.fitness:
+            self.best_genome = genome
+        if len(self.population) > self.config.pop_size:
+            fitness, key = heapq.heappop(self._worst)
+            del self.population[key]
+            # swap the last key into its slot
+            slot, last = self._slots.pop(key), self._keys.pop()
+            if last != key:
+                self._keys[slot] = last
+                self._slots[last] = slot
+
+    def _report(self, evaluations, busy, elapsed):
+        # one generation worth of evaluations is in
+        self.species.speciate(self.config, self.population, self.generation)
+        self._members = dict((sid, list(s.members)) for sid, s in self.species.species.items())
+        for s in self.species.species.values():
+            fitness = max(m.fitness for m in s.members.values())
+            if s.fitness is None or fitness > s.fitness:
+                s.last_improved = self.generation
+            s.fitness = fitness
+        best = max(self.population.values(), key=lambda g: g.fitness)
+        self.reporters.post_evaluate(self.config, self.population, self.species, best)
+        self.reporters.info("Throughput: {0:.1f} evaluations/s, workers busy {1:.0%}".format(
+            evaluations / elapsed, busy / (elapsed * self.workers)))
+        self.reporters.end_generation(self.config, self.population, self.species)
+        self.generation += 1
+
+    def run(self, evaluations=None):
+        """
+        evolve until the best fitness reaches fitness_threshold or after a
+        number of evaluations
+        :param evaluations: most genomes to evaluate, None for no limit
+        :return: best genome
+        """
+        if self.config.no_fitness_termination and evaluations is None:
+            raise RuntimeError("Cannot have no evaluation limit with no fitness termination")
+        genomes = []
+        for i in range(self.config.pop_size):
+            genome = self.config.genome_type(next(self.genome_indexer))
+            genome.configure_new(self.config.genome_config)
+            genomes.append(genome)
+
+        submitted = done = 0
+        busy = 0.0
+        pending = {}
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.config,)) as executor:
+            def submit(genome):
+                future = executor.submit(evaluate_genome, genome, self._seeds(), self.how, self.max_score)
+                pending[future] = genome
+
+            for genome in genomes[:evaluations]:
+                submit(genome)
+            submitted = len(pending)
+            self.reporters.start_generation(self.generation)
+            started = time.perf_counter()
+            while pending:
+                for future in wait(pending, return_when=FIRST_COMPLETED)[0]:
+                    genome = pending.pop(future)
+                    genome.fitness, frames, seconds = future.result()
+                    busy += seconds
+                    done += 1
+                    self._insert(genome)
+                    if self.alive_times is not None:
+                        self.alive_times(frames)
+                    if done % self.config.pop_size == 0:
+                        self._report(self.config.pop_size, busy, time.perf_counter() - started)
+                        if self._solved():
+                            self.reporters.found_solution(self.config, self.generation, self.best_genome)
+                            for future in pending:
+                                future.cancel()
+                            return self.best_genome
+                        if evaluations is None or done < evaluations:
+                            self.reporters.start_generation(self.generation)
+                        busy = 0.0
+                        started = time.perf_counter()
+                while (len(pending) < self.workers * self.queued and
+                       (evaluations is None or submitted < evaluations)):
+                    submit(self._child())
+                    submitted += 1
+        return self.best_genome
+
+    def _solved(self):
+        if self.config.no_fitness_termination:
+            return False
+        fv = self.fitness_criterion(g.fitness for g in self.population.values())
+        return fv >= self.config.fitness_threshold
@@ -0,0 +1,168 @@
+"""
+Thread pool evaluation for free-threaded (no GIL) python builds.
+
+ThreadPool plays slices of the population in threads of one process.
+The threads share the course table and the compiled networks as they
+are, nothing is copied or pickled: a thread only gives each net its own
+node value dict, the node_evals are shared. On a GIL build the threads
+would take turns, so make_pool picks ThreadPool only when the
+interpreter runs threads in parallel and flappy_shared.SharedPool's
+worker processes otherwise. Both have the same evaluate and close.
+
+    pool = make_pool(config, workers=8)
+    fitness = pool.evaluate(genomes, seeds)
+    pool.close()
+
+    python flappy_threads.py    # benchmark of the backends
+"""
+import sys
+import time
+import random
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import neat
+import flappy_sim
+import flappy_cache
+import flappy_shared
+
+
+def free_threaded():
+    """
+    :return: True when python threads of this interpreter run in parallel (bool)
+    """
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)  # python 3.13+
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+class ThreadPool:
+    """
+    threads that play slices of the population on shared courses and nets
+    """
+
+    def __init__(self, config, workers=multiprocessing.cpu_count(), chunks_per_worker=4, net_cache=None):
+        """
+        :param config: neat config
+        :param workers: number of threads (int)
+        :param chunks_per_worker: a generation is split in this many slices per thread
+        :param net_cache: flappy_cache.NetCache to compile the nets with, a new one when None
+        :return: None
+        """
+        self.config = config
+        self.workers = workers
+        self.chunks_per_worker = chunks_per_worker
+        self.net_cache = flappy_cache.NetCache() if net_cache is None else net_cache
+        self.executor = ThreadPoolExecutor(workers)
+        self.courses = None
+
+    def _play(self, nets, lo, hi, how, max_score, fitness, frames):
+        # slice lo:hi. The slice gets its own CourseTable around the shared
+        # heights, growing it does not touch the other threads, and its own
+        # nets around the shared node_evals, activate writes to net.values.
+        courses = flappy_sim.CourseTable.from_heights(self.courses.seeds, self.courses.heights)
+        nets = [neat.nn.FeedForwardNetwork(net.input_nodes, net.output_nodes, net.node_evals) for net in nets[lo:hi]]
+        fitness[lo:hi] = flappy_sim.evaluate_courses(nets, courses, how, max_score, frames[:, lo:hi])[0]
+
+    def evaluate(self, genomes, seeds, how="mean", max_score=flappy_sim.MAX_SCORE, frames=None):
+        """
+        play every genome on every course in the threads
+        :param genomes: list of (genome_id, genome)
+        :param seeds: course seeds
+        :param how: how to aggregate the courses, see flappy_sim.aggregate
+        :param max_score: stop a game once its score goes over this
+        :param frames: optional (courses, genomes) array, gets the frames every game lasted
+        :return: (genomes,) fitness array
+        """
+        nets = [self.net_cache.create(genome, self.config) for genome_id, genome in genomes]
+        seeds = [int(seed) for seed in seeds]
+        if self.courses is None or self.courses.seeds.tolist() != seeds:
+            self.courses = flappy_sim.CourseTable(seeds)
+
+        n = len(nets)
+        fitness = np.empty(n)
+        played = np.empty((len(seeds), n), dtype=np.int64)
+        size = max(1, -(-n // (self.workers * self.chunks_per_worker)))
+        futures = [self.executor.submit(self._play, nets, lo, min(lo + size, n), how, max_score, fitness, played)
+                   for lo in range(0, n, size)]
+        for future in futures:
+            future.result()
+        if frames is not None:
+            frames[...] = played
+        return fitness
+
+    def close(self):
+        """
+        stop the threads
+        :return: None
+        """
+        self.executor.shutdown()
+
+
+def make_pool(config, workers=multiprocessing.cpu_count(), net_cache=None):
+    """
+    the evaluation backend that suits this interpreter
+    :param config: neat config
+    :param workers: number of threads or processes (int)
+    :param net_cache: NetCache for the ThreadPool, the processes keep their own
+    :return: ThreadPool on a free-threaded build, flappy_shared.SharedPool otherwise
+    """
+    if free_threaded():
+        return ThreadPool(config, workers, net_cache=net_cache)
+    return flappy_shared.SharedPool(config, workers)
+
+
+def benchmark(pop_size=1000, generations=3, workers=multiprocessing.cpu_count(), mutations=10,
+              config_file="config-feedforward.txt"):
+    """
+    time one process, the ThreadPool and the SharedPool on the same
+    population and check they give the same fitness
+    :param pop_size: genomes (int)
+    :param generations: evaluations timed per backend (int)
+    :param workers: threads or processes (int)
+    :param mutations: times each genome is mutated, for bigger nets (int)
+    :param config_file: neat config
+    :return: {backend: seconds per generation}
+    """
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                         neat.DefaultStagnation, config_file)
+    genomes = []
+    for key in range(pop_size):
+        genome = neat.DefaultGenome(key)
+        genome.configure_new(config.genome_config)
+        for i in range(mutations):
+            genome.mutate(config.genome_config)
+        genomes.append((key, genome))
+    seeds = [random.randrange(2 ** 31) for i in range(5)]
+    print("{} genomes, {} courses, {} workers, free-threaded: {}".format(
+        pop_size, len(seeds), workers, free_threaded()))
+
+    net_cache = flappy_cache.NetCache(pop_size)
+    serial = lambda: flappy_sim.evaluate_courses([net_cache.create(g, config) for i, g in genomes], seeds)[0]
+    results = {}
+    expected = None
+    for name, make in (("one process", lambda: None),
+                       ("threads", lambda: ThreadPool(config, workers)),
+                       ("processes", lambda: flappy_shared.SharedPool(config, workers))):
+        start = time.perf_counter()
+        pool = make()
+        startup = time.perf_counter() - start
+        evaluate = serial if pool is None else lambda: pool.evaluate(genomes, seeds)
+        start = time.perf_counter()
+        try:
+            for i in range(generations):
+                fitness = evaluate()
+            results[name] = (time.perf_counter() - start) / generations
+        finally:
+            if pool is not None:
+                pool.close()
+        if expected is None:
+            expected = fitness
+        if not np.array_equal(fitness, expected):
+            raise RuntimeError("{} gave other fitness than one process".format(name))
+        print("{:>12}: {:7.3f} s per generation, {:8.0f} genomes/s, {:.3f} s startup".format(
+            name, results[name], pop_size / results[name], startup))
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,342 @@
+"""
+Tiled viewer: watch many headless games at once. draw_window shows one
+600x800 game; TiledViewer draws up to 64 of them as thumbnails in a grid,
+from sprites that are scaled once up front, onto one window that gets a
+single display.flip() per frame.
+
+The simulation does not wait for the viewer. A Publisher copies the
+state of the first `capacity` games of a flappy_sim.BatchGame into a
+shared memory block, at most `fps` times a second, and that is all the
+simulation pays. The viewer runs in its own process, attaches to the
+block, only ever reads it and redraws the pipes from the course seeds.
+The headless games run much faster than real time, so the viewer shows
+the latest state it finds every frame and skips the rest.
+
+    publisher = Publisher()
+    start_viewer(publisher.name)
+    flappy_sim.evaluate_courses(nets, seeds, observer=publisher.publish)
+    publisher.close()
+
+    python flappy_viewer.py          # benchmark of the viewer and publisher
+    python flappy_viewer.py <name> [columns width height fps]
+                                     # watch the games published in block <name>
+"""
+import os
+import sys
+import time
+import subprocess
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import pygame
+import flappy_sim
+
+HEADER_DTYPE = np.dtype([('seq', '<i8'), ('n', '<i8'), ('closed', '<i8')])
+GAME_DTYPE = np.dtype([('frame', '<i8'), ('y', '<f8'), ('tilt', '<i8'), ('img', '<i8'), ('score', '<i8'),
+                       ('seed', '<i8'), ('alive', '?')])
+WIN_HEIGHT = 800
+BASE_VEL = 5
+
+
+def _views(buf, capacity):
+    # header and game records of a block, they have to be gone before it is closed
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=buf)
+    games = np.ndarray(capacity, dtype=GAME_DTYPE, buffer=buf, offset=HEADER_DTYPE.itemsize)
+    return header, games
+
+
+class Publisher:
+    """
+    the simulation side: copies game state into shared memory
+    """
+
+    def __init__(self, capacity=64, fps=60):
+        """
+        :param capacity: most games that are published (int)
+        :param fps: most times a second the state is copied, 0 for every call
+        :return: None
+        """
+        self.capacity = capacity
+        self.interval = 1.0 / fps if fps else 0.0
+        self.shm = shared_memory.SharedMemory(create=True, size=HEADER_DTYPE.itemsize + capacity * GAME_DTYPE.itemsize)
+        self.name = self.shm.name
+        self.header, self.games = _views(self.shm.buf, capacity)
+        self.header[...] = (0, 0, 0)
+        self._last = 0.0
+
+    def publish(self, game):
+        """
+        copy the state of the first games, meant as the observer of
+        flappy_sim.BatchGame.run
+        :param game: flappy_sim.BatchGame
+        :return: None
+        """
+        now = time.perf_counter()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        m = min(game.n, self.capacity)
+        games = self.games
+        # seqlock: seq is odd while the records are written, a reader that
+        # sees it odd or changed tries again
+        self.header['seq'] += 1
+        games['frame'][:m] = game.frame[:m]
+        games['y'][:m] = game.y[:m]
+        games['tilt'][:m] = game.tilt[:m]
+        games['img'][:m] = game.img[:m]
+        games['score'][:m] = game.score[:m]
+        games['seed'][:m] = game.courses.seeds[game.course[:m]]
+        games['alive'][:m] = game.alive[:m]
+        self.header['n'] = m
+        self.header['seq'] += 1
+
+    def close(self):
+        """
+        tell the viewers to stop and free the block
+        :return: None
+        """
+        if self.shm is not None:
+            self.header['closed'] = 1
+            self.header = self.games = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def start_viewer(name, columns=8, size=(600, 800), fps=30):
+    """
+    open a TiledViewer on a block in a new process
+    :param name: Publisher.name
+    :return: subprocess.Popen
+    """
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), name, str(columns),
+                             str(size[0]), str(size[1]), str(fps)])
+
+
+def parse_args(args, defaults=(8, 600, 800, 30)):
+    """
+    the viewer settings start_viewer passes on the command line
+    :param args: [columns [width [height [fps]]]], those left out get their default
+    :param defaults: (columns, width, height, fps)
+    :return: (columns, (width, height), fps)
+    """
+    columns, width, height, fps = [int(arg) for arg in args[:4]] + list(defaults[len(args[:4]):])
+    return columns, (width, height), fps
+
+
+class TiledViewer:
+    """
+    draws the games it reads from a Publisher's block in a grid
+    """
+
+    def __init__(self, name, columns=8, size=(600, 800), fps=30):
+        """
+        :param name: Publisher.name
+        :param columns: tiles per row (int)
+        :param size: window (width, height)
+        :param fps: frames per second to draw at
+        :return: None
+        """
+        self.shm = shared_memory.SharedMemory(name=name)
+        capacity = (self.shm.size - HEADER_DTYPE.itemsize) // GAME_DTYPE.itemsize
+        self.header, self.games = _views(self.shm.buf, capacity)
+        self.fps = fps
+        self.columns = columns
+        rows = -(-capacity // columns)
+        self.tile = (size[0] // columns, size[1] // rows)
+        self.scale = min(self.tile[0] / flappy_sim.WIN_WIDTH, self.tile[1] / WIN_HEIGHT)
+        self.snapshot = np.zeros(0, dtype=GAME_DTYPE)
+        self.courses = {}  # seed -> CourseTable
+
+        pygame.display.init()
+        pygame.font.init()
+        self.win = pygame.display.set_mode(size)
+        pygame.display.set_caption("Flappy Bird - {} games".format(capacity))
+        self.font = pygame.font.SysFont("comicsans", max(12, round(50 * self.scale * 2)))
+        self.clock = pygame.time.Clock()
+        self._load_sprites()
+        self.background = self.win.copy()
+        self.background.fill((0, 0, 0))
+        for i in range(capacity):
+            rect = self._rect(i)
+            self.background.set_clip(rect)
+            self.background.blit(self.bg_img, rect.topleft)
+        self.background.set_clip(None)
+
+    def _load_sprites(self):
+        # everything at tile size once, so drawing never scales
+        def small(img):
+            return pygame.transform.smoothscale(img.convert_alpha(), (max(1, round(img.get_width() * self.scale)),
+                                                                      max(1, round(img.get_height() * self.scale))))
+
+        load = lambda file: pygame.image.load(os.path.join(flappy_sim.IMG_DIR, file))
+        self.bg_img = small(pygame.transform.scale(load("bg.png"), (600, 900)))
+        self.base_img = small(pygame.transform.scale2x(load("base.png")))
+        self.pipe_bottom = small(flappy_sim.pipe_img)
+        self.pipe_top = pygame.transform.flip(self.pipe_bottom, False, True)
+        self.bird_images = [small(img) for img in flappy_sim.bird_images]
+        self.dim = pygame.Surface(self.tile, pygame.SRCALPHA)
+        self.dim.fill((0, 0, 0, 120))
+        self.rotated = {}  # (img, tilt) -> (surface, offset of its topleft from the bird's topleft)
+        self.labels = {}  # score -> text surface
+
+    def _rect(self, i):
+        row, column = divmod(i, self.columns)
+        return pygame.Rect(column * self.tile[0], row * self.tile[1], self.tile[0], self.tile[1])
+
+    def _bird(self, img, tilt):
+        key = (img, tilt)
+        if key not in self.rotated:
+            # like blitRotateCenter, the rotated image keeps the center
+            image = self.bird_images[img]
+            rotated = pygame.transform.rotate(image, tilt)
+            rect = rotated.get_rect(center=image.get_rect().center)
+            self.rotated[key] = (rotated, rect.topleft)
+        return self.rotated[key]
+
+    def _label(self, score):
+        if score not in self.labels:
+            self.labels[score] = self.font.render(str(score), 1, (255, 255, 255))
+        return self.labels[score]
+
+    def read(self):
+        """
+        take a consistent copy of the published games, keep the last one
+        when the publisher is busy writing
+        :return: True while the publisher is open (bool)
+        """
+        for attempt in range(5):
+            seq = int(self.header['seq'])
+            if seq % 2:
+                continue
+            snapshot = self.games[:int(self.header['n'])].copy()
+            if int(self.header['seq']) == seq:
+                self.snapshot = snapshot
+                break
+        return not self.header['closed']
+
+    def draw(self):
+        """
+        draw every tile from the last snapshot and update the display once
+        :return: None
+        """
+        s = self.scale
+        win = self.win
+        win.blit(self.background, (0, 0))
+        seeds = set(int(seed) for seed in self.snapshot['seed'])
+        for seed in list(self.courses):
+            if seed not in seeds:
+                del self.courses[seed]
+        base_width = self.base_img.get_width()
+        pipe_width = self.pipe_bottom.get_width()
+        for i, game in enumerate(self.snapshot):
+            rect = self._rect(i)
+            win.set_clip(rect)
+            x0, y0 = rect.topleft
+            frame = int(game['frame'])
+            seed = int(game['seed'])
+            if seed not in self.courses:
+                self.courses[seed] = flappy_sim.CourseTable([seed])
+            courses = self.courses[seed]
+
+            # pipes on screen: from the last one passed to the right edge
+            k = max(int(flappy_sim.score_at(frame)) - 1, 0)
+            while True:
+                x = flappy_sim.pipe_x(k, frame)
+                if x >= flappy_sim.WIN_WIDTH:
+                    break
+                courses.ensure(k)
+                height = int(courses.heights[0, k])
+                px = x0 + round(x * s)
+                if px + pipe_width > x0:
+                    win.blit(self.pipe_top, (px, y0 + round((height - flappy_sim.PIPE_LENGTH) * s)))
+                    win.blit(self.pipe_bottom, (px, y0 + round((height + flappy_sim.PIPE_GAP) * s)))
+                k += 1
+
+            bx = x0 - round(BASE_VEL * frame * s) % base_width
+            by = y0 + round(flappy_sim.FLOOR * s)
+            while bx < rect.right:
+                win.blit(self.base_img, (bx, by))
+                bx += base_width
+
+            image, (dx, dy) = self._bird(int(game['img']), int(game['tilt']))
+            win.blit(image, (x0 + round(flappy_sim.BIRD_X * s) + dx, y0 + round(game['y'] * s) + dy))
+            label = self._label(int(game['score']))
+            win.blit(label, (rect.right - label.get_width() - 2, y0 + 1))
+            if not game['alive']:
+                win.blit(self.dim, rect.topleft)
+        win.set_clip(None)
+        pygame.display.flip()
+
+    def run(self):
+        """
+        draw at fps until the publisher closes or the window is closed
+        :return: None
+        """
+        try:
+            while self.read():
+                if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                    break
+                self.draw()
+                self.clock.tick(self.fps)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        detach from the block, it stays with the publisher
+        :return: None
+        """
+        if self.shm is not None:
+            self.header = self.games = None
+            self.shm.close()
+            self.shm = None
+            pygame.display.quit()
+
+
+def benchmark(tiles=64, frames=300, every=9):
+    """
+    time drawing the viewer with every tile in use and what publishing
+    costs a simulation of as many games
+    :param tiles: games, one per tile (int)
+    :param frames: frames timed (int)
+    :param every: the birds jump every this many frames, dead games start over
+    :return: {name: milliseconds per frame}
+    """
+    courses = flappy_sim.CourseTable(range(tiles))
+    game = flappy_sim.BatchGame(courses, range(tiles))
+
+    publisher = Publisher(tiles, fps=0)
+    viewer = TiledViewer(publisher.name)
+    results = dict.fromkeys(("simulation", "publish", "draw"), 0.0)
+    for i in range(frames):
+        start = time.perf_counter()
+        game.begin_frame()
+        game.end_frame(game.frame % every == 0)
+        if not game.alive.all():
+            game.reset(~game.alive)
+        simulated = time.perf_counter()
+        publisher.publish(game)
+        published = time.perf_counter()
+        viewer.read()
+        viewer.draw()
+        results["simulation"] += simulated - start
+        results["publish"] += published - simulated
+        results["draw"] += time.perf_counter() - published
+    viewer.close()
+    publisher.close()
+    results = dict((name, 1000 * seconds / frames) for name, seconds in results.items())
+    for name, ms in results.items():
+        print("{:>10}: {:6.3f} ms per frame".format(name, ms))
+    print("{} tiles: the viewer could draw {:.0f} fps".format(tiles, 1000 / results["draw"]))
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        columns, size, fps = parse_args(sys.argv[2:])
+        viewer = TiledViewer(sys.argv[1], columns, size, fps)
+        # the block belongs to the publisher, this process must not free it
+        resource_tracker.unregister(viewer.shm._name, "shared_memory")
+        viewer.run()
+    else:
+        benchmark()
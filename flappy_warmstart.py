@@ -0,0 +1,272 @@
+"""
+Warm start: seed the first generation with genomes fitted to recorded
+play instead of only random ones. A random population needs a few
+generations before a bird gets past the first pipe; a genome that
+already jumps when the demonstrations jumped starts there.
+
+The demonstrations are flappy_dataset recordings, of a human playing
+the manual game (RECORD in "flappybird BASIS file.py") or of a stored
+champion (record_champion). fit() does a logistic regression of the
+jumps on the three inputs and turns it into the weights of the direct
+input -> output connections and the output bias, so the net jumps where
+the regression says a jump is more likely than not, then tunes the bias
+by playing the recorded courses. seed_population()
+puts that genome and noisy copies of it in place of part of a
+neat.Population, the rest stays random for diversity.
+
+    population = neat.Population(config)
+    obs, jumps, seeds = demonstrations("dataset")
+    weights, bias = fit(obs, jumps, seeds, config)
+    seed_population(population, weights, bias)
+    population.run(eval_genomes, 21)
+
+    python flappy_warmstart.py    # warm against cold start
+"""
+import time
+import random
+import shutil
+import tempfile
+import numpy as np
+import neat
+import flappy_sim
+import flappy_dataset
+
+
+def demonstrations(path, min_score=1):
+    """
+    the decisions of the recorded games that went well enough
+    :param path: directory of a flappy_dataset recording
+    :param min_score: only games that passed this many pipes; all games
+                      when none did
+    :return: ((n, 3) inputs, (n,) bool jumps, list of the seeds of the
+             recorded courses, empty when they were not seeded)
+    """
+    frames = flappy_dataset.load(path)
+    episodes = flappy_dataset.load(path, "episodes")
+    good = episodes['score'] >= min_score
+    if good.any():
+        frames = frames[np.isin(frames['episode'], episodes['episode'][good])]
+        episodes = episodes[good]
+    return frames['obs'], frames['jump'], sorted(set(int(seed) for seed in episodes['seed'] if seed >= 0))
+
+
+def _threshold(activation):
+    # input at which a rising activation function gives 0.5
+    lo, hi = -60.0, 60.0
+    for i in range(100):
+        mid = (lo + hi) / 2
+        if activation(mid) > 0.5:
+            hi = mid
+        else:
+            lo = mid
+    return (lo + hi) / 2
+
+
+def fit(obs, jumps, seeds, config, iterations=50, l2=1e-3, offsets=np.linspace(-3, 3, 61)):
+    """
+    weights that make a net without hidden nodes jump like the
+    demonstrations: a logistic regression on standardized inputs, fitted
+    with Newton steps, moved to the scale of the raw inputs and shifted
+    so the output node's activation crosses 0.5 where the odds of a jump
+    are even.
+
+    A bird that copies 99% of the decisions still crashes on the other
+    1%, mostly by jumping a frame early or late, so when there are
+    seeds the bias is then moved by the offset that plays best on
+    those courses, all offsets in one batched simulation.
+    :param obs: (n, 3) inputs
+    :param jumps: (n,) bool
+    :param seeds: courses to calibrate the bias on, e.g. those of the
+                  demonstrations; empty to keep the regression's bias
+    :param config: neat config, for the output activation and the weight bounds
+    :param iterations: Newton steps (int)
+    :param l2: ridge penalty on the weights, keeps them finite when the jumps separate perfectly
+    :param offsets: bias offsets to try
+    :return: (weight per input, output bias)
+    """
+    obs = np.asarray(obs, dtype=float)
+    y = np.asarray(jumps, dtype=float)
+    if not len(y):
+        raise ValueError("no demonstrations to fit")
+    mean, std = obs.mean(axis=0), obs.std(axis=0)
+    std[std == 0] = 1.0
+    x = np.column_stack([(obs - mean) / std, np.ones(len(obs))])
+    beta = np.zeros(x.shape[1])
+    penalty = l2 * len(y) * np.diag([1.0] * (x.shape[1] - 1) + [0.0])
+    for i in range(iterations):
+        p = 1 / (1 + np.exp(-np.clip(x @ beta, -30, 30)))
+        gradient = x.T @ (p - y) + penalty @ beta
+        hessian = (x * (p * (1 - p))[:, None]).T @ x + penalty + 1e-9 * np.eye(len(beta))
+        step = np.linalg.solve(hessian, gradient)
+        beta -= step
+        if np.abs(step).max() < 1e-10:
+            break
+
+    # the regression says jump where the log odds x @ beta are over 0, the
+    # net where bias + response * (weights @ obs) is over the input at which
+    # the output activation gives 0.5
+    gc = config.genome_config
+    response = gc.response_init_mean or 1.0
+    weights = beta[:-1] / std / response
+    bias = beta[-1] - (beta[:-1] * mean / std).sum() + _threshold(gc.activation_defs.get(gc.activation_default))
+    weights = np.clip(weights, gc.weight_min_value, gc.weight_max_value)
+    bias = float(np.clip(bias, gc.bias_min_value, gc.bias_max_value))
+    if len(seeds):
+        # the smallest offset of those that play best
+        offsets = sorted(offsets, key=abs)
+        nets = [neat.nn.FeedForwardNetwork.create(demo_genome(i, config, weights, bias + offset), config)
+                for i, offset in enumerate(offsets)]
+        fitness = flappy_sim.evaluate_courses(nets, list(seeds))[0]
+        bias = float(np.clip(bias + offsets[int(np.argmax(fitness))], gc.bias_min_value, gc.bias_max_value))
+    return weights, bias
+
+
+def demo_genome(key, config, weights, bias, noise=0.0):
+    """
+    a new genome whose output only listens to the inputs, with the fitted
+    weights; connections from hidden nodes into the output get weight 0
+    :param key: genome id
+    :param config: neat config
+    :param weights: weight per input, from fit()
+    :param bias: output bias, from fit()
+    :param noise: times weight_mutate_power / bias_mutate_power of gaussian
+                  noise on the weights and bias, 0 for the fit as it is
+    :return: genome of config.genome_type
+    """
+    gc = config.genome_config
+    genome = neat.DefaultGenome(key)
+    genome.configure_new(gc)
+    output = gc.output_keys[0]
+    for conn in genome.connections.values():
+        if conn.key[1] == output:
+            conn.weight = 0.0
+    for i, weight in zip(gc.input_keys, weights):
+        if (i, output) not in genome.connections:
+            genome.connections[(i, output)] = genome.create_connection(gc, i, output)
+        conn = genome.connections[(i, output)]
+        conn.weight = float(np.clip(weight + random.gauss(0, noise * gc.weight_mutate_power),
+                                    gc.weight_min_value, gc.weight_max_value))
+        conn.enabled = True
+    genome.nodes[output].bias = float(np.clip(bias + random.gauss(0, noise * gc.bias_mutate_power),
+                                              gc.bias_min_value, gc.bias_max_value))
+    genome.nodes[output].response = gc.response_init_mean or 1.0
+    if config.genome_type is not neat.DefaultGenome:
+        return config.genome_type.from_genome(genome)
+    return genome
+
+
+def seed_population(population, weights, bias, share=0.5, noise=1.0):
+    """
+    replace part of a population that has not run yet with the fitted
+    genome and noisy copies of it, then speciate again
+    :param population: neat.Population
+    :param weights: weight per input, from fit()
+    :param bias: output bias, from fit()
+    :param share: part of the population to replace (0..1)
+    :param noise: see demo_genome, the first seeded genome gets none
+    :return: list of the seeded genomes
+    """
+    config = population.config
+    keys = sorted(population.population)[:max(1, int(round(share * len(population.population))))]
+    seeded = []
+    for i, key in enumerate(keys):
+        genome = demo_genome(key, config, weights, bias, noise if i else 0.0)
+        population.population[key] = genome
+        seeded.append(genome)
+    population.species.speciate(config, population.population, population.generation)
+    return seeded
+
+
+def record_champion(genome, config, path, seeds=range(1000000, 1000020)):
+    """
+    record a genome playing courses, as demonstrations
+    :param genome: e.g. the winner of an earlier run
+    :param config: neat config
+    :param path: directory for the flappy_dataset recording
+    :param seeds: courses to play
+    :return: (courses,) fitness of the genome
+    """
+    recorder = flappy_dataset.Recorder(path)
+    net = neat.nn.FeedForwardNetwork.create(genome, config)
+    try:
+        return flappy_sim.evaluate_courses([net], list(seeds), observer=recorder.observe)[1][:, 0]
+    finally:
+        recorder.close()
+
+
+def _evolve(config, generations, courses, seed, warm=None):
+    # generations until the best genome passes a pipe and until it reaches
+    # fitness_threshold, and the seconds that took
+    random.seed(seed)
+    start = time.perf_counter()
+    population = neat.Population(config)
+    if warm is not None:
+        seed_population(population, *warm)
+    first_pipe = [None]
+    first_pass = flappy_sim.FIRST_PASS_FRAME * flappy_sim.FRAME_REWARD + flappy_sim.PIPE_REWARD
+
+    def eval_genomes(genomes, config):
+        seeds = [(seed * 1000 + population.generation) * courses + i for i in range(courses)]
+        nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome_id, genome in genomes]
+        for (genome_id, genome), f in zip(genomes, flappy_sim.evaluate_courses(nets, seeds)[0]):
+            genome.fitness = float(f)
+        if first_pipe[0] is None and max(g.fitness for i, g in genomes) >= first_pass:
+            first_pipe[0] = population.generation
+
+    best = population.run(eval_genomes, generations)
+    solved = best.fitness >= config.fitness_threshold
+    return (first_pipe[0], population.generation if solved else None, time.perf_counter() - start, best)
+
+
+def benchmark(trials=10, generations=60, target=300.0, courses=5, config_file="config-feedforward.txt"):
+    """
+    generations and seconds until the first pipe and until a genome is
+    fit enough, for a cold start against a warm start from a champion:
+    a cold run is evolved until it solves the courses, its winner plays
+    20 other courses as the demonstrations, then every trial runs a cold
+    and a warm start with the same random seed on courses neither saw
+    :param trials: int
+    :param generations: give up after this many generations (int)
+    :param target: fitness that counts as solved; a bird that reaches
+                   MAX_SCORE on every course gets about 327
+    :param courses: courses every genome plays per generation (int)
+    :param config_file: neat config
+    :return: {mode: list of (first pipe generation, solved generation, seconds)}
+    """
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                         neat.DefaultStagnation, config_file)
+    config.fitness_threshold = target
+    path = tempfile.mkdtemp()
+    try:
+        for seed in range(1000, 1100):
+            champion = _evolve(config, generations, courses, seed)[3]
+            if champion.fitness >= target:
+                break
+        start = time.perf_counter()
+        print("champion fitness {:.1f}, plays {} on the demonstration courses".format(
+            champion.fitness, np.round(record_champion(champion, config, path), 1)))
+        obs, jumps, seeds = demonstrations(path)
+        warm = fit(obs, jumps, seeds, config)
+        print("fitted weights {}, bias {:.3f} in {:.2f} s".format(np.round(warm[0], 4), warm[1],
+                                                                   time.perf_counter() - start))
+    finally:
+        shutil.rmtree(path)
+
+    out = {"cold": [], "warm": []}
+    for trial in range(trials):
+        for mode in out:
+            first_pipe, solved, seconds, best = _evolve(config, generations, courses, trial,
+                                                        warm if mode == "warm" else None)
+            out[mode].append((first_pipe, solved, seconds))
+            print("trial {} {}: first pipe in generation {}, solved in generation {}, {:.1f} s".format(
+                trial, mode, first_pipe, solved, seconds))
+    for mode, runs in out.items():
+        solved = [r[1] for r in runs if r[1] is not None]
+        print("{}: first pipe after {:.1f} generations, solved {} of {} after {:.1f} generations, {:.1f} s".format(
+            mode, np.mean([r[0] if r[0] is not None else generations for r in runs]), len(solved), trials,
+            np.mean(solved) if solved else float("nan"), np.mean([r[2] for r in runs])))
+    return out
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -9,12 +9,22 @@ import pygame
 import random
 import os
 import time
+import flappy_sim
+import flappy_dataset
 pygame.font.init()  # init font
 
 WIN_WIDTH = 600
 WIN_HEIGHT = 800
 PIPE_VEL = 3
 FLOOR = 730
+TICK = 1 / 30  # seconds of game time per physics step, the speed the game was made for
+MAX_FPS = 120  # render frames per second at most
+MAX_LAG = 0.25  # seconds of game time to catch up on at most after a stall
+MENU, PLAYING, GAME_OVER = "menu", "playing", "game over"  # states of the game loop
+# record every tick you play (the inputs a net would get and whether you
+# jumped) for flappy_warmstart, e.g. "human". Recorded games are played on
+# seeded flappy_sim courses, with the rules the networks are trained on
+RECORD = None
 STAT_FONT = pygame.font.SysFont("comicsans", 50)
 END_FONT = pygame.font.SysFont("comicsans", 70)
 
@@ -44,15 +54,26 @@ class Bird:
         :param y: starting y pos (int)
         :return: None
         """
+        self.gravity = 9.8
+        self.reset(x, y)
+
+    def reset(self, x, y):
+        """
+        put the bird back at the start of a game
+        :param x: starting x pos (int)
+        :param y: starting y pos (int)
+        :return: None
+        """
         self.x = x
         self.y = y
-        self.gravity = 9.8
         self.tilt = 0  # degrees to tilt
         self.tick_count = 0
         self.vel = 0
         self.height = self.y
         self.img_count = 0
         self.img = self.IMGS[0]
+        self.prev_y = self.y
+        self.prev_tilt = self.tilt
 
     def jump(self):
         """
@@ -89,10 +110,17 @@ class Bird:
             if self.tilt > -90:
                 self.tilt -= self.ROT_VEL
 
-    def draw(self, win):
+    def remember(self):
         """
-        draw the bird
-        :param win: pygame window or surface
+        keep the position at the start of a physics tick to draw between
+        :return: None
+        """
+        self.prev_y = self.y
+        self.prev_tilt = self.tilt
+
+    def animate(self):
+        """
+        pick the image of the wing flap, once every physics tick
         :return: None
         """
         self.img_count += 1
@@ -115,9 +143,18 @@ class Bird:
             self.img = self.IMGS[1]
             self.img_count = self.ANIMATION_TIME*2
 
+    def draw(self, win, alpha=1.0):
+        """
+        draw the bird
+        :param win: pygame window or surface
+        :param alpha: how far the clock is between the last two physics ticks (0 to 1)
+        :return: None
+        """
+        y = interpolate(self.prev_y, self.y, alpha)
+        tilt = interpolate(self.prev_tilt, self.tilt, alpha)
 
         # tilt the bird
-        blitRotateCenter(win, self.img, (self.x, self.y), self.tilt)
+        blitRotateCenter(win, self.img, (self.x, y), tilt)
 
     def get_mask(self):
         """
@@ -136,36 +173,49 @@ class Pipe():
     GAP = 200
     VEL = 5
 
-    def __init__(self, x):
+    def __init__(self, x, height=None, gap=GAP):
         """
         initialize pipe object
         :param x: int
-        :param y: int
+        :param height: see reset
+        :param gap: see reset
         :return" None
         """
+        self.PIPE_TOP = pygame.transform.flip(pipe_img, False, True)
+        self.PIPE_BOTTOM = pipe_img
+
+        self.reset(x, height, gap)
+
+    def reset(self, x, height=None, gap=GAP):
+        """
+        make the pipe a new one at x, with a new height
+        :param x: int
+        :param height: height of the gap's top (int), None for a random one
+        :param gap: gap between top and bottom pipe (int)
+        :return: None
+        """
         self.x = x
         self.height = 0
-        self.gap = 100  # gap between top and bottom pipe
+        self.gap = gap
 
         # where the top and bottom of the pipe is
         self.top = 0
         self.bottom = 0
 
-        self.PIPE_TOP = pygame.transform.flip(pipe_img, False, True)
-        self.PIPE_BOTTOM = pipe_img
-
         self.passed = False
+        self.prev_x = self.x
 
-        self.set_height()
+        self.set_height(height)
 
-    def set_height(self):
+    def set_height(self, height=None):
         """
         set the height of the pipe, from the top of the screen
+        :param height: int, None for a random one
         :return: None
         """
-        self.height = random.randrange(50, 450)
+        self.height = random.randrange(50, 450) if height is None else height
         self.top = self.height - self.PIPE_TOP.get_height()
-        self.bottom = self.height + self.GAP
+        self.bottom = self.height + self.gap
 
     def move(self):
         """
@@ -174,16 +224,25 @@ class Pipe():
         """
         self.x -= self.VEL
 
-    def draw(self, win):
+    def remember(self):
+        """
+        keep the position at the start of a physics tick to draw between
+        :return: None
+        """
+        self.prev_x = self.x
+
+    def draw(self, win, alpha=1.0):
         """
         draw both the top and bottom of the pipe
         :param win: pygame window/surface
+        :param alpha: how far the clock is between the last two physics ticks (0 to 1)
         :return: None
         """
+        x = interpolate(self.prev_x, self.x, alpha)
         # draw top
-        win.blit(self.PIPE_TOP, (self.x, self.top))
+        win.blit(self.PIPE_TOP, (x, self.top))
         # draw bottom
-        win.blit(self.PIPE_BOTTOM, (self.x, self.bottom))
+        win.blit(self.PIPE_BOTTOM, (x, self.bottom))
 
 
     def collide(self, bird, win):
@@ -221,9 +280,19 @@ class Base:
         :param y: int
         :return: None
         """
+        self.reset(y)
+
+    def reset(self, y):
+        """
+        put the floor back at the start of a game
+        :param y: int
+        :return: None
+        """
         self.y = y
         self.x1 = 0
         self.x2 = self.WIDTH
+        self.prev_x1 = self.x1
+        self.prev_x2 = self.x2
 
     def move(self):
         """
@@ -238,15 +307,36 @@ class Base:
         if self.x2 + self.WIDTH < 0:
             self.x2 = self.x1 + self.WIDTH
 
-    def draw(self, win):
+    def remember(self):
+        """
+        keep the position at the start of a physics tick to draw between
+        :return: None
+        """
+        self.prev_x1 = self.x1
+        self.prev_x2 = self.x2
+
+    def draw(self, win, alpha=1.0):
         """
         Draw the floor. This is two images that move together.
         :param win: the pygame surface/window
+        :param alpha: how far the clock is between the last two physics ticks (0 to 1)
         :return: None
         """
-        win.blit(self.IMG, (self.x1, self.y))
-        win.blit(self.IMG, (self.x2, self.y))
+        for prev_x, x in ((self.prev_x1, self.x1), (self.prev_x2, self.x2)):
+            if abs(x - prev_x) <= self.VEL:  # not when it just wrapped around
+                x = interpolate(prev_x, x, alpha)
+            win.blit(self.IMG, (x, self.y))
+
 
+def interpolate(previous, current, alpha):
+    """
+    a value between its last two physics ticks
+    :param previous: value at the tick before (float)
+    :param current: value at the last tick (float)
+    :param alpha: how far the clock is between the two ticks (0 to 1)
+    :return: float
+    """
+    return previous + (current - previous) * alpha
 
 def blitRotateCenter(surf, image, topleft, angle):
     """
@@ -262,128 +352,394 @@ def blitRotateCenter(surf, image, topleft, angle):
 
     surf.blit(rotated_image, new_rect.topleft)
 
-def menu_screen(win):
+class Game:
     """
-    the menu screen that will start the game
-    :param win: the pygame window surface
-    :return: None
+    the bird, pipes and floor of a game, reused for every next game so
+    restarting doesn't make new objects.
+
+    A game with a seed is played on that flappy_sim course, by the rules
+    the networks are trained on: the course's pipe heights, flappy_sim's
+    gap, death above the ceiling, and the jump decided after the bird
+    moved, as eval_genomes does. Its ticks are the frames of a BatchGame
+    on the same course, so recordings of it can be replayed there.
     """
-    pass
 
-def end_screen(win):
-    """
-    display an end screen when the player loses
-    :param win: the pygame window surface
-    :return: None
-    """
-    run = True
-    text_label = END_FONT.render("Press Space to Restart", 1, (255,255,255))
-    while run:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
+    def __init__(self, seed=None):
+        """
+        :param seed: flappy_sim course seed (int), None for a random course
+        :return: None
+        """
+        self.bird = Bird(230,350)
+        self.base = Base(FLOOR)
+        self.pipes = []
+        self.free_pipes = []  # pipes that went off the screen, to reuse
+        self.courses = None
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """
+        start a new game with the same objects
+        :param seed: flappy_sim course seed (int), None for a random course
+        :return: None
+        """
+        self.seed = seed
+        if seed is not None:
+            if self.courses is None:
+                self.courses = flappy_sim.CourseTable([seed])
+            else:
+                self.courses.reseed(0, seed)
+        self.gap = Pipe.GAP if seed is None else flappy_sim.PIPE_GAP
+        self.pipe_count = 0
+        self.bird.reset(230,350)
+        self.base.reset(FLOOR)
+        self.free_pipes.extend(self.pipes)
+        self.pipes = []
+        self.add_pipe(700)
+        self.score = 0
+        self.lost = False
+        self.inputs = self.observe()
+
+    def add_pipe(self, x):
+        """
+        put a pipe at x, a reused one if there is one
+        :param x: int
+        :return: None
+        """
+        height = None
+        if self.seed is not None:
+            self.courses.ensure(self.pipe_count)
+            height = int(self.courses.heights[0, self.pipe_count])
+        self.pipe_count += 1
+        if self.free_pipes:
+            pipe = self.free_pipes.pop()
+            pipe.reset(x, height, self.gap)
+        else:
+            pipe = Pipe(x, height, self.gap)
+        self.pipes.append(pipe)
+
+    def observe(self):
+        """
+        the three inputs eval_genomes feeds a net
+        :return: (bird y, distance to the top pipe, distance to the bottom pipe)
+        """
+        bird = self.bird
+        pipe = self.pipes[0]
+        if len(self.pipes) > 1 and bird.x > pipe.x + pipe.PIPE_TOP.get_width():
+            pipe = self.pipes[1]
+        return (bird.y, abs(bird.y - pipe.height), abs(bird.y - pipe.bottom))
 
-            if event.type == pygame.KEYDOWN:
-                main(win)
+    def tick(self, start, jump=False):
+        """
+        one physics tick of the game
+        :param start: if the game has started (the first jump happened)
+        :param jump: if the bird jumps this tick
+        :return: False once the bird hit the floor (or, on a flappy_sim
+                 course, went over the ceiling), True otherwise
+        """
+        bird = self.bird
+        bird.remember()
+        self.base.remember()
+        for pipe in self.pipes:
+            pipe.remember()
 
-        win.blit(text_label, (WIN_WIDTH/2 - text_label.get_width()/2, 500))
-        pygame.display.update()
+        # Move Bird, base and pipes
+        if jump and self.seed is None:
+            bird.jump()
+        if start:
+            bird.move()
+        self.inputs = self.observe()  # what a net would decide the jump on
+        if jump and self.seed is not None:
+            bird.jump()
+        if not self.lost:
+            self.base.move()
 
-    pygame.quit()
-    quit()
+            if start:
+                rem = []
+                add_pipe = False
+                for pipe in self.pipes:
+                    pipe.move()
+                    # check for collision
+                    if pipe.collide(bird, None):
+                        self.lost = True
+
+                    if pipe.x + pipe.PIPE_TOP.get_width() < 0:
+                        rem.append(pipe)
 
-def draw_window(win, bird, pipes, base, score):
+                    if not pipe.passed and pipe.x < bird.x:
+                        pipe.passed = True
+                        add_pipe = True
+
+                if add_pipe:
+                    # a bird that crashed into the pipe did not pass it
+                    if not self.lost:
+                        self.score += 1
+                    self.add_pipe(WIN_WIDTH)
+
+                for r in rem:
+                    self.pipes.remove(r)
+                    self.free_pipes.append(r)
+        if start or self.seed is None:
+            # a BatchGame's bird starts flapping with the game
+            bird.animate()
+
+        if self.seed is not None and bird.y < -50:
+            return False
+        return bird.y + bird_images[0].get_height() - 10 < FLOOR
+
+def draw_window(win, bird, pipes, base, score, alpha=1.0, label=None):
     """
     draws the windows for the main game loop
     :param win: pygame window surface
     :param bird: a Bird object
     :param pipes: List of pipes
     :param score: score of the game (int)
+    :param alpha: how far the clock is between the last two physics ticks (0 to 1)
+    :param label: rendered text to show in the middle of the screen, or None
     :return: None
     """
     win.blit(bg_img, (0,0))
 
     for pipe in pipes:
-        pipe.draw(win)
+        pipe.draw(win, alpha)
 
-    base.draw(win)
-    bird.draw(win)
+    base.draw(win, alpha)
+    bird.draw(win, alpha)
 
     # score
     score_label = STAT_FONT.render("Score: " + str(score),1,(255,255,255))
     win.blit(score_label, (WIN_WIDTH - score_label.get_width() - 15, 10))
 
+    if label is not None:
+        win.blit(label, (WIN_WIDTH/2 - label.get_width()/2, 500))
+
     pygame.display.update()
 
 
+class Timings:
+    """
+    durations counted in fixed bins, so the percentiles of a whole game
+    take the same memory however long it lasts
+    """
+
+    def __init__(self, resolution=0.0001, longest=1.0):
+        """
+        :param resolution: seconds per bin (float)
+        :param longest: durations from this many seconds on share the last bin
+        :return: None
+        """
+        self.resolution = resolution
+        self.counts = [0] * (int(round(longest / resolution)) + 1)
+        self.clear()
+
+    def clear(self):
+        """
+        forget every duration
+        :return: None
+        """
+        self.counts[:] = [0] * len(self.counts)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """
+        :param seconds: float
+        :return: None
+        """
+        self.counts[min(int(seconds / self.resolution), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """
+        nearest rank percentile, to the resolution
+        :param p: percentile (0 to 100)
+        :return: upper end of the bin it falls in, at most the longest duration (float)
+        """
+        rank = min(self.count - 1, int(self.count * p / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen > rank:
+                # the last bin has no upper end
+                return self.max if i == len(self.counts) - 1 else min((i + 1) * self.resolution, self.max)
+        return self.max
+
+def timing_report(frame_times, latencies):
+    """
+    print the frame time and input to photon latency percentiles of a game
+    :param frame_times: seconds between the starts of rendered frames (Timings)
+    :param latencies: seconds from reading a space press to the frame showing
+                      its jump being on screen (Timings)
+    :return: None
+    """
+    for name, samples in (("frame time", frame_times), ("input to photon", latencies)):
+        if not samples.count:
+            continue
+        print("{:>15}: p50 {:5.1f} ms  p90 {:5.1f} ms  p99 {:5.1f} ms  max {:5.1f} ms  ({} samples)".format(
+            name, samples.percentile(50) * 1000, samples.percentile(90) * 1000,
+            samples.percentile(99) * 1000, samples.max * 1000, samples.count))
+
+
+class GameLoop:
+    """
+    The menu, playing and game over states and the fixed timestep of
+    main, without the window. The physics runs in fixed ticks of TICK
+    seconds, as many as the clock has moved on since the last frame, and
+    frames are drawn in between as fast as MAX_FPS allows, interpolating
+    between the last two ticks. It only goes by the times it is given,
+    so it runs the same headless.
+    """
+
+    def __init__(self, now, recorder=None, seeds=None):
+        """
+        :param now: time the loop starts (seconds)
+        :param recorder: flappy_dataset.Recorder for every tick played, or None
+        :param seeds: iterator of flappy_sim course seeds to play the games
+                      on, one per game, or None for random courses
+        :return: None
+        """
+        self.seeds = seeds
+        self.game = Game(self.next_seed())
+        self.recorder = recorder
+        self.state = MENU
+        self.lag = 0.0  # seconds the physics is behind the clock
+        self.last = now  # time of the last frame
+        self.jumps = []  # times space presses were read, for the next tick
+        self.shown = []  # times of presses the last ticks applied, for the next frame
+        self.frame_times = Timings()
+        self.latencies = Timings()
+        self.steps = 0  # physics ticks run
+        self.episode = None  # recorder episode of the game being played
+        self.ticks = 0  # ticks of that episode
+
+    def next_seed(self):
+        """
+        :return: course seed of the next game, None for a random course
+        """
+        return None if self.seeds is None else next(self.seeds)
+
+    def begin_frame(self, now):
+        """
+        a frame starts, the clock moved on to now
+        :param now: seconds
+        :return: None
+        """
+        if self.state == PLAYING:
+            self.frame_times.add(now - self.last)
+        self.lag = min(self.lag + now - self.last, MAX_LAG)
+        self.last = now
+
+    def key(self, key, now):
+        """
+        a key was pressed: any key restarts after a game over, space jumps
+        on the next tick
+        :param key: pygame key code
+        :param now: time the press was read (seconds)
+        :return: None
+        """
+        if self.state == GAME_OVER:
+            self.game.reset(self.next_seed())
+            self.state = MENU
+            self.lag = 0.0
+            self.frame_times.clear()
+            self.latencies.clear()
+        elif key == pygame.K_SPACE and not self.game.lost:
+            self.jumps.append(now)
+
+    def update(self):
+        """
+        run the physics ticks the clock is ahead by, none after a game over
+        :return: None
+        """
+        game = self.game
+        while self.state != GAME_OVER and self.lag >= TICK:
+            self.lag -= TICK
+            self.steps += 1
+            jumped = bool(self.jumps) and not game.lost
+            if jumped:
+                self.state = PLAYING
+                self.shown += self.jumps
+            self.jumps = []
+            recorder = self.recorder
+            recording = recorder is not None and self.state == PLAYING and not game.lost
+
+            alive = game.tick(self.state == PLAYING, jumped)
+            if recording:
+                if self.episode is None:
+                    self.episode = recorder.new_episodes(1)[0]
+                    self.ticks = 0
+                self.ticks += 1
+                recorder.decision(self.episode, self.ticks, game.inputs, jumped)
+
+            if not alive:
+                self.state = GAME_OVER
+                timing_report(self.frame_times, self.latencies)
+                if self.episode is not None:
+                    if game.lost:
+                        death = flappy_sim.DEATH_PIPE
+                    elif game.bird.y < -50:
+                        death = flappy_sim.DEATH_CEILING
+                    else:
+                        death = flappy_sim.DEATH_FLOOR
+                    fitness = (self.ticks * flappy_sim.FRAME_REWARD + game.score * flappy_sim.PIPE_REWARD +
+                               (flappy_sim.COLLIDE_PENALTY if game.lost else 0))
+                    seed = -1 if game.seed is None else game.seed
+                    recorder.outcomes([self.episode], -1, seed, self.ticks, game.score, death, fitness)
+                    self.episode = None
+
+    def presented(self, now):
+        """
+        the frame is on the screen
+        :param now: seconds
+        :return: None
+        """
+        for t in self.shown:
+            self.latencies.add(now - t)
+        self.shown = []
+
+
 def main(win):
     """
-    Runs the main game loop
+    Runs the game loop: the menu, playing and the game over screen, game
+    after game for as long as the window is open
     :param win: pygame window surface
     :return: None
     """
-    bird = Bird(230,350)
-    base = Base(FLOOR)
-    pipes = [Pipe(700)]
-    score = 0
+    menu_label = END_FONT.render("Press Space to Start", 1, (255,255,255))
+    end_label = END_FONT.render("Press Space to Restart", 1, (255,255,255))
 
     clock = pygame.time.Clock()
-    start = False
-    lost = False
+    recorder = flappy_dataset.Recorder(RECORD) if RECORD is not None else None
+    # recorded games are played on flappy_sim courses, so they can be replayed there
+    seeds = iter(lambda: random.randrange(1 << 31), None) if RECORD is not None else None
+    loop = GameLoop(time.perf_counter(), recorder, seeds)
+    game = loop.game
 
-    run = True
-    while run:
-        pygame.time.delay(30)
-        clock.tick(60)
+    while True:
+        loop.begin_frame(time.perf_counter())
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                run = False
+                if recorder is not None:
+                    recorder.close()
                 pygame.quit()
                 quit()
-                break
-
-            if event.type == pygame.KEYDOWN and not lost:
-                if event.key == pygame.K_SPACE:
-                    if not start:
-                        start = True
-                    bird.jump()
 
-        # Move Bird, base and pipes
-        if start:
-            bird.move()
-        if not lost:
-            base.move()
-
-            if start:
-                rem = []
-                add_pipe = False
-                for pipe in pipes:
-                    pipe.move()
-                    # check for collision
-                    if pipe.collide(bird, win):
-                        lost = True
-
-                    if pipe.x + pipe.PIPE_TOP.get_width() < 0:
-                        rem.append(pipe)
-
-                    if not pipe.passed and pipe.x < bird.x:
-                        pipe.passed = True
-                        add_pipe = True
-
-                if add_pipe:
-                    score += 1
-                    pipes.append(Pipe(WIN_WIDTH))
-
-                for r in rem:
-                    pipes.remove(r)
+            if event.type == pygame.KEYDOWN:
+                loop.key(event.key, time.perf_counter())
 
+        if loop.state == GAME_OVER:
+            clock.tick(MAX_FPS)
+            continue
 
-        if bird.y + bird_images[0].get_height() - 10 >= FLOOR:
-            break
+        loop.update()
+        label = menu_label if loop.state == MENU else end_label if loop.state == GAME_OVER else None
+        draw_window(win, game.bird, game.pipes, game.base, game.score, loop.lag / TICK, label)
+        # display.update has returned, the frame is handed to the screen
+        loop.presented(time.perf_counter())
 
-        draw_window(WIN, bird, pipes, base, score)
+        clock.tick(MAX_FPS)
 
-    end_screen(WIN)
 
-main(WIN)
\ No newline at end of file
+if __name__ == '__main__':
+    main(WIN)
@@ -0,0 +1,101 @@
+import os
+import sys
+import random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import neat
+import pytest
+
+CONFIG_FILE = os.path.join(ROOT, "config-feedforward.txt")
+
+
+def grown_genomes(genome_type, n, mutations):
+    # a config for genome_type and random genomes mutated a few times
+    random.seed(1)
+    config = neat.Config(genome_type, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                         neat.DefaultStagnation, CONFIG_FILE)
+    genomes = []
+    for key in range(n):
+        genome = genome_type(key)
+        genome.configure_new(config.genome_config)
+        for i in range(mutations):
+            genome.mutate(config.genome_config)
+        genomes.append((key, genome))
+    return config, genomes
+
+
+@pytest.fixture
+def config():
+    # a fresh config per test, tests change it
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                       neat.DefaultStagnation, CONFIG_FILE)
+
+
+class _Clock:
+    # the game at full speed
+    def tick(self, *args):
+        return 0
+
+
+def _animate(win, birds, *args):
+    # draw_window without drawing; the birds still pick their images,
+    # which their collision masks depend on
+    for bird in birds:
+        bird.animate()
+
+
+@pytest.fixture(scope="session")
+def end_version(tmp_path_factory):
+    """
+    flappy_bird_END_VERSION loaded without drawing or waiting; it believes
+    it lives in a temporary directory, so best_*.pickle files of the
+    checkout are not used and new ones do not land there
+    """
+    import importlib
+    import types
+    import pygame
+    cwd = os.getcwd()
+    os.chdir(ROOT)  # it loads imgs/ on import
+    try:
+        module = importlib.import_module("flappy_bird_END_VERSION")
+    finally:
+        os.chdir(cwd)
+    module.__file__ = str(tmp_path_factory.mktemp("end_version") / "flappy_bird_END_VERSION.py")
+    module.pygame = types.SimpleNamespace(**dict((k, getattr(pygame, k)) for k in dir(pygame)
+                                                 if not k.startswith("__")))
+    module.pygame.time = types.SimpleNamespace(Clock=_Clock, delay=lambda *args: None)
+    module.drawn_window = module.draw_window  # for tests that do draw
+    module.draw_window = _animate
+    return module
+
+
+@pytest.fixture(scope="session")
+def basis():
+    """
+    "flappybird BASIS file.py", the manual game, loaded without running it
+    """
+    import importlib.util
+    cwd = os.getcwd()
+    os.chdir(ROOT)  # it loads imgs/ on import
+    try:
+        spec = importlib.util.spec_from_file_location("flappybird_basis", os.path.join(ROOT, "flappybird BASIS file.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
+
+
+@pytest.fixture
+def champion(config):
+    """
+    a genome without hidden nodes that jumps when it is nearer the bottom
+    pipe than the top one; it reaches MAX_SCORE on every course
+    """
+    import flappy_warmstart
+    return flappy_warmstart.demo_genome(1, config, [0.0, 0.01, -0.01], -0.1)
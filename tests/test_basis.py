@@ -0,0 +1,141 @@
+import random
+import numpy as np
+import pygame
+import pytest
+import flappy_dataset
+import flappy_sim
+
+
+def _next_pipe(game):
+    bird, pipe = game.bird, game.pipes[0]
+    if len(game.pipes) > 1 and bird.x > pipe.x + pipe.PIPE_TOP.get_width():
+        pipe = game.pipes[1]
+    return pipe
+
+
+def _flap(basis, loop, score=3):
+    # start, keep above the bottom pipe until score pipes are passed, then
+    # fall; through flappy_sim's narrower gap only once a jump's climb is over
+    game = loop.game
+    if loop.state == basis.MENU:
+        return True
+    if game.seed is not None and game.bird.tick_count < 4:
+        return False
+    margin = 85 if game.seed is None else 80
+    return game.score < score and game.bird.y > _next_pipe(game).bottom - margin
+
+
+def _play(basis, loop, frame_time, press=_flap, frames=5000):
+    # frames at a fixed rate until the game is over
+    now = loop.last
+    for i in range(frames):
+        if loop.state == basis.GAME_OVER:
+            break
+        now += frame_time
+        loop.begin_frame(now)
+        if press(basis, loop):
+            loop.key(pygame.K_SPACE, now)
+        loop.update()
+        loop.presented(now)
+
+
+@pytest.mark.parametrize("fps", [5, 24, 30, 59.94, 144, 1000, "jitter"])
+def test_ticks_follow_game_time(basis, fps):
+    n = 200
+    end = (n + 0.5) * basis.TICK
+    rng = random.Random(1)
+    loop = basis.GameLoop(0.0)
+    now = 0.0
+    while now < end:
+        now = min(end, now + (rng.uniform(0.001, 0.2) if fps == "jitter" else 1 / fps))
+        loop.begin_frame(now)
+        loop.update()
+    assert loop.steps == n and loop.state == basis.MENU
+
+
+def test_stall_is_not_caught_up(basis):
+    loop = basis.GameLoop(0.0)
+    loop.begin_frame(1.0)
+    loop.update()
+    assert loop.steps == int(basis.MAX_LAG / basis.TICK)
+
+
+def test_jump_on_next_tick(basis):
+    loop = basis.GameLoop(0.0)
+    bird = loop.game.bird
+    loop.begin_frame(0.5 * basis.TICK)
+    loop.key(pygame.K_SPACE, 0.5 * basis.TICK)
+    loop.update()
+    assert (loop.state, bird.vel, bird.y, loop.steps) == (basis.MENU, 0, 350, 0)
+    loop.begin_frame(basis.TICK)
+    loop.update()
+    assert (loop.state, bird.vel, loop.steps) == (basis.PLAYING, -10.5, 1) and bird.y < 350
+    loop.presented(1.5 * basis.TICK)
+    assert loop.latencies.count == 1 and loop.latencies.max == pytest.approx(basis.TICK)
+
+    for i in range(2, 12):
+        loop.begin_frame(i * basis.TICK)
+        loop.update()
+    assert bird.tick_count == 11
+    loop.key(pygame.K_SPACE, 11.5 * basis.TICK)
+    assert bird.tick_count == 11
+    loop.begin_frame(12 * basis.TICK)
+    loop.update()
+    assert bird.tick_count == 1
+
+
+def test_restart_reuses_objects(basis):
+    random.seed(3)
+    loop = basis.GameLoop(0.0)
+    game = loop.game
+    _play(basis, loop, 1 / 30)
+    assert loop.state == basis.GAME_OVER and game.score >= 3
+    pool = game.pipes + game.free_pipes
+    bird, base = game.bird, game.base
+
+    loop.key(pygame.K_SPACE, loop.last)
+    assert loop.state == basis.MENU and game.score == 0 and not game.lost
+    assert loop.frame_times.count == loop.latencies.count == 0
+    _play(basis, loop, 1 / 30)
+    assert loop.state == basis.GAME_OVER and game.score >= 3
+    assert game.bird is bird and game.base is base
+    assert set(map(id, game.pipes + game.free_pipes)) == set(map(id, pool))
+
+
+def test_timings(basis):
+    rng = random.Random(2)
+    samples = [rng.expovariate(100) for i in range(5000)] + [3.0]
+    timings = basis.Timings()
+    size = len(timings.counts)
+    for s in samples:
+        timings.add(s)
+    samples.sort()
+    assert len(timings.counts) == size and timings.count == len(samples) and timings.max == 3.0
+    for p in (50, 90, 99):
+        want = samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+        assert want <= timings.percentile(p) <= want + timings.resolution
+    assert timings.percentile(100) == 3.0
+    timings.clear()
+    assert timings.count == 0 and not any(timings.counts)
+
+
+@pytest.mark.parametrize("seed", [4, 11])
+def test_recording_replays_in_sim(basis, tmp_path, seed):
+    # a recorded human game is a BatchGame on the same course, frame for frame
+    recorder = flappy_dataset.Recorder(str(tmp_path))
+    loop = basis.GameLoop(0.0, recorder, iter([seed]))
+    _play(basis, loop, 1 / 30)
+    recorder.close()
+    frames = flappy_dataset.load(str(tmp_path))
+    (episode,) = flappy_dataset.load(str(tmp_path), "episodes")
+    assert loop.state == basis.GAME_OVER and episode['score'] == 3 and episode['seed'] == seed
+    assert (frames['frame'] == np.arange(1, len(frames) + 1)).all() and episode['frames'] == len(frames)
+
+    game = flappy_sim.BatchGame(flappy_sim.CourseTable([seed]), [0], max_score=None)
+    for record in frames:
+        assert game.alive[0]
+        np.testing.assert_allclose(game.begin_frame()[0], record['obs'])
+        game.end_frame(np.array([record['jump']]))
+    assert not game.alive[0]
+    assert (game.frame[0], game.score[0], game.death[0]) == (episode['frames'], episode['score'], episode['death'])
+    assert game.fitness[0] == pytest.approx(episode['fitness'])
@@ -0,0 +1,90 @@
+import copy
+import random
+import neat
+import numpy as np
+import flappy_cache
+import flappy_genome
+import flappy_sim
+
+
+def _genomes(config, n=40, mutations=10):
+    random.seed(4)
+    genomes = []
+    for key in range(n):
+        genome = neat.DefaultGenome(key)
+        genome.configure_new(config.genome_config)
+        for i in range(random.randrange(mutations)):
+            genome.mutate(config.genome_config)
+        genomes.append(genome)
+    return genomes
+
+
+def test_net_cache_compiles_like_neat(config):
+    cache = flappy_cache.NetCache()
+    for genome in _genomes(config):
+        assert cache.create(genome, config).node_evals == \
+            neat.nn.FeedForwardNetwork.create(genome, config).node_evals
+
+
+def test_net_cache_reuses_unchanged_genomes(config, capsys):
+    cache = flappy_cache.NetCache()
+    genomes = _genomes(config, 10)
+    cache.start_generation(0)
+    nets = [cache.create(genome, config) for genome in genomes]
+    elite = copy.deepcopy(genomes[3])
+    elite.key, elite.fitness = 99, 1.0
+    assert cache.create(elite, config) is nets[3]
+    cache.post_evaluate(config, {}, None, None)
+    assert capsys.readouterr().out == ""
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['generation_hits'], stats['cached']) == (1, 10, 1, 10)
+    assert stats['hit_rate'] == 1 / 11
+    cache.start_generation(1)
+    assert cache.stats()['generation_hits'] == 0
+
+
+def test_pruned_nets_give_the_same_outputs(config):
+    config.genome_config.node_delete_prob = 0.5
+    genomes = _genomes(config, 200, 30)
+    for genome in genomes[::3]:
+        for conn in list(genome.connections.values())[::2]:
+            conn.weight = 0.0
+    cache = flappy_cache.NetCache(prune=True)
+    x = np.random.default_rng(0).normal(0, 100, (20, 3))
+    smaller = 0
+    for genome in genomes:
+        net, pruned = neat.nn.FeedForwardNetwork.create(genome, config), cache.create(genome, config)
+        smaller += flappy_genome.net_size(pruned) < flappy_genome.net_size(net)
+        for inputs in x:
+            assert [repr(v) for v in net.activate(inputs)] == [repr(v) for v in pruned.activate(inputs)]
+    assert smaller
+
+
+def test_fitness_cache_matches_evaluate_courses(config):
+    genomes = list(enumerate(_genomes(config, 30)))
+    unique = len(set(flappy_cache.genome_hash(genome) for genome_id, genome in genomes))
+    seeds = [3, 4, 5]
+    nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome_id, genome in genomes]
+    expected_frames = np.empty((len(seeds), len(genomes)), dtype=np.int64)
+    expected = flappy_sim.evaluate_courses(nets, seeds, "min", frames=expected_frames)
+    cache = flappy_cache.FitnessCache()
+    frames = np.empty_like(expected_frames)
+    for rerun in range(2):
+        aggregated, fitness = cache.evaluate(genomes, config, seeds, "min", frames=frames)
+        assert np.array_equal(aggregated, expected[0]) and np.array_equal(fitness, expected[1])
+        assert np.array_equal(frames, expected_frames)
+        assert cache.stats()['played'] == unique * len(seeds)
+    # other courses and other rules are played again
+    cache.evaluate(genomes, config, [6])
+    cache.evaluate(genomes, config, [3], max_score=5)
+    assert cache.stats()['played'] == unique * (len(seeds) + 2)
+
+
+def test_fitness_cache_games_carry_genome_keys(config):
+    genomes = [(100 + i, genome) for i, genome in enumerate(_genomes(config, 10))]
+    games = []
+    flappy_cache.FitnessCache().evaluate(genomes, config, [3, 4], observer=games.append)
+    first = {}
+    for genome_id, genome in genomes:
+        first.setdefault(flappy_cache.genome_hash(genome), genome_id)
+    assert sorted(games[0].key.tolist()) == sorted(list(first.values()) * 2)
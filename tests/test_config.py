@@ -0,0 +1,13 @@
+import configparser
+import pytest
+from conftest import CONFIG_FILE
+
+
+@pytest.mark.parametrize("section, copy", [("DefaultGenome", "CompactGenome"),
+                                           ("DefaultSpeciesSet", "ArraySpeciesSet"),
+                                           ("DefaultReproduction", "BatchReproduction")])
+def test_sections_are_the_same(section, copy):
+    # the array versions read their own section, it has to say the same as neat's
+    parser = configparser.ConfigParser()
+    parser.read(CONFIG_FILE)
+    assert dict(parser.items(copy)) == dict(parser.items(section))
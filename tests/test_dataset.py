@@ -0,0 +1,78 @@
+import copy
+import neat
+import numpy as np
+import pytest
+import flappy_cache
+import flappy_dataset
+import flappy_sim
+import flappy_warmstart
+
+SEEDS = [1, 2, 3]
+
+
+def _nets(config, champion):
+    genomes = [champion] + [flappy_warmstart.demo_genome(i, config, [0.0, 0.03, -0.03], bias)
+                            for i, bias in enumerate((-0.9, -0.6, -0.3), 2)]
+    return [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+
+
+def test_recording_replays(config, champion, tmp_path):
+    nets = _nets(config, champion)
+    recorder = flappy_dataset.Recorder(str(tmp_path), chunk_size=1000)
+    keys = [10 + i for i in range(len(nets))]
+    fitness = flappy_sim.evaluate_courses(nets, SEEDS, max_score=5, observer=recorder.observe, keys=keys)[1]
+    recorder.close()
+    frames = flappy_dataset.load(str(tmp_path))
+    episodes = flappy_dataset.load(str(tmp_path), "episodes")
+    assert len(list(flappy_dataset.chunks(str(tmp_path)))) > 1
+
+    # game i is net i % len(nets) on course i // len(nets)
+    n = len(nets) * len(SEEDS)
+    assert sorted(episodes['episode'].tolist()) == list(range(n))
+    episodes = episodes[np.argsort(episodes['episode'])]
+    assert episodes['fitness'].tolist() == fitness.ravel().tolist()
+    assert episodes['seed'].tolist() == np.repeat(SEEDS, len(nets)).tolist()
+    assert episodes['genome'].tolist() == keys * len(SEEDS)
+    assert np.bincount(frames['episode'], minlength=n).tolist() == episodes['frames'].tolist()
+
+    for record in frames[::7]:
+        net = nets[record['episode'] % len(nets)]
+        assert (net.activate(record['obs'])[0] > 0.5) == record['jump']
+
+    # the recorded jumps play the same games again
+    game = flappy_sim.BatchGame(flappy_sim.CourseTable(SEEDS), np.arange(n) // len(nets), max_score=5)
+    jumps = np.zeros((n, int(episodes['frames'].max()) + 1), dtype=bool)
+    jumps[frames['episode'], frames['frame']] = frames['jump']
+    game.run(lambda obs, alive: jumps[np.arange(n), game.frame])
+    assert game.fitness.tolist() == episodes['fitness'].tolist()
+    assert game.frame.tolist() == episodes['frames'].tolist()
+    assert game.score.tolist() == episodes['score'].tolist()
+    assert game.death.tolist() == episodes['death'].tolist()
+
+
+def test_every_game_is_recorded(end_version, config, champion, tmp_path, monkeypatch):
+    # cached games and genomes that play the same are recorded too
+    recorder = flappy_dataset.Recorder(str(tmp_path))
+    for name, value in (("recorder", recorder), ("MEMOIZE_FITNESS", True), ("FIXED_COURSES", True),
+                        ("NUM_COURSES", 2), ("WATCH", False), ("stats_log", None),
+                        ("fitness_cache", flappy_cache.FitnessCache())):
+        monkeypatch.setattr(end_version, name, value)
+    twin = copy.deepcopy(champion)
+    twin.key = 7
+    genomes = [(champion.key, champion), (twin.key, twin)]
+    for generation in range(2):
+        end_version.eval_genomes_courses(genomes, config)
+    recorder.close()
+    episodes = flappy_dataset.load(str(tmp_path), "episodes")
+    assert sorted(episodes['genome'].tolist()) == [champion.key] * 4 + [7] * 4
+    assert sorted(episodes['seed'].tolist()) == [0] * 4 + [1] * 4
+
+
+@pytest.mark.parametrize("mode", [("ISLANDS", 2), ("STEADY_STATE", 2), ("WORKER_ADDRESS", ("localhost", 6000)),
+                                  ("PARALLEL_WORKERS", 2)])
+@pytest.mark.parametrize("watch", [("RECORD", "dataset"), ("WATCH", True)])
+def test_record_and_watch_need_local_games(end_version, mode, watch, monkeypatch):
+    monkeypatch.setattr(end_version, *mode)
+    monkeypatch.setattr(end_version, *watch)
+    with pytest.raises(ValueError):
+        end_version.run("no config needed")
@@ -0,0 +1,70 @@
+import multiprocessing
+import random
+import neat
+import numpy as np
+import pytest
+import flappy_distributed
+import flappy_sim
+
+SEEDS = [1, 2, 3]
+
+
+def _genomes(config, n=60):
+    random.seed(1)
+    population = neat.Population(config)
+    genomes = list(population.population.items())
+    return (genomes * (n // len(genomes) + 1))[:n]
+
+
+def test_needs_authkey(monkeypatch):
+    monkeypatch.delenv(flappy_distributed.AUTHKEY_ENV, raising=False)
+    with pytest.raises(ValueError):
+        flappy_distributed.Coordinator(("127.0.0.1", 0))
+    with pytest.raises(ValueError):
+        flappy_distributed.worker(("127.0.0.1", 1))
+
+
+def test_authkey_from_environment(monkeypatch):
+    monkeypatch.setenv(flappy_distributed.AUTHKEY_ENV, "secret")
+    assert flappy_distributed.get_authkey() == b"secret"
+    assert flappy_distributed.get_authkey(b"other") == b"other"
+
+
+def test_workers_match_evaluate_courses(config):
+    genomes = _genomes(config)
+    coordinator = flappy_distributed.Coordinator(("127.0.0.1", 0), b"test", batch_size=20, timeout=30)
+    try:
+        flappy_distributed.start_local_workers(coordinator.address, 2, b"test")
+        frames = np.empty((len(SEEDS), len(genomes)), dtype=np.int64)
+        fitness = coordinator.evaluate(genomes, config, SEEDS, frames=frames)
+    finally:
+        coordinator.close()
+    nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome_id, genome in genomes]
+    want = np.empty_like(frames)
+    assert np.array_equal(fitness, flappy_sim.evaluate_courses(nets, SEEDS, frames=want)[0])
+    assert np.array_equal(frames, want)
+
+
+def test_wrong_authkey_is_refused():
+    coordinator = flappy_distributed.Coordinator(("127.0.0.1", 0), b"test")
+    try:
+        with pytest.raises(multiprocessing.AuthenticationError):
+            flappy_distributed.worker(coordinator.address, b"wrong")
+        assert coordinator.workers == 0
+    finally:
+        coordinator.close()
+
+
+def test_game_logs_alive_times(end_version, config, monkeypatch):
+    logged = []
+    monkeypatch.setattr(end_version, "stats_log", type("Log", (), {"add_alive_times": logged.append})())
+    monkeypatch.setattr(end_version, "NUM_COURSES", 2)
+    coordinator = flappy_distributed.Coordinator(("127.0.0.1", 0), b"test", batch_size=20, timeout=30)
+    monkeypatch.setattr(end_version, "coordinator", coordinator)
+    genomes = _genomes(config, 30)
+    try:
+        flappy_distributed.start_local_workers(coordinator.address, 1, b"test")
+        end_version.eval_genomes_distributed(genomes, config)
+    finally:
+        coordinator.close()
+    assert len(logged) == 1 and logged[0].shape == (2 * len(genomes),) and logged[0].min() > 0
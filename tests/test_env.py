@@ -0,0 +1,35 @@
+import random
+import neat
+import numpy as np
+import pytest
+import flappy_env
+import flappy_sim
+
+
+def test_reset_needs_a_seed_per_environment():
+    env = flappy_env.VecEnv(4)
+    with pytest.raises(ValueError):
+        env.reset([1, 2])
+    with pytest.raises(ValueError):
+        env.reset(range(5))
+    env.reset(range(10, 14))
+    assert env.courses.seeds.tolist() == [10, 11, 12, 13]
+
+
+def test_episode_rewards_add_up_to_fitness(config, champion):
+    random.seed(2)
+    genomes = [genome for genome_id, genome in neat.Population(config).population.items()][:15] + [champion]
+    nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+    seeds = list(range(100, 100 + len(nets)))
+    fitness = flappy_sim.evaluate_courses(nets, seeds)[1]
+    env = flappy_env.VecEnv(len(nets))
+    policy = flappy_sim.net_policy(nets)
+    obs = env.reset(seeds)
+    total = np.zeros(len(nets))
+    done = np.zeros(len(nets), dtype=bool)
+    while not done.all():
+        obs, rewards, dones = env.step(policy(obs, ~done))
+        total += np.where(done, 0, rewards)
+        done |= dones
+    # environment i plays seeds[i] with net i
+    assert np.allclose(total, fitness[np.arange(len(nets)), np.arange(len(nets))])
@@ -0,0 +1,83 @@
+import copy
+import os
+import pickle
+import random
+import neat
+import numpy as np
+import pytest
+import flappy_sim
+import flappy_warmstart
+
+PICKLES = ("best_net.pickle", "best_genome.pickle")
+
+
+@pytest.fixture
+def game_dir(end_version, monkeypatch):
+    # eval_genomes saves and loads its pickles here
+    monkeypatch.chdir(os.path.dirname(end_version.__file__))
+    yield
+    _clean()
+
+
+def _clean():
+    for name in PICKLES:
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _play(end_version, genome, config, seed):
+    # eval_genomes of one genome on the course random.seed(seed) draws
+    random.seed(seed)
+    end_version.eval_genomes([(genome.key, genome)], config)
+    _clean()
+    return genome.fitness
+
+
+def test_batch_game_matches_eval_genomes(end_version, config, champion, game_dir):
+    # random genomes, ones that pass a few pipes and one that reaches MAX_SCORE
+    random.seed(3)
+    genomes = [genome for genome_id, genome in neat.Population(config).population.items()][:6]
+    genomes += [flappy_warmstart.demo_genome(100 + i, config, [0.0, 0.03, -0.03], bias)
+                for i, bias in enumerate((-0.9, -0.6))]
+    genomes.append(champion)
+    seeds = [11, 12]
+    nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+    aggregated, fitness = flappy_sim.evaluate_courses(nets, seeds)
+    assert np.array_equal(aggregated, fitness.mean(axis=0))
+    assert fitness[:, -1].min() > 300 and fitness[:, -3:-1].max() > 20
+    for c, seed in enumerate(seeds):
+        for i, genome in enumerate(genomes):
+            assert _play(end_version, copy.deepcopy(genome), config, seed) == fitness[c, i]
+
+
+def test_best_genome_is_saved_with_its_fitness(end_version, config, champion, game_dir):
+    random.seed(5)
+    end_version.eval_genomes([(champion.key, champion)], config)
+    with open("best_genome.pickle", "rb") as f:
+        genome_id, saved = pickle.load(f)
+    assert champion.fitness > 300
+    assert saved.fitness == champion.fitness
+
+
+def test_hidden_birds_animate(end_version, monkeypatch):
+    # the wing image picks the collision mask, so it must not depend on drawing
+    def play(top_k):
+        monkeypatch.setattr(end_version, "DRAW_TOP_K", top_k)
+        rng = random.Random(6)
+        birds = [end_version.Bird(230, rng.randrange(100, 600)) for i in range(30)]
+        pipes, base = [end_version.Pipe(700)], end_version.Base(end_version.FLOOR)
+        states = []
+        for frame in range(200):
+            for bird in birds:
+                bird.move()
+                if rng.random() < 0.05:
+                    bird.jump()
+            end_version.drawn_window(end_version.WIN, birds, pipes, base, 0, 1, 0)
+            states.append([(bird.IMGS.index(bird.img), bird.img_count) for bird in birds])
+        return states
+
+    random.seed(8)
+    shown = play(None)
+    random.seed(8)
+    assert play(3) == shown
+    assert len(set(img for frame in shown for img, count in frame)) == 3
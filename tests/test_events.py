@@ -0,0 +1,50 @@
+import random
+import pytest
+import flappy_events
+import flappy_sim
+
+STATE = ("frame", "score", "fitness", "death", "y", "img", "img_count", "tilt", "alive")
+
+
+class _Periodic:
+    # jumps every period frames
+    def __init__(self, period):
+        self.period = period
+
+    def __call__(self, game):
+        return self.period - game.frame % self.period
+
+    def frame_policy(self, game):
+        return lambda obs, alive: game.frame % self.period == 0
+
+
+def _compare(seed, controller, max_score, max_frames):
+    batch = flappy_sim.BatchGame(flappy_sim.CourseTable([seed]), [0], max_score=max_score)
+    policy = controller.frame_policy(batch)
+    while batch.alive[0] and batch.frame[0] < max_frames:
+        obs = batch.begin_frame()
+        batch.end_frame(policy(obs, batch.alive))
+    game = flappy_events.EventGame(seed, max_score=max_score)
+    game.run(controller, max_frames)
+    assert tuple(getattr(game, name) for name in STATE) == tuple(getattr(batch, name)[0] for name in STATE)
+    return game
+
+
+@pytest.mark.parametrize("start", range(4))
+def test_event_game_matches_batch_game(start):
+    rng = random.Random(start)
+    deaths = set()
+    for i in range(40):
+        if i % 2:
+            controller = flappy_events.GapController(rng.randrange(40, 140))
+        else:
+            controller = _Periodic(rng.randrange(1, 30))
+        game = _compare(rng.randrange(1000), controller, rng.choice([None, 25, 3]), rng.choice([50, 500, 3000]))
+        deaths.add(game.death)
+    assert len(deaths) > 1
+
+
+def test_event_game_skips_frames():
+    game = _compare(7, flappy_events.GapController(), None, 20000)
+    assert game.frame == 20000 and game.alive
+    assert game.steps < game.frame / 4
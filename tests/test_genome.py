@@ -0,0 +1,70 @@
+import random
+import neat
+import numpy as np
+import pytest
+import flappy_genome
+
+
+@pytest.fixture
+def grown(config):
+    # DefaultGenomes with hidden nodes and the same as CompactGenomes
+    random.seed(1)
+    genomes = []
+    for key in range(60):
+        genome = neat.DefaultGenome(key)
+        genome.configure_new(config.genome_config)
+        for i in range(random.randrange(1, 15)):
+            genome.mutate(config.genome_config)
+        genomes.append(genome)
+    return genomes, [flappy_genome.CompactGenome.from_genome(genome) for genome in genomes]
+
+
+def test_compile_matches_default_genome(config, grown):
+    x = np.random.default_rng(0).normal(0, 100, (10, 3))
+    for genome, compact in zip(*grown):
+        net, compiled = neat.nn.FeedForwardNetwork.create(genome, config), compact.compile(config)
+        for inputs in x:
+            assert np.allclose(net.activate(inputs), compiled.activate(inputs), atol=1e-12)
+        assert compact.size() == genome.size()
+        back = compact.to_genome()
+        assert back.nodes.keys() == genome.nodes.keys() and back.connections.keys() == genome.connections.keys()
+
+
+def test_distance_matches_default_genome(config, grown):
+    genomes, compact = grown
+    random.seed(2)
+    for i in range(300):
+        a, b = random.randrange(len(genomes)), random.randrange(len(genomes))
+        assert abs(genomes[a].distance(genomes[b], config.genome_config) -
+                   compact[a].distance(compact[b], config.genome_config)) < 1e-9
+
+
+def _evolve(config, seed):
+    # a few generations of crossover and mutation, the genes they end with
+    random.seed(seed)
+    config.genome_config.node_indexer = None  # as in a new run
+    population = []
+    for key in range(30):
+        genome = flappy_genome.CompactGenome(key)
+        genome.configure_new(config.genome_config)
+        genome.fitness = random.random()
+        population.append(genome)
+    for generation in range(5):
+        children = []
+        for key in range(30):
+            parent1, parent2 = random.sample(population, 2)
+            child = flappy_genome.CompactGenome(key)
+            child.configure_crossover(parent1, parent2, config.genome_config)
+            child.mutate(config.genome_config)
+            child.fitness = random.random()
+            children.append(child)
+        population = children
+    return [(genome.node_genes.tobytes(), genome.conn_genes.tobytes()) for genome in population]
+
+
+def test_random_seed_makes_runs_reproducible(config):
+    first = _evolve(config, 5)
+    # whatever numpy drew in between
+    flappy_genome.rng.random(1000)
+    assert _evolve(config, 5) == first
+    assert _evolve(config, 6) != first
@@ -0,0 +1,67 @@
+import copy
+import random
+import neat
+import flappy_genome
+import flappy_islands
+
+
+def _grown(config, key, mutations=10):
+    # a genome with hidden nodes from config's node_indexer
+    genome = config.genome_type(key)
+    genome.configure_new(config.genome_config)
+    for i in range(mutations):
+        genome.mutate_add_node(config.genome_config)
+    return genome
+
+
+def _other_island(config):
+    # the same config as another process sees it, its indexer starts over
+    other = copy.deepcopy(config)
+    other.genome_config.node_indexer = None
+    return other
+
+
+def _check_immigrate(config):
+    random.seed(1)
+    population = neat.Population(config)
+    for genome in population.population.values():
+        genome.mutate_add_node(config.genome_config)
+    other = _other_island(config)
+    migrants = [_grown(other, 1000 + i) for i in range(3)]
+    shared = set(migrants[0].nodes) & set(migrants[1].nodes)
+    used = set(k for genome in population.population.values() for k in genome.nodes)
+    flappy_islands._immigrate(population, migrants, set())
+
+    outputs = set(config.genome_config.output_keys)
+    for genome in migrants:
+        assert genome.key in population.population
+        hidden = set(genome.nodes) - outputs
+        assert hidden and not hidden & used
+        for i, o in genome.connections:
+            assert o in genome.nodes and (i in genome.nodes or i in config.genome_config.input_keys)
+    # homologous nodes of migrants from the same island stay homologous
+    assert len(set(migrants[0].nodes) & set(migrants[1].nodes)) == len(shared)
+    # adding nodes after the migration does not hit the indexer's assert
+    for genome in population.population.values():
+        for i in range(5):
+            genome.mutate_add_node(config.genome_config)
+
+
+def test_immigrate_renames_hidden_nodes(config):
+    _check_immigrate(config)
+
+
+def test_immigrate_renames_hidden_nodes_compact(config):
+    config.genome_type = flappy_genome.CompactGenome
+    _check_immigrate(config)
+
+
+def test_evolve_with_frequent_node_adds(config):
+    # every genome adds nodes and every island takes migrants every
+    # generation; before the keys were mapped this crashed an island
+    config.genome_config.node_add_prob = 0.9
+    config.pop_size = 15
+    for seed in (0, 10):
+        results = flappy_islands.evolve(config, islands=2, generations=12, interval=1, courses=1,
+                                        target=1e9, seed=seed)
+        assert [r.generations for r in results] == [12, 12]
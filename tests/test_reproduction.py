@@ -0,0 +1,200 @@
+import copy
+import math
+import random
+import neat
+import numpy as np
+import pytest
+from neat.graphs import creates_cycle
+import flappy_genome
+import flappy_reproduction
+from conftest import CONFIG_FILE
+
+
+def _config(reproduction, pop_size, genome_type=neat.DefaultGenome):
+    config = neat.Config(neat.DefaultGenome, reproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         CONFIG_FILE)
+    config.genome_type = genome_type  # the [CompactGenome] section is the same
+    config.pop_size = pop_size
+    return config
+
+
+def _score(population):
+    for genome in population.values():
+        genome.fitness = -abs(sum(c.weight for c in genome.connections.values()) - 1) - 0.05 * len(genome.connections)
+
+
+def _valid(genome, config):
+    gc = config.genome_config
+    for key in gc.output_keys:
+        assert key in genome.nodes
+    keys = list(genome.connections)
+    for (i, o), conn in genome.connections.items():
+        assert conn.key == (i, o)
+        assert (i in genome.nodes or i in gc.input_keys) and o in genome.nodes
+    for j in range(len(keys)):
+        assert not creates_cycle(keys[:j] + keys[j + 1:], keys[j])
+    neat.nn.FeedForwardNetwork.create(genome, config)
+
+
+@pytest.mark.parametrize("genome_type", [neat.DefaultGenome, flappy_genome.CompactGenome])
+def test_children_are_valid_genomes(genome_type):
+    config = _config(flappy_reproduction.BatchReproduction, 300, genome_type)
+    random.seed(0)
+    population = neat.Population(config)
+    for generation in range(6):
+        _score(population.population)
+        population.population = population.reproduction.reproduce(config, population.species, config.pop_size,
+                                                                   generation)
+        for genome in population.population.values():
+            assert isinstance(genome, genome_type)
+            if genome_type is flappy_genome.CompactGenome:
+                for genes in (genome.node_genes, genome.conn_genes):
+                    assert (np.diff(genes['key']) > 0).all()
+            _valid(genome, config)
+        population.species.speciate(config, population.population, generation)
+    assert max(len(g.nodes) for g in population.population.values()) > 1
+
+
+def test_same_elites_and_spawn_as_default_reproduction():
+    kept = []
+    for reproduction in (neat.DefaultReproduction, flappy_reproduction.BatchReproduction):
+        config = _config(reproduction, 200)
+        random.seed(1)
+        population = neat.Population(config)
+        _score(population.population)
+        old = set(population.population)
+        new = population.reproduction.reproduce(config, population.species, config.pop_size, 0)
+        kept.append((len(new), sorted(old & set(new))))
+    assert kept[0] == kept[1]
+
+
+def test_without_mutation_children_are_crossovers():
+    config = _config(flappy_reproduction.BatchReproduction, 200)
+    gc = config.genome_config
+    gc.node_add_prob = gc.node_delete_prob = gc.conn_add_prob = gc.conn_delete_prob = 0.0
+    for name in ("bias", "response", "weight", "enabled", "activation", "aggregation"):
+        for setting in ("mutate_rate", "replace_rate"):
+            if hasattr(gc, name + "_" + setting):
+                setattr(gc, name + "_" + setting, 0.0)
+    random.seed(2)
+    population = neat.Population(config)
+    for genome in population.population.values():
+        for i in range(3):
+            genome.mutate_add_node(gc)
+    parents = dict(population.population)
+    _score(parents)
+    children = population.reproduction.reproduce(config, population.species, config.pop_size, 0)
+    for key, child in children.items():
+        if key in parents:
+            continue
+        first, second = (parents[k] for k in population.reproduction.ancestors[key])
+        fitter, other = (first, second) if first.fitness > second.fitness else (second, first)
+        assert child.nodes.keys() == fitter.nodes.keys()
+        assert child.connections.keys() == fitter.connections.keys()
+        for genes, fitter_genes, other_genes in ((child.nodes, fitter.nodes, other.nodes),
+                                                 (child.connections, fitter.connections, other.connections)):
+            # every attribute from either parent, like neat's gene crossover
+            for k, gene in genes.items():
+                for a in gene._gene_attributes:
+                    assert getattr(gene, a.name) in [getattr(g[k], a.name) for g in (fitter_genes, other_genes)
+                                                     if k in g]
+
+
+def _mutated(config, batch, copies=10):
+    # (parent, child) pairs of parents with hidden nodes, every child
+    # mutated once: by BatchReproduction from the parent crossed with
+    # itself, or by a copy of it and DefaultGenome.mutate
+    gc = config.genome_config
+    random.seed(5)
+    population = neat.Population(config)
+    parents = list(population.population.values())
+    for genome in parents:
+        for i in range(3):
+            genome.mutate_add_node(gc)
+            genome.mutate_add_connection(gc)
+        genome.fitness = random.random()
+    index = np.repeat(np.arange(len(parents)), copies)
+    if batch:
+        children = population.reproduction.make_children(config, parents, index, index, np.random.default_rng(5))
+        return [(parents[i], child) for i, (gid, child) in zip(index.tolist(), children)]
+    pairs = []
+    for i in index.tolist():
+        child = copy.deepcopy(parents[i])
+        child.mutate(gc)
+        pairs.append((parents[i], child))
+    return pairs
+
+
+def _structural_events(config, pairs):
+    # how many children got each structural mutation
+    outputs = set(config.genome_config.output_keys)
+    counts = dict.fromkeys(("node_add", "node_delete", "conn_add", "conn_delete"), 0)
+    for parent, child in pairs:
+        new_nodes = set(child.nodes) - set(parent.nodes)
+        gone_nodes = set(parent.nodes) - set(child.nodes) - outputs
+        new_conns = [k for k in child.connections if k not in parent.connections and not new_nodes & set(k)]
+        gone_conns = [k for k in parent.connections if k not in child.connections and not gone_nodes & set(k)]
+        counts["node_add"] += bool(new_nodes)
+        counts["node_delete"] += bool(gone_nodes)
+        counts["conn_add"] += bool(new_conns)
+        counts["conn_delete"] += bool(gone_conns)
+    return counts
+
+
+def _attribute_changes(pairs):
+    # how many genes had each attribute changed, and how many genes there were
+    counts = {}
+    genes = {"nodes": 0, "connections": 0}
+    for parent, child in pairs:
+        for kind in genes:
+            parent_genes, child_genes = getattr(parent, kind), getattr(child, kind)
+            genes[kind] += len(child_genes)
+            for key, gene in child_genes.items():
+                for a in gene._gene_attributes:
+                    changed = getattr(gene, a.name) != getattr(parent_genes[key], a.name)
+                    counts[a.name] = counts.get(a.name, 0) + changed
+    return counts, genes
+
+
+def _same_rate(a, b, n):
+    # two proportions out of n draws each agree within 4.5 standard errors
+    p = (a + b) / (2 * n)
+    return abs(a - b) / n <= 4.5 * math.sqrt(max(2 * p * (1 - p) / n, 1e-12))
+
+
+@pytest.mark.parametrize("single", [False, True])
+def test_structural_mutations_as_often_as_neat(single):
+    counts = []
+    for batch in (True, False):
+        config = _config(flappy_reproduction.BatchReproduction, 300)
+        gc = config.genome_config
+        gc.single_structural_mutation = single
+        gc.node_add_prob, gc.node_delete_prob, gc.conn_add_prob, gc.conn_delete_prob = 0.3, 0.2, 0.4, 0.25
+        pairs = _mutated(config, batch)
+        counts.append(_structural_events(config, pairs))
+    n = len(pairs)
+    for event in counts[1]:
+        assert counts[1][event] > n // 20
+        assert _same_rate(counts[0][event], counts[1][event], n), (event, counts)
+
+
+@pytest.mark.parametrize("power", [0.0, 0.5])
+def test_attribute_mutations_as_often_as_neat(power):
+    # with a mutate power of 0 only the replaced values change
+    changes = []
+    for batch in (True, False):
+        config = _config(flappy_reproduction.BatchReproduction, 300)
+        gc = config.genome_config
+        gc.node_add_prob = gc.node_delete_prob = gc.conn_add_prob = gc.conn_delete_prob = 0.0
+        for name in ("weight", "bias"):
+            setattr(gc, name + "_mutate_rate", 0.3)
+            setattr(gc, name + "_replace_rate", 0.2)
+            setattr(gc, name + "_mutate_power", power)
+        gc.enabled_mutate_rate = 0.2
+        changes.append(_attribute_changes(_mutated(config, batch)))
+    (batch_counts, batch_genes), (neat_counts, neat_genes) = changes
+    assert batch_genes == neat_genes
+    for name, kind in (("weight", "connections"), ("bias", "nodes"), ("enabled", "connections")):
+        n = neat_genes[kind]
+        assert neat_counts[name] > n // 20
+        assert _same_rate(batch_counts[name], neat_counts[name], n), (name, changes)
@@ -0,0 +1,27 @@
+import neat
+import numpy as np
+import pytest
+import flappy_genome
+import flappy_shared
+import flappy_sim
+from conftest import grown_genomes
+
+
+@pytest.mark.parametrize("genome_type", [neat.DefaultGenome, flappy_genome.CompactGenome])
+def test_pool_matches_evaluate_courses(genome_type):
+    config, genomes = grown_genomes(genome_type, 120, 10)
+    pool = flappy_shared.SharedPool(config, workers=2)
+    try:
+        for n, seeds, how, max_score in ((50, [1, 2, 3], "mean", 25), (120, [4, 5], 0.25, 3),
+                                         (30, [9], "min", None), (0, [1], "mean", 25)):
+            frames = np.empty((len(seeds), n), dtype=np.int64)
+            fitness = pool.evaluate(genomes[:n], seeds, how, max_score, frames=frames)
+            if not n:
+                assert len(fitness) == 0
+                continue
+            nets = [flappy_genome.create_net(genome, config) for key, genome in genomes[:n]]
+            want = np.empty_like(frames)
+            assert np.array_equal(fitness, flappy_sim.evaluate_courses(nets, seeds, how, max_score, frames=want)[0])
+            assert np.array_equal(frames, want)
+    finally:
+        pool.close()
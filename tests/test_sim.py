@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+import flappy_sim as sim
+
+
+def _mask_hit(img, dx, y, height):
+    # Pipe.collide of the original game
+    mask = sim.BIRD_MASKS[img]
+    return bool(mask.overlap(sim.PIPE_BOTTOM_MASK, (dx, height + sim.PIPE_GAP - y)) or
+                mask.overlap(sim.PIPE_TOP_MASK, (dx, height - sim.PIPE_LENGTH - y)))
+
+
+def test_pipe_hit_matches_masks():
+    y = 300
+    offsets = np.arange(-760, 900)
+    for img in range(len(sim.BIRD_MASKS)):
+        for dx in range(sim.DX_MIN - 4, sim.DX_MAX + 5):
+            want = [_mask_hit(img, dx, y, y + off) for off in offsets.tolist()]
+            assert sim.pipe_hit(img, dx, y, y + offsets).tolist() == want
+
+
+def test_pipe_hit_on_arrays():
+    rng = np.random.default_rng(0)
+    n = 20000
+    img, dx = rng.integers(0, 3, n), rng.integers(sim.DX_MIN - 10, sim.DX_MAX + 10, n)
+    y, height = rng.integers(-80, 720, n), rng.integers(50, 450, n)
+    want = [_mask_hit(*case) for case in zip(img.tolist(), dx.tolist(), y.tolist(), height.tolist())]
+    got = sim.pipe_hit(img, dx, y, height)
+    assert got.tolist() == want and any(want)
+
+
+def test_end_version_collide_matches_masks(end_version):
+    import pygame
+    rng = np.random.default_rng(1)
+    bird, pipe = end_version.Bird(230, 350), end_version.Pipe(700)
+    top = pygame.mask.from_surface(pipe.PIPE_TOP)
+    bottom = pygame.mask.from_surface(pipe.PIPE_BOTTOM)
+    hits = 0
+    for i in range(3000):
+        bird.img = bird.IMGS[int(rng.integers(0, 3))]
+        bird.y = float(rng.uniform(-80, 720))
+        pipe.x = int(rng.integers(bird.x - 110, bird.x + 60))
+        pipe.height = int(rng.integers(50, 450))
+        pipe.top, pipe.bottom = pipe.height - pipe.PIPE_TOP.get_height(), pipe.height + pipe.GAP
+        mask, dx = pygame.mask.from_surface(bird.img), pipe.x - bird.x
+        want = bool(mask.overlap(bottom, (dx, pipe.bottom - round(bird.y))) or
+                    mask.overlap(top, (dx, pipe.top - round(bird.y))))
+        assert bool(pipe.collide(bird, None)) == want
+        hits += want
+    assert hits
+
+
+FIELDS = ["frame", "y", "vel", "tick", "height", "tilt", "img_count", "img", "alive", "fitness", "score", "death"]
+
+
+@pytest.mark.parametrize("n", [200, 1])
+@pytest.mark.parametrize("max_score", [None, 25, 3])
+def test_skip_matches_frames(max_score, n):
+    # jump schedules recorded frame by frame, replayed with skips between the jumps
+    import flappy_events
+    cap = 3000
+    rng = np.random.default_rng(1)
+    off = np.where(rng.random(n) < 0.05, -150, rng.integers(90, 103, n))
+    a = sim.BatchGame(sim.CourseTable(range(40)), np.arange(n) % 40, max_score=max_score)
+    jumps = np.zeros((n, cap + 2), dtype=bool)
+    while a.alive.any() and a.frame.max() < cap:
+        a.begin_frame()
+        k = np.array([flappy_events.observed_pipe(int(f)) for f in a.frame])
+        a.courses.ensure(int(k.max()))
+        jump = a.alive & (a.y > a.courses.heights[a.course, k] + off)
+        jumps[np.flatnonzero(jump), a.frame[jump]] = True
+        a.end_frame(jump)
+
+    b = sim.BatchGame(sim.CourseTable(range(40)), np.arange(n) % 40, max_score=max_score)
+    skipped = 0
+    while b.alive.any() and b.frame.max() < cap:
+        ahead = jumps[:, 1:][np.arange(n)[:, None], np.minimum(b.frame[:, None] + np.arange(60), cap)]
+        ahead &= b.alive[:, None]
+        wait = int(ahead.any(axis=0).argmax()) if ahead.any() else 60
+        wait = min(wait, cap - int(b.frame.max()) - 1)
+        b.skip(wait)
+        skipped += wait
+        if not b.alive.any() or b.frame.max() >= cap:
+            break
+        b.begin_frame()
+        b.end_frame(jumps[np.arange(n), b.frame])
+
+    for field in FIELDS:
+        assert (getattr(a, field) == getattr(b, field)).all(), field
+    assert skipped
+
+
+def test_accountant_matches_genome_fitness():
+    # random frames in the order eval_genomes adds to genome.fitness:
+    # frame reward, pipe deaths with the penalty, pipe reward, floor and ceiling deaths
+    rng = np.random.default_rng(2)
+    n = 300
+    accountant = sim.FitnessAccountant(n)
+    fitness, score = [0.0] * n, [0] * n
+    alive = set(range(n))
+    while alive:
+        accountant.frame()
+        for bird in alive:
+            fitness[bird] += sim.FRAME_REWARD
+        passed = rng.random() < 0.03
+        for bird in sorted(alive):
+            if rng.random() < (0.2 if passed else 0.002):
+                fitness[bird] += sim.COLLIDE_PENALTY
+                accountant.died(bird, sim.DEATH_PIPE)
+                alive.discard(bird)
+        if passed:
+            accountant.passed()
+            for bird in alive:
+                fitness[bird] += sim.PIPE_REWARD
+                score[bird] += 1
+        for bird in sorted(alive):
+            if rng.random() < 0.003:
+                accountant.died(bird, sim.DEATH_FLOOR if rng.random() < 0.5 else sim.DEATH_CEILING)
+                alive.discard(bird)
+    assert accountant.fitness().tolist() == fitness
+    assert accountant.scores().tolist() == score
+    assert not accountant.alive.any() and max(score) > 3
@@ -0,0 +1,81 @@
+import copy
+import numpy as np
+import flappy_sim
+
+FIELDS = [name for name in flappy_sim.STATE_DTYPE.names if name != 'course']
+
+
+def _play(game, frames, start=0):
+    # every bird jumps on its own rule, so the games differ
+    for i in range(start, start + frames):
+        obs = game.begin_frame()
+        game.end_frame(obs[:, 1] - obs[:, 2] > 40 + (np.arange(game.n) * 7 + i) % 50)
+
+
+def _state(game):
+    # everything but the course row, which may differ between tables
+    snap = game.snapshot()
+    return [snap[name].tobytes() for name in FIELDS]
+
+
+def _pipes(game, i, pipes=10):
+    return game.courses.heights[game.course[i], :pipes].tolist()
+
+
+def test_rewind():
+    game = flappy_sim.BatchGame(flappy_sim.CourseTable(range(32)), np.arange(32))
+    _play(game, 40)
+    snap = game.snapshot()
+    _play(game, 200, 40)
+    end = _state(game)
+    game.restore(snap)
+    _play(game, 200, 40)
+    assert _state(game) == end
+
+
+def test_fork_into_other_table():
+    game = flappy_sim.BatchGame(flappy_sim.CourseTable(range(32)), np.arange(32))
+    _play(game, 40)
+    snap = game.snapshot()
+    copied = copy.deepcopy(game)
+    _play(copied, 200, 40)
+    other = flappy_sim.BatchGame(flappy_sim.CourseTable(range(1000, 1032)), np.arange(32))
+    other.restore(snap)
+    _play(other, 200, 40)
+    assert _state(other) == _state(copied)
+
+
+def test_restore_into_shared_row_leaves_other_games_alone():
+    # games 0 and 1 of b play the same course row
+    a = flappy_sim.BatchGame(flappy_sim.CourseTable([9, 2]), [0, 1])
+    b = flappy_sim.BatchGame(flappy_sim.CourseTable([5]), [0, 0])
+    _play(a, 30)
+    _play(b, 30)
+    pipes = _pipes(b, 0)
+    before = b.snapshot([0])
+    b.restore(a.snapshot([0]), [1])
+    assert _pipes(b, 0) == pipes
+    assert b.snapshot([0]).tobytes() == before.tobytes()
+    assert b.snapshot([1])['seed'].tolist() == [9]
+    assert _pipes(b, 1) == _pipes(a, 0)
+
+
+def test_restore_two_seeds_on_one_row():
+    # records of different courses that claim the same row keep their courses
+    a = flappy_sim.BatchGame(flappy_sim.CourseTable([9]), [0])
+    c = flappy_sim.BatchGame(flappy_sim.CourseTable([2]), [0])
+    b = flappy_sim.BatchGame(flappy_sim.CourseTable([0]), [0, 0])
+    state = np.concatenate([a.snapshot(), c.snapshot()])
+    b.restore(state)
+    assert b.snapshot()['seed'].tolist() == [9, 2]
+    assert _pipes(b, 0) == _pipes(a, 0) and _pipes(b, 1) == _pipes(c, 0)
+    assert b.courses.seeds[0] == 0
+
+
+def test_restore_in_place_keeps_rows():
+    courses = flappy_sim.CourseTable(range(8))
+    game = flappy_sim.BatchGame(courses, np.arange(8))
+    _play(game, 20)
+    game.restore(game.snapshot([3]), [5])
+    assert len(courses.seeds) == 8
+    assert game.course.tolist() == [0, 1, 2, 3, 4, 3, 6, 7]
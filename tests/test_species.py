@@ -0,0 +1,35 @@
+import random
+import neat
+import pytest
+import flappy_species
+from conftest import CONFIG_FILE
+
+
+def _history(species_set, seed, pop_size, threshold, generations=8):
+    # genome -> species after every speciation of a short run
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, species_set, neat.DefaultStagnation,
+                         CONFIG_FILE)
+    config.pop_size = pop_size
+    config.species_set_config.compatibility_threshold = threshold
+    random.seed(seed)
+    population = neat.Population(config)
+    history = []
+    speciate = population.species.speciate
+
+    def recorded(*args):
+        speciate(*args)
+        history.append(sorted(population.species.genome_to_species.items()))
+    population.species.speciate = recorded
+
+    def fitness(genomes, config):
+        for genome_id, genome in genomes:
+            genome.fitness = -abs(sum(c.weight for c in genome.connections.values()) - 3) - 0.3 * len(genome.nodes)
+    population.run(fitness, generations)
+    return history
+
+
+@pytest.mark.parametrize("pop_size, threshold", [(100, 3.0), (150, 1.0), (100, 0.5)])
+def test_same_species_as_default_species_set(pop_size, threshold):
+    expected = _history(neat.DefaultSpeciesSet, 1, pop_size, threshold)
+    assert len(set(species for key, species in expected[-1])) > 1
+    assert _history(flappy_species.ArraySpeciesSet, 1, pop_size, threshold) == expected
@@ -0,0 +1,64 @@
+import os
+import random
+import neat
+import numpy as np
+import pytest
+import flappy_stats
+
+
+def _fitness(genomes, config):
+    for genome_id, genome in genomes:
+        genome.fitness = -abs(sum(c.weight for c in genome.connections.values()) - 3)
+
+
+def test_log_matches_statistics_reporter(config, tmp_path):
+    path = str(tmp_path / "stats")
+    random.seed(0)
+    population = neat.Population(config)
+    log = flappy_stats.StatsLog(path)
+    stats = neat.StatisticsReporter()
+    population.add_reporter(log)
+    population.add_reporter(stats)
+    population.run(_fitness, 6)
+    log.close()
+
+    table = flappy_stats.LogReader(path).read()
+    assert table["generation"].tolist() == list(range(6))
+    assert np.allclose(table["fitness_mean"], stats.get_fitness_mean())
+    assert np.allclose(table["fitness_std"], stats.get_fitness_stdev())
+    assert table["best_fitness"].tolist() == [g.fitness for g in stats.most_fit_genomes]
+    assert table["population"].tolist() == [config.pop_size] * 6
+    assert table["species_sizes"].sum(axis=1).tolist() == [config.pop_size] * 6
+
+
+def test_reopen_appends_and_drops_a_torn_row(config, tmp_path):
+    path = str(tmp_path / "stats")
+    random.seed(0)
+    population = neat.Population(config)
+    log = flappy_stats.StatsLog(path)
+    population.add_reporter(log)
+    population.run(_fitness, 2)
+    log.close()
+    # a crash in the middle of writing a row
+    with open(os.path.join(path, "generation.bin"), "ab") as f:
+        f.write(np.int64(99).tobytes())
+    assert flappy_stats.LogReader(path).rows() == 2
+
+    log = flappy_stats.StatsLog(path)
+    population.remove_reporter(population.reporters.reporters[0])
+    population.add_reporter(log)
+    population.run(_fitness, 2)
+    log.close()
+    assert flappy_stats.LogReader(path).read(["generation"])["generation"].tolist() == [0, 1, 2, 3]
+    assert list(flappy_stats.LogReader(path).follow(start=3, timeout=0))[0]["generation"] == 3
+    with pytest.raises(ValueError):
+        flappy_stats.StatsLog(path, quantiles=(0.5,))
+
+
+def test_alive_histogram(tmp_path):
+    log = flappy_stats.StatsLog(str(tmp_path / "stats"), alive_edges=(0, 10, 100))
+    log.start_generation(0)
+    log.add_alive_times([0, 5, 10, 99, 100, 5000])
+    log.add_alive_times(7)
+    assert log.alive.tolist() == [3, 2, 2]
+    log.close()
@@ -0,0 +1,41 @@
+import random
+import flappy_steady
+
+
+class _Genome:
+    def __init__(self, key, fitness):
+        self.key = key
+        self.fitness = fitness
+
+
+def test_insert_drops_the_worst(config):
+    config.pop_size = 10
+    steady = flappy_steady.SteadyState(config, workers=1)
+    random.seed(0)
+    fitness = [random.random() for i in range(100)]
+    for key, f in enumerate(fitness):
+        steady._insert(_Genome(key, f))
+        kept = sorted(range(key + 1), key=lambda k: fitness[k])[-10:]
+        assert sorted(steady.population) == sorted(kept)
+        assert sorted(steady._keys) == sorted(kept)
+        assert all(steady._keys[slot] == key for key, slot in steady._slots.items())
+    assert steady.best_genome.fitness == max(fitness)
+
+
+def test_every_genome_plays_the_same_courses(config):
+    config.pop_size = 10
+    steady = flappy_steady.SteadyState(config, workers=1)
+    seeds = steady._seeds()
+    steady.generation = 7
+    assert steady._seeds() == seeds
+
+
+def test_run(config):
+    config.pop_size = 10
+    config.fitness_threshold = 1e9
+    steady = flappy_steady.SteadyState(config, workers=2, courses=2)
+    best = steady.run(evaluations=60)
+    assert steady.generation == 6
+    assert len(steady.population) == config.pop_size
+    assert best.key in steady.population
+    assert best.fitness == max(g.fitness for g in steady.population.values())
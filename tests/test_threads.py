@@ -0,0 +1,32 @@
+import neat
+import numpy as np
+import pytest
+import flappy_genome
+import flappy_sim
+import flappy_threads
+from conftest import grown_genomes
+
+
+@pytest.mark.parametrize("genome_type", [neat.DefaultGenome, flappy_genome.CompactGenome])
+def test_pool_matches_evaluate_courses(genome_type):
+    config, genomes = grown_genomes(genome_type, 200, 8)
+    # the same genomes, so the same cached nets, in other chunks
+    genomes = genomes + genomes[:50] + genomes[10:20]
+    nets = [flappy_genome.create_net(genome, config) for key, genome in genomes]
+    pool = flappy_threads.ThreadPool(config, workers=4, chunks_per_worker=3)
+    try:
+        for seeds, how, max_score in (([1, 2, 3], "mean", 25), ([4, 5], 0.25, None), ([4, 5], "min", 2)):
+            frames, want = np.empty((2, len(seeds), len(genomes)), dtype=np.int64)
+            fitness = pool.evaluate(genomes, seeds, how, max_score, frames)
+            assert np.array_equal(fitness, flappy_sim.evaluate_courses(nets, seeds, how, max_score, want)[0])
+            assert np.array_equal(frames, want)
+    finally:
+        pool.close()
+
+
+def test_make_pool(config):
+    pool = flappy_threads.make_pool(config, 2)
+    try:
+        assert pool.evaluate([], [1]).shape == (0,)
+    finally:
+        pool.close()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+import flappy_sim
+import flappy_viewer
+
+
+@pytest.fixture
+def published():
+    courses = flappy_sim.CourseTable(range(6))
+    game = flappy_sim.BatchGame(courses, [0, 1, 2, 3, 4, 5, 0, 1])
+    publisher = flappy_viewer.Publisher(capacity=6, fps=0)
+    viewer = flappy_viewer.TiledViewer(publisher.name, columns=3, size=(300, 200))
+    yield game, publisher, viewer
+    viewer.close()
+    publisher.close()
+
+
+def _play(game, frames):
+    for i in range(frames):
+        game.begin_frame()
+        game.end_frame(game.frame % 9 == 0)
+
+
+def test_read_returns_published_state(published):
+    game, publisher, viewer = published
+    _play(game, 40)
+    publisher.publish(game)
+    assert viewer.read()
+    snapshot = viewer.snapshot
+    assert len(snapshot) == 6
+    for field in ("frame", "y", "tilt", "img", "score", "alive"):
+        assert np.array_equal(snapshot[field], getattr(game, field)[:6]), field
+    assert snapshot['seed'].tolist() == game.courses.seeds[game.course[:6]].tolist()
+    viewer.draw()
+
+
+def test_half_written_state_is_not_read(published):
+    game, publisher, viewer = published
+    _play(game, 10)
+    publisher.publish(game)
+    viewer.read()
+    before = viewer.snapshot.copy()
+
+    # the publisher is in the middle of a write
+    publisher.header['seq'] += 1
+    publisher.games['y'][:] = -1.0
+    assert viewer.read()
+    assert np.array_equal(viewer.snapshot, before)
+
+    publisher.header['seq'] += 1
+    viewer.read()
+    assert (viewer.snapshot['y'] == -1.0).all()
+
+
+def test_read_after_close(published):
+    game, publisher, viewer = published
+    publisher.publish(game)
+    assert viewer.read()
+    publisher.close()
+    assert not viewer.read()
+
+
+def test_parse_args():
+    assert flappy_viewer.parse_args([]) == (8, (600, 800), 30)
+    assert flappy_viewer.parse_args(["4"]) == (4, (600, 800), 30)
+    assert flappy_viewer.parse_args(["4", "300"]) == (4, (300, 800), 30)
+    assert flappy_viewer.parse_args(["4", "300", "400"]) == (4, (300, 400), 30)
+    assert flappy_viewer.parse_args(["4", "300", "400", "10"]) == (4, (300, 400), 10)
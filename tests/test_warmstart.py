@@ -0,0 +1,48 @@
+import random
+import neat
+import numpy as np
+import pytest
+import flappy_genome
+import flappy_sim
+import flappy_warmstart
+from conftest import CONFIG_FILE
+
+SEEDS = range(50, 55)
+
+
+@pytest.fixture
+def recorded(config, champion, tmp_path):
+    played = flappy_warmstart.record_champion(champion, config, str(tmp_path), SEEDS)
+    return played, flappy_warmstart.demonstrations(str(tmp_path))
+
+
+def test_fit_copies_the_champion(config, recorded):
+    played, (obs, jumps, seeds) = recorded
+    assert seeds == list(SEEDS) and len(obs) == len(jumps) > 1000
+    weights, bias = flappy_warmstart.fit(obs, jumps, seeds, config)
+    net = neat.nn.FeedForwardNetwork.create(flappy_warmstart.demo_genome(1, config, weights, bias), config)
+    agree = np.mean([(net.activate(x)[0] > 0.5) == jump for x, jump in zip(obs, jumps)])
+    assert agree > 0.95
+    assert flappy_sim.evaluate_courses([net], seeds)[0][0] >= 0.9 * played.mean()
+
+
+def test_fit_needs_demonstrations(config):
+    with pytest.raises(ValueError):
+        flappy_warmstart.fit(np.zeros((0, 3)), np.zeros(0, dtype=bool), [], config)
+
+
+@pytest.mark.parametrize("genome_type", [neat.DefaultGenome, flappy_genome.CompactGenome])
+def test_seed_population(genome_type):
+    config = neat.Config(genome_type, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                         neat.DefaultStagnation, CONFIG_FILE)
+    random.seed(2)
+    population = neat.Population(config)
+    weights, bias = [0.0, 0.01, -0.01], -0.1
+    seeded = flappy_warmstart.seed_population(population, weights, bias, share=0.5)
+    assert len(seeded) == len(population.population) // 2
+    assert all(type(genome) is genome_type for genome in population.population.values())
+    assert all(population.population[genome.key] is genome for genome in seeded)
+    members = [key for species in population.species.species.values() for key in species.members]
+    assert sorted(members) == sorted(population.population)
+    nets = [flappy_genome.create_net(genome, config) for genome in seeded[:1]]
+    assert flappy_sim.evaluate_courses(nets, [1])[0][0] > 300